@@ -39,7 +39,7 @@ async def run_migrations_online():
     if connectable is None:
         from sqlalchemy.ext.asyncio import create_async_engine
         connectable = create_async_engine(
-            config.get_main_option("sqlalchemy.url"),
+            get_url(),
             poolclass=pool.NullPool
         )
 
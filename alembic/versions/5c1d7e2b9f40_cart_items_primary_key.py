@@ -0,0 +1,32 @@
+"""cart_items primary key
+
+Revision ID: 5c1d7e2b9f40
+Revises: 028e9e1e3df8
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1d7e2b9f40'
+down_revision: Union[str, None] = '028e9e1e3df8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Без ограничения уникальности в таблицу попадали дубли; оставляем по одной строке
+    op.execute(
+        "DELETE FROM cart_items a USING cart_items b "
+        "WHERE a.ctid > b.ctid AND a.cart_id = b.cart_id AND a.product_id = b.product_id"
+    )
+    op.create_primary_key('cart_items_pkey', 'cart_items', ['cart_id', 'product_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('cart_items_pkey', 'cart_items', type_='primary')
@@ -0,0 +1,45 @@
+"""orders history
+
+Revision ID: 7f3b0d9e6a21
+Revises: e4a2c8d15b73
+Create Date: 2026-10-18 18:15:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3b0d9e6a21'
+down_revision: Union[str, None] = 'e4a2c8d15b73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ORDER_INDEXES = {
+    'ix_orders_user_id_created_at_id': ['user_id', 'created_at', 'id'],
+    'ix_orders_created_at_id': ['created_at', 'id'],
+    'ix_orders_status_created_at_id': ['status', 'created_at', 'id'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Старым заказам достается время миграции: настоящей даты у них нет
+    op.add_column('orders', sa.Column('created_at', sa.DateTime(timezone=True), nullable=False,
+                                      server_default=sa.func.now()))
+    op.add_column('orders', sa.Column('status', sa.String(length=20), nullable=False,
+                                      server_default='new'))
+    for name, columns in ORDER_INDEXES.items():
+        op.create_index(name, 'orders', columns)
+    op.create_index('ix_orderdetails_order_id', 'orderdetails', ['order_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orderdetails_order_id', table_name='orderdetails')
+    for name in ORDER_INDEXES:
+        op.drop_index(name, table_name='orders')
+    op.drop_column('orders', 'status')
+    op.drop_column('orders', 'created_at')
@@ -0,0 +1,31 @@
+"""products sku
+
+Revision ID: 9a41e6c3b2f7
+Revises: c5d2a7e9f104
+Create Date: 2026-10-18 20:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a41e6c3b2f7'
+down_revision: Union[str, None] = 'c5d2a7e9f104'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Артикулы есть только у импортированных товаров, у остальных NULL
+    op.add_column('products', sa.Column('sku', sa.String(length=64), nullable=True))
+    op.create_index('ux_products_sku', 'products', ['sku'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_products_sku', table_name='products')
+    op.drop_column('products', 'sku')
@@ -0,0 +1,56 @@
+"""products keyset indexes
+
+Revision ID: a7cab868f7ee
+Revises:
+Create Date: 2026-10-18 13:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7cab868f7ee'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+KEYSET_INDEXES = {
+    'ix_products_name_id': ['name', 'id'],
+    'ix_products_price_id': ['price', 'id'],
+    'ix_products_rating_id': ['rating', 'id'],
+    'ix_products_category_id_id': ['category_id', 'id'],
+    'ix_products_category_id_name_id': ['category_id', 'name', 'id'],
+    'ix_products_category_id_price_id': ['category_id', 'price', 'id'],
+    'ix_products_category_id_rating_id': ['category_id', 'rating', 'id'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ключ keyset пагинации не может содержать NULL
+    op.execute("UPDATE products SET name = '' WHERE name IS NULL")
+    op.execute("UPDATE products SET price = 0 WHERE price IS NULL")
+    op.execute("UPDATE products SET rating = 0 WHERE rating IS NULL")
+    op.alter_column('products', 'name', existing_type=sa.String(length=255), nullable=False)
+    op.alter_column('products', 'price', existing_type=sa.Float(), nullable=False)
+    op.alter_column('products', 'rating', existing_type=sa.Float(), nullable=False,
+                    server_default=sa.text('0'))
+
+    for name, columns in KEYSET_INDEXES.items():
+        op.create_index(name, 'products', columns)
+    # (name, id) полностью заменяет одиночный индекс по name
+    op.drop_index('ix_products_name', table_name='products')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_products_name', 'products', ['name'])
+    for name in KEYSET_INDEXES:
+        op.drop_index(name, table_name='products')
+
+    op.alter_column('products', 'rating', existing_type=sa.Float(), nullable=True, server_default=None)
+    op.alter_column('products', 'price', existing_type=sa.Float(), nullable=True)
+    op.alter_column('products', 'name', existing_type=sa.String(length=255), nullable=True)
@@ -0,0 +1,57 @@
+"""product rating stats
+
+Revision ID: b3e9f1a6c2d8
+Revises: 5c1d7e2b9f40
+Create Date: 2026-10-18 17:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e9f1a6c2d8'
+down_revision: Union[str, None] = '5c1d7e2b9f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    counter = dict(nullable=False, server_default=sa.text('0'))
+    op.create_table(
+        'product_rating_stats',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('review_count', sa.Integer(), **counter),
+        sa.Column('rating_sum', sa.Integer(), **counter),
+        sa.Column('stars_1', sa.Integer(), **counter),
+        sa.Column('stars_2', sa.Integer(), **counter),
+        sa.Column('stars_3', sa.Integer(), **counter),
+        sa.Column('stars_4', sa.Integer(), **counter),
+        sa.Column('stars_5', sa.Integer(), **counter),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id'),
+    )
+    # Наполняем агрегаты по существующим отзывам и выводим из них рейтинг
+    op.execute(
+        "INSERT INTO product_rating_stats "
+        "(product_id, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5) "
+        "SELECT product_id, count(*), sum(rating), "
+        "count(*) FILTER (WHERE rating = 1), count(*) FILTER (WHERE rating = 2), "
+        "count(*) FILTER (WHERE rating = 3), count(*) FILTER (WHERE rating = 4), "
+        "count(*) FILTER (WHERE rating = 5) "
+        "FROM reviews WHERE product_id IS NOT NULL AND rating BETWEEN 1 AND 5 "
+        "GROUP BY product_id"
+    )
+    op.execute(
+        "UPDATE products p SET rating = coalesce("
+        "(SELECT s.rating_sum::float8 / s.review_count FROM product_rating_stats s "
+        "WHERE s.product_id = p.id AND s.review_count > 0), 0)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('product_rating_stats')
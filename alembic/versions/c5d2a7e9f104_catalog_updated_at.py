@@ -0,0 +1,35 @@
+"""catalog updated_at
+
+Revision ID: c5d2a7e9f104
+Revises: 7f3b0d9e6a21
+Create Date: 2026-10-18 19:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d2a7e9f104'
+down_revision: Union[str, None] = '7f3b0d9e6a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CATALOG_TABLES = ('products', 'categories')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # now() стабильна в пределах транзакции, поэтому Postgres 11+ добавляет
+    # колонку без перезаписи таблицы
+    for table in CATALOG_TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False,
+                                       server_default=sa.func.now()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in CATALOG_TABLES:
+        op.drop_column(table, 'updated_at')
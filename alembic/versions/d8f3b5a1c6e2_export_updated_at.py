@@ -0,0 +1,39 @@
+"""export updated_at
+
+Revision ID: d8f3b5a1c6e2
+Revises: 9a41e6c3b2f7
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f3b5a1c6e2'
+down_revision: Union[str, None] = '9a41e6c3b2f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMN_TABLES = ('users', 'orders')
+# Фильтр updated_since в выгрузках
+INDEXED_TABLES = ('products', 'users', 'orders')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in NEW_COLUMN_TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False,
+                                       server_default=sa.func.now()))
+    for table in INDEXED_TABLES:
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in INDEXED_TABLES:
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+    for table in NEW_COLUMN_TABLES:
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,36 @@
+"""reviews listing indexes
+
+Revision ID: e4a2c8d15b73
+Revises: b3e9f1a6c2d8
+Create Date: 2026-10-18 17:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a2c8d15b73'
+down_revision: Union[str, None] = 'b3e9f1a6c2d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+REVIEW_INDEXES = {
+    'ix_reviews_product_id_id': ['product_id', 'id'],
+    'ix_reviews_product_id_rating_id': ['product_id', 'rating', 'id'],
+    'ix_reviews_user_id_id': ['user_id', 'id'],
+    'ix_reviews_user_id_rating_id': ['user_id', 'rating', 'id'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in REVIEW_INDEXES.items():
+        op.create_index(name, 'reviews', columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in REVIEW_INDEXES:
+        op.drop_index(name, table_name='reviews')
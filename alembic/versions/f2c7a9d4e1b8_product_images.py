@@ -0,0 +1,75 @@
+"""product images
+
+Revision ID: f2c7a9d4e1b8
+Revises: d8f3b5a1c6e2
+Create Date: 2026-10-18 21:40:00.000000
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c7a9d4e1b8'
+down_revision: Union[str, None] = 'd8f3b5a1c6e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    product_images = op.create_table(
+        'product_images',
+        sa.Column('id', sa.Integer(), sa.Identity(always=False), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('url', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+    # JSON разбирается здесь, а не в SQL: битые значения приложение и раньше
+    # показывало как пустой список, миграция на них падать не должна
+    connection = op.get_bind()
+    result = connection.execute(sa.text(
+        "SELECT id, additional_images FROM products "
+        "WHERE additional_images IS NOT NULL AND additional_images <> '' ORDER BY id"
+    ))
+    rows = []
+    for product_id, raw in result:
+        try:
+            urls = json.loads(raw)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(urls, list):
+            continue
+        rows.extend(
+            {'product_id': product_id, 'position': position, 'url': url}
+            for position, url in enumerate(urls) if isinstance(url, str) and url
+        )
+        if len(rows) >= BATCH_SIZE:
+            op.bulk_insert(product_images, rows)
+            rows = []
+    if rows:
+        op.bulk_insert(product_images, rows)
+
+    op.create_index('ix_product_images_product_id_position_id', 'product_images', ['product_id', 'position', 'id'])
+    op.drop_column('products', 'additional_images')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('products', sa.Column('additional_images', sa.Text(), nullable=True))
+    op.execute(
+        "UPDATE products p SET additional_images = i.urls FROM ("
+        "SELECT product_id, json_agg(url ORDER BY position, id)::text AS urls "
+        "FROM product_images GROUP BY product_id) i WHERE i.product_id = p.id"
+    )
+    op.drop_index('ix_product_images_product_id_position_id', table_name='product_images')
+    op.drop_table('product_images')
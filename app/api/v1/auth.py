@@ -1,13 +1,18 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
-from app.api.v1.category import get_db
+from app.cache import TTLCache
+from app.db.database import get_db
 
 from app.db.models import User
 
@@ -16,21 +21,80 @@ SECRET_KEY = "MY_SUPER_SECRET_KEY_123"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Кэш пользователей по токену: в установившемся режиме авторизованные
+# запросы не ходят в базу. Запись живет не дольше exp самого токена.
+# invalidate_user сбрасывает кэш только своего процесса: в остальных
+# воркерах удаленный или разжалованный пользователь сохраняет доступ
+# до USER_CACHE_TTL_SECONDS, поэтому время жизни короткое
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "10"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+user_cache = TTLCache("users", maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
 # Password Hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Стоимость bcrypt настраивается; хеши со старой стоимостью
+# перехешируются при ближайшем успешном входе
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt занимает сотни миллисекунд CPU, поэтому считается в отдельном пуле
+# потоков (bcrypt отпускает GIL). Число операций в работе и в очереди ограничено:
+# сверх лимита сразу отвечаем 503, а не копим запросы в памяти
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "128"))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING)
+
+
+async def _run_hashing(func, *args):
+    if _hash_slots.locked():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations, try again later",
+            headers={"Retry-After": "1"},
+        )
+    async with _hash_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+
+
+async def verify_password(plain_password, hashed_password) -> bool:
+    return await _run_hashing(pwd_context.verify, plain_password, hashed_password)
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_and_update_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """Проверяет пароль и возвращает новый хеш, если старый устарел"""
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password) -> str:
+    return await _run_hashing(pwd_context.hash, password)
+
+
+def shutdown_password_hashing():
+    _hash_executor.shutdown(wait=True, cancel_futures=True)
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/users/token")
 
 
+@dataclass(frozen=True)
+class CurrentUser:
+    """Неизменяемый снимок пользователя из токена; общий для всех запросов
+    через кэш, поэтому без хеша пароля и без связи с сессией"""
+    id: int
+    username: str
+    email: str
+    first_name: str
+    last_name: str
+    is_active: bool
+    is_superuser: bool
+
+
+CURRENT_USER_COLUMNS = (
+    User.id, User.username, User.email, User.first_name, User.last_name, User.is_active, User.is_superuser,
+)
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -51,7 +115,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+def invalidate_user(user_id: int) -> int:
+    """Сбрасывает все закэшированные токены пользователя"""
+    return user_cache.invalidate_where(lambda token, user: user.id == user_id)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> CurrentUser:
+    # Токен попадает в кэш только после успешной проверки подписи
+    # и удаляется из него не позже своего exp
+    user = user_cache.get(token)
+    if user is not None:
+        return user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -67,16 +142,33 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
         raise credentials_exception
 
     # Получаем пользователя из базы данных
-    result = await db.execute(select(User).where(User.username == token_data.username))
-    user = result.scalars().first()
-    if user is None:
+    result = await db.execute(select(*CURRENT_USER_COLUMNS).where(User.username == token_data.username))
+    row = result.first()
+    if row is None:
         raise credentials_exception
+
+    user = CurrentUser(**row._mapping)
+    user_cache.set(token, user, expires_at=payload.get("exp"))
     return user
 
 
+async def get_current_superuser(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    return current_user
+
+
 async def authenticate_user(username: str, password: str, db: AsyncSession):
     result = await db.execute(select(User).where(User.username == username))
     user = result.scalars().first()
-    if user and verify_password(password, user.hashed_password):
-        return user
-    return None
+    if user is None:
+        return None
+
+    verified, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not verified:
+        return None
+    if new_hash is not None:
+        # Сменилась стоимость bcrypt - сохраняем хеш с новыми параметрами
+        await db.execute(update(User).where(User.id == user.id).values(hashed_password=new_hash))
+        await db.commit()
+    return user
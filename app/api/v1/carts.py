@@ -1,16 +1,19 @@
 from fastapi import HTTPException, APIRouter, Depends
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from typing import List
+from sqlalchemy import ARRAY, Integer, any_, delete, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from typing import Iterable, List, Set
 from sqlalchemy.exc import IntegrityError
 
-from app.db.models import Cart, User, Product
+from app.db.models import Cart, User, Product, cart_items
 from app.db.database import get_db
 
 router = APIRouter(tags=["carts"])
 
+# Ограничение размера одной пачки изменений корзины
+CART_BATCH_MAX_ITEMS = 1000
+
 
 class CartBase(BaseModel):
     user_id: int
@@ -35,22 +38,79 @@ class CartResponse(CartBase):
         }
 
 
-async def get_user_cart_or_404(user_id: int, db: AsyncSession):
-    """Вспомогательная функция для получения корзины пользователя"""
-    result = await db.execute(
-        select(Cart)
-        .where(Cart.user_id == user_id)
-        .options(selectinload(Cart.items))  # Загрузка связанных товаров
-    )
-    cart = result.scalars().first()
+class CartItemsBatch(BaseModel):
+    add: List[int] = Field(default_factory=list, max_length=CART_BATCH_MAX_ITEMS)
+    remove: List[int] = Field(default_factory=list, max_length=CART_BATCH_MAX_ITEMS)
 
-    if not cart:
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "add": [4, 5, 6],
+                "remove": [1]
+            }
+        }
+
+
+async def get_user_cart_id_or_404(user_id: int, db: AsyncSession) -> int:
+    """Возвращает id корзины пользователя, не загружая ее товары"""
+    cart_id = (await db.execute(select(Cart.id).where(Cart.user_id == user_id))).scalar()
+    if cart_id is None:
         raise HTTPException(
             status_code=404,
             detail=f"Cart for user {user_id} not found"
         )
+    return cart_id
+
+
+async def get_cart_item_ids(cart_id: int, db: AsyncSession) -> List[int]:
+    """Id товаров корзины одним легким запросом, без загрузки ORM объектов"""
+    result = await db.execute(
+        select(cart_items.c.product_id)
+        .where(cart_items.c.cart_id == cart_id)
+        .order_by(cart_items.c.product_id)
+    )
+    return list(result.scalars())
+
+
+def _id_array(ids: Iterable[int]):
+    return literal(sorted(set(ids)), ARRAY(Integer))
+
 
-    return cart
+async def change_cart_items(cart_id: int, add: List[int], remove: List[int], db: AsyncSession) -> Set[int]:
+    """Добавляет и удаляет товары корзины множественными запросами
+
+    Добавление - один INSERT ... SELECT ... ON CONFLICT DO NOTHING, который
+    заодно возвращает найденные товары: несуществующие id дают 404.
+    Удаление - один DELETE ... WHERE product_id = ANY(...) RETURNING;
+    возвращает id товаров, которые действительно были в корзине.
+    """
+    removed = set()
+    if remove:
+        result = await db.execute(
+            delete(cart_items).where(
+                cart_items.c.cart_id == cart_id,
+                cart_items.c.product_id == any_(_id_array(remove)),
+            ).returning(cart_items.c.product_id)
+        )
+        removed = set(result.scalars())
+
+    if add:
+        found = select(Product.id).where(Product.id == any_(_id_array(add))).cte("found")
+        inserted = (
+            insert(cart_items)
+            .from_select(["cart_id", "product_id"], select(literal(cart_id), found.c.id))
+            .on_conflict_do_nothing()
+            .cte("inserted")
+        )
+        result = await db.execute(select(found.c.id).add_cte(inserted))
+        missing = set(add) - set(result.scalars())
+        if missing:
+            await db.rollback()
+            raise HTTPException(
+                status_code=404,
+                detail=f"Products not found: {sorted(missing)}"
+            )
+    return removed
 
 
 @router.post("/", response_model=CartResponse, status_code=201)
@@ -83,11 +143,41 @@ async def create_cart(cart_data: CartCreate, db: AsyncSession = Depends(get_db))
 
 @router.get("/user/{user_id}", response_model=CartResponse)
 async def read_user_cart(user_id: int, db: AsyncSession = Depends(get_db)):
-    cart = await get_user_cart_or_404(user_id, db)
+    cart_id = await get_user_cart_id_or_404(user_id, db)
     return {
-        "id": cart.id,
-        "user_id": cart.user_id,
-        "items": [item.id for item in cart.items]
+        "id": cart_id,
+        "user_id": user_id,
+        "items": await get_cart_item_ids(cart_id, db)
+    }
+
+
+@router.post("/user/{user_id}/items/batch", response_model=CartResponse)
+async def change_user_cart_items(
+        user_id: int,
+        batch: CartItemsBatch,
+        db: AsyncSession = Depends(get_db)):
+    """Добавляет и удаляет сразу много товаров корзины"""
+    overlap = set(batch.add) & set(batch.remove)
+    if overlap:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Products both added and removed: {sorted(overlap)}"
+        )
+
+    cart_id = await get_user_cart_id_or_404(user_id, db)
+    try:
+        await change_cart_items(cart_id, batch.add, batch.remove, db)
+        await db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to update cart: {str(e)}")
+
+    return {
+        "id": cart_id,
+        "user_id": user_id,
+        "items": await get_cart_item_ids(cart_id, db)
     }
 
 
@@ -96,48 +186,43 @@ async def add_item_to_user_cart(
         user_id: int,
         product_id: int,
         db: AsyncSession = Depends(get_db)):
-    cart = await get_user_cart_or_404(user_id, db)
-    product = await db.get(Product, product_id)
-
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
+    cart_id = await get_user_cart_id_or_404(user_id, db)
 
     try:
-        if product not in cart.items:
-            cart.items.append(product)
-            await db.commit()
-            await db.refresh(cart)
-
-        return {
-            "id": cart.id,
-            "user_id": cart.user_id,
-            "items": [item.id for item in cart.items]
-        }
+        await change_cart_items(cart_id, [product_id], [], db)
+        await db.commit()
+    except HTTPException:
+        raise HTTPException(status_code=404, detail="Product not found")
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to add item to cart: {str(e)}")
 
+    return {
+        "id": cart_id,
+        "user_id": user_id,
+        "items": await get_cart_item_ids(cart_id, db)
+    }
+
 
 @router.delete("/user/{user_id}/items/{product_id}", response_model=CartResponse)
 async def remove_item_from_user_cart(
         user_id: int,
         product_id: int,
         db: AsyncSession = Depends(get_db)):
-    cart = await get_user_cart_or_404(user_id, db)
-    product = await db.get(Product, product_id)
-
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
+    cart_id = await get_user_cart_id_or_404(user_id, db)
 
     try:
-        cart.items.remove(product)
+        if not await change_cart_items(cart_id, [], [product_id], db):
+            raise HTTPException(status_code=404, detail="Product not found in cart")
         await db.commit()
-        await db.refresh(cart)
-        return {
-            "id": cart.id,
-            "user_id": cart.user_id,
-            "items": [item.id for item in cart.items]
-        }
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to remove item from cart: {str(e)}")
+
+    return {
+        "id": cart_id,
+        "user_id": user_id,
+        "items": await get_cart_item_ids(cart_id, db)
+    }
@@ -1,15 +1,28 @@
-from fastapi import HTTPException, APIRouter, Depends, UploadFile, File, Form
-from pydantic import BaseModel, Field
-from app.db.models import Category, engine
+from fastapi import HTTPException, APIRouter, Depends, Header, UploadFile, File, Form, Response
+from pydantic import BaseModel, Field, TypeAdapter, computed_field
+from app.db.models import Category
+from app.db.database import async_session_maker, get_db
+from app.api.v1.conditional import CATEGORY_CACHE_CONTROL, etag_matches, make_etag, not_modified
+from app.api.v1.facets import invalidate_product_facets
+from app.api.v1.uploads import save_image_upload
+from app.images import image_variant_urls, remove_image, schedule_image_variants
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import Annotated, Dict, List, Optional, Tuple
 from sqlalchemy import select
+from dataclasses import dataclass
+from types import MappingProxyType
+import asyncio
+import hashlib
 import json
+import logging
 from pathlib import Path
 import os
+import time
 from datetime import datetime
 import uuid
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(tags=["categories"])
 
 # Настройки для загрузки изображений
@@ -34,24 +47,107 @@ class CategoryResponse(BaseModel):
     image_url: Optional[str] = None
     thumbnail_url: Optional[str] = None
 
+    # Уменьшенные копии картинки (thumb/list/detail, JPEG и WebP)
+    @computed_field
+    @property
+    def image_variants(self) -> Optional[Dict[str, str]]:
+        return image_variant_urls(self.image_url)
+
     class Config:
         from_attributes = True
 
 
-# Асинхронный dependency
-async def get_db():
-    async with AsyncSession(engine) as session:
-        yield session
+# Снимок категорий в памяти процесса.
+# Категории меняются редко, а читаются на каждой странице обоих фронтендов,
+# поэтому чтения обслуживаются из неизменяемого снимка с уже готовым JSON.
+# После записи снимок перечитывается и подменяется целиком (присваивание ссылки
+# атомарно). Другие воркеры узнают об изменениях не позже, чем через
+# CATEGORY_SNAPSHOT_MAX_AGE секунд. X-Catalog-Version - хеш содержимого,
+# клиенты могут сравнивать его между ответами разных воркеров.
+CATALOG_VERSION_HEADER = "X-Catalog-Version"
+CATEGORY_SNAPSHOT_MAX_AGE = float(os.getenv("CATEGORY_SNAPSHOT_MAX_AGE", "60"))
+
+_category_list_adapter = TypeAdapter(List[CategoryResponse])
+
+
+@dataclass(frozen=True)
+class CategorySnapshot:
+    # Хеш содержимого списка: одинаков во всех воркерах с одними данными
+    version: str
+    categories: Tuple[CategoryResponse, ...]
+    list_payload: bytes
+    item_payloads: MappingProxyType
+    # ETag из (id, updated_at)
+    list_etag: str
+    item_etags: MappingProxyType
+    loaded_at: float
+
+
+_category_snapshot: Optional[CategorySnapshot] = None
+_category_snapshot_lock = asyncio.Lock()
+
+
+def _is_fresh(snapshot: Optional[CategorySnapshot]) -> bool:
+    return snapshot is not None and time.monotonic() - snapshot.loaded_at <= CATEGORY_SNAPSHOT_MAX_AGE
+
+
+async def refresh_category_snapshot(db: AsyncSession, only_if_stale: bool = False) -> CategorySnapshot:
+    """Перечитывает категории из БД и атомарно подменяет снимок
+
+    only_if_stale - для чтений: запросы, ждавшие блокировку, пока другой
+    перечитывал снимок, получают уже свежий снимок без своего запроса в БД.
+    После записи снимок перечитывается всегда.
+    """
+    global _category_snapshot
+    async with _category_snapshot_lock:
+        if only_if_stale and _is_fresh(_category_snapshot):
+            return _category_snapshot
+
+        result = await db.execute(
+            select(Category.id, Category.name, Category.image_url, Category.thumbnail_url, Category.updated_at)
+            .order_by(Category.id)
+        )
+        rows = result.all()
+        categories = tuple(CategoryResponse.model_validate(row) for row in rows)
+        list_payload = _category_list_adapter.dump_json(list(categories))
+
+        items: Dict[int, bytes] = {category.id: category.model_dump_json().encode() for category in categories}
+        _category_snapshot = CategorySnapshot(
+            version=hashlib.blake2b(list_payload, digest_size=8).hexdigest(),
+            categories=categories,
+            list_payload=list_payload,
+            item_payloads=MappingProxyType(items),
+            list_etag=make_etag("categories", [(row.id, row.updated_at) for row in rows]),
+            item_etags=MappingProxyType({row.id: make_etag("category", [(row.id, row.updated_at)]) for row in rows}),
+            loaded_at=time.monotonic(),
+        )
+        return _category_snapshot
+
+
+async def get_category_snapshot(db: AsyncSession) -> CategorySnapshot:
+    """Возвращает текущий снимок, перечитывая его только если он устарел"""
+    snapshot = _category_snapshot
+    if not _is_fresh(snapshot):
+        snapshot = await refresh_category_snapshot(db, only_if_stale=True)
+    return snapshot
+
+
+async def warm_category_snapshot():
+    """Загружает снимок при старте приложения"""
+    try:
+        async with async_session_maker() as session:
+            snapshot = await refresh_category_snapshot(session)
+        logger.info("Category snapshot v%s loaded: %s categories", snapshot.version, len(snapshot.categories))
+    except Exception:
+        # Без БД приложение все равно должно подняться; снимок загрузится при первом чтении
+        logger.exception("Failed to load category snapshot on startup")
 
 
-def save_uploaded_file(file: UploadFile, subdir: str = "") -> str:
+async def save_uploaded_file(file: UploadFile, subdir: str = "") -> str:
     """Сохраняет загруженный файл и возвращает его URL"""
-    ext = file.filename.split(".")[-1]
-    filename = f"{uuid.uuid4()}.{ext}"
-    save_path = IMAGE_DIR / subdir / filename if subdir else IMAGE_DIR / filename
-
-    with open(save_path, "wb") as buffer:
-        buffer.write(file.file.read())
+    directory = IMAGE_DIR / subdir if subdir else IMAGE_DIR
+    filename = await save_image_upload(file, directory, str(uuid.uuid4()))
+    schedule_image_variants(directory / filename)
 
     return f"/static/images/categories/{subdir}/{filename}" if subdir else f"/static/images/categories/{filename}"
 
@@ -63,8 +159,13 @@ async def create_category(
         thumbnail: Optional[UploadFile] = File(None),
         db: AsyncSession = Depends(get_db)
 ):
-    image_url = save_uploaded_file(image) if image else None
-    thumbnail_url = save_uploaded_file(thumbnail, "thumbnails") if thumbnail else None
+    image_url = await save_uploaded_file(image) if image else None
+    try:
+        thumbnail_url = await save_uploaded_file(thumbnail, "thumbnails") if thumbnail else None
+    except HTTPException:
+        if image_url:
+            remove_image(IMAGE_DIR / image_url.split("/")[-1])
+        raise
 
     db_category = Category(
         name=name,
@@ -76,30 +177,67 @@ async def create_category(
     try:
         await db.commit()
         await db.refresh(db_category)
-        return db_category
     except Exception as e:
         # Удаляем сохраненные файлы в случае ошибки
         if image_url:
-            os.remove(IMAGE_DIR / image_url.split("/")[-1])
+            remove_image(IMAGE_DIR / image_url.split("/")[-1])
         if thumbnail_url:
-            os.remove(IMAGE_DIR / "thumbnails" / thumbnail_url.split("/")[-1])
+            remove_image(IMAGE_DIR / "thumbnails" / thumbnail_url.split("/")[-1])
         await db.rollback()
         raise HTTPException(status_code=400, detail=f"Category creation failed: {e}")
 
+    await refresh_category_snapshot(db)
+    return db_category
+
+
+def catalog_not_modified(snapshot: CategorySnapshot, etag: str) -> Response:
+    """304 с версией каталога: клиент, переспросивший по ETag, узнает актуальную версию"""
+    response = not_modified(etag, CATEGORY_CACHE_CONTROL)
+    response.headers[CATALOG_VERSION_HEADER] = snapshot.version
+    return response
+
 
 @router.get("/", response_model=List[CategoryResponse])
-async def read_categories(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Category))
-    categories = result.scalars().all()
-    return categories
+async def read_categories(
+        db: AsyncSession = Depends(get_db),
+        if_none_match: Annotated[Optional[str], Header()] = None
+):
+    snapshot = await get_category_snapshot(db)
+    if etag_matches(if_none_match, snapshot.list_etag):
+        return catalog_not_modified(snapshot, snapshot.list_etag)
+    return Response(
+        content=snapshot.list_payload,
+        media_type="application/json",
+        headers={
+            CATALOG_VERSION_HEADER: snapshot.version,
+            "ETag": snapshot.list_etag,
+            "Cache-Control": CATEGORY_CACHE_CONTROL,
+        }
+    )
 
 
 @router.get("/{category_id}", response_model=CategoryResponse)
-async def read_category(category_id: int, db: AsyncSession = Depends(get_db)):
-    category = await db.get(Category, category_id)
-    if category is None:
+async def read_category(
+        category_id: int,
+        db: AsyncSession = Depends(get_db),
+        if_none_match: Annotated[Optional[str], Header()] = None
+):
+    snapshot = await get_category_snapshot(db)
+    payload = snapshot.item_payloads.get(category_id)
+    if payload is None:
         raise HTTPException(status_code=404, detail="Category not found")
-    return category
+    etag = snapshot.item_etags[category_id]
+    if etag_matches(if_none_match, etag):
+        return catalog_not_modified(snapshot, etag)
+    return Response(
+        content=payload,
+        media_type="application/json",
+        headers={
+            CATALOG_VERSION_HEADER: snapshot.version,
+            "ETag": etag,
+            "Cache-Control": CATEGORY_CACHE_CONTROL,
+        }
+    )
 
 
 @router.put("/{category_id}", response_model=CategoryResponse)
@@ -121,10 +259,15 @@ async def update_category(
         db_category.name = name
 
     if image:
-        db_category.image_url = save_uploaded_file(image)
+        db_category.image_url = await save_uploaded_file(image)
 
     if thumbnail:
-        db_category.thumbnail_url = save_uploaded_file(thumbnail, "thumbnails")
+        try:
+            db_category.thumbnail_url = await save_uploaded_file(thumbnail, "thumbnails")
+        except HTTPException:
+            if image:
+                remove_image(IMAGE_DIR / db_category.image_url.split("/")[-1])
+            raise
 
     try:
         await db.commit()
@@ -132,15 +275,17 @@ async def update_category(
 
         # Удаляем старые файлы после успешного обновления
         if image and old_image:
-            os.remove(IMAGE_DIR / old_image.split("/")[-1])
+            remove_image(IMAGE_DIR / old_image.split("/")[-1])
         if thumbnail and old_thumbnail:
-            os.remove(IMAGE_DIR / "thumbnails" / old_thumbnail.split("/")[-1])
-
-        return db_category
+            remove_image(IMAGE_DIR / "thumbnails" / old_thumbnail.split("/")[-1])
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=400, detail=f"Category update failed: {e}")
 
+    invalidate_product_facets()
+    await refresh_category_snapshot(db)
+    return db_category
+
 
 @router.delete("/{category_id}", response_model=CategoryResponse)
 async def delete_category(category_id: int, db: AsyncSession = Depends(get_db)):
@@ -150,10 +295,13 @@ async def delete_category(category_id: int, db: AsyncSession = Depends(get_db)):
 
     # Удаляем связанные файлы
     if db_category.image_url:
-        os.remove(IMAGE_DIR / db_category.image_url.split("/")[-1])
+        remove_image(IMAGE_DIR / db_category.image_url.split("/")[-1])
     if db_category.thumbnail_url:
-        os.remove(IMAGE_DIR / "thumbnails" / db_category.thumbnail_url.split("/")[-1])
+        remove_image(IMAGE_DIR / "thumbnails" / db_category.thumbnail_url.split("/")[-1])
 
+    # Товары категории остаются с category_id = NULL: фасеты по категориям устарели
     await db.delete(db_category)
     await db.commit()
+    invalidate_product_facets()
+    await refresh_category_snapshot(db)
     return db_category
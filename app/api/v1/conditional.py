@@ -0,0 +1,61 @@
+"""Условные GET запросы: ETag, If-None-Match и Cache-Control
+
+ETag строится из версий строк (id, updated_at), а не из тела ответа, поэтому
+его можно посчитать легким запросом и ответить 304 до загрузки ORM объектов
+и сериализации. В ETag входит и ETAG_SCHEMA_VERSION: при изменении формата
+ответа его нужно поднять, чтобы клиенты не держали старые тела.
+
+ETag слабый (W/): ApiGZipMiddleware отдает одно и то же представление
+сжатым и несжатым с одним заголовком, а сильный ETag обещал бы побайтное
+совпадение, и кэш мог бы ответить на ревалидацию чужой кодировкой.
+"""
+import hashlib
+from typing import Iterable, Optional
+
+from fastapi import Response
+
+ETAG_SCHEMA_VERSION = "2"
+
+# Cache-Control по маршрутам каталога. После истечения max-age клиент
+# переспрашивает с If-None-Match и получает дешевый 304
+PRODUCT_CACHE_CONTROL = "public, max-age=60"
+PRODUCT_LIST_CACHE_CONTROL = "public, max-age=15"
+CATEGORY_CACHE_CONTROL = "public, max-age=60"
+
+
+def make_etag(kind: str, versions: Iterable) -> str:
+    """Слабый ETag из версий строк ответа"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{ETAG_SCHEMA_VERSION}:{kind}".encode())
+    for version in versions:
+        digest.update(b"\x1f")
+        digest.update(repr(version).encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка If-None-Match (слабое сравнение, как требует RFC 9110)"""
+    if not if_none_match:
+        return False
+    opaque = _opaque_tag(etag)
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or _opaque_tag(candidate) == opaque:
+            return True
+    return False
+
+
+def set_cache_headers(response: Response, etag: str, cache_control: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    """Пустой 304 с теми же ETag и Cache-Control, что и у полного ответа"""
+    response = Response(status_code=304)
+    set_cache_headers(response, etag, cache_control)
+    return response
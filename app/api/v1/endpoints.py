@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1 import product, category, users, review, carts, orders
+from app.api.v1 import product, category, users, review, carts, orders, export
 
 router = APIRouter()
 
@@ -10,3 +10,4 @@ router.include_router(users.router, prefix="/users", tags=["users"])
 router.include_router(review.router, prefix="/reviews", tags=["reviews"])
 router.include_router(carts.router, prefix="/carts", tags=["carts"])
 router.include_router(orders.router, prefix="/orders", tags=["orders"])
+router.include_router(export.router, prefix="/export", tags=["export"])
@@ -0,0 +1,143 @@
+"""Потоковая выгрузка товаров, заказов и пользователей
+
+Выгрузка читает таблицу одним запросом через серверный курсор (yield_per)
+и пишет NDJSON или CSV по мере чтения, так что память не зависит от размера
+таблицы. Соединение берется из пула внутри генератора: сессия из get_db
+закрывается раньше, чем начинает отправляться тело StreamingResponse.
+
+Для инкрементальных выгрузок есть updated_since: отдаются строки с
+updated_at >= updated_since, updated_at есть в каждой строке ответа.
+"""
+import csv
+import io
+import os
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import JSON, Select, func, literal_column, select, type_coerce
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from app.api.v1.auth import CurrentUser, get_current_superuser
+from app.db.database import engine
+from app.db.models import Order, OrderDetail, Product, User
+
+router = APIRouter(tags=["export"])
+
+# Сколько строк забирается из курсора за раз и кодируется одним куском
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+EXPORT_FORMAT_PATTERN = "^(" + "|".join(EXPORT_MEDIA_TYPES) + ")$"
+
+PRODUCT_EXPORT_COLUMNS = (
+    Product.id, Product.sku, Product.name, Product.category_id, Product.price, Product.rating,
+    Product.description, Product.main_image, Product.updated_at,
+)
+# hashed_password в выгрузку не попадает
+USER_EXPORT_COLUMNS = (
+    User.id, User.username, User.email, User.first_name, User.last_name,
+    User.is_active, User.is_superuser, User.updated_at,
+)
+ORDER_EXPORT_COLUMNS = (
+    Order.id, Order.user_id, Order.total, Order.status, Order.created_at, Order.updated_at,
+)
+
+
+def encode_ndjson(rows) -> bytes:
+    return b"".join(orjson.dumps(row._asdict()) + b"\n" for row in rows)
+
+
+def encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def stream_export(statement: Select, fmt: str) -> AsyncIterator[bytes]:
+    """Строки запроса пачками из серверного курсора"""
+    if fmt == "csv":
+        yield encode_csv([[column.name for column in statement.selected_columns]])
+    encode = encode_csv if fmt == "csv" else encode_ndjson
+    async with engine.connect() as conn:
+        result = await conn.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield encode(rows)
+
+
+def export_response(statement: Select, fmt: str, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_export(statement, fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{fmt}"',
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+def updated_since_filter(statement: Select, column, updated_since: Optional[datetime]) -> Select:
+    if updated_since is not None:
+        statement = statement.where(column >= updated_since)
+    return statement
+
+
+@router.get("/products")
+async def export_products(
+        format: str = Query("ndjson", pattern=EXPORT_FORMAT_PATTERN),
+        updated_since: Optional[datetime] = Query(None),
+        current_user: CurrentUser = Depends(get_current_superuser),
+):
+    """Все товары (или измененные с updated_since) потоком NDJSON/CSV"""
+    statement = select(*PRODUCT_EXPORT_COLUMNS).order_by(Product.id)
+    return export_response(updated_since_filter(statement, Product.updated_at, updated_since), format, "products")
+
+
+@router.get("/users")
+async def export_users(
+        format: str = Query("ndjson", pattern=EXPORT_FORMAT_PATTERN),
+        updated_since: Optional[datetime] = Query(None),
+        current_user: CurrentUser = Depends(get_current_superuser),
+):
+    """Пользователи без хэшей паролей потоком NDJSON/CSV"""
+    statement = select(*USER_EXPORT_COLUMNS).order_by(User.id)
+    return export_response(updated_since_filter(statement, User.updated_at, updated_since), format, "users")
+
+
+@router.get("/orders")
+async def export_orders(
+        format: str = Query("ndjson", pattern=EXPORT_FORMAT_PATTERN),
+        updated_since: Optional[datetime] = Query(None),
+        current_user: CurrentUser = Depends(get_current_superuser),
+):
+    """Заказы с деталями потоком
+
+    В NDJSON детали заказа лежат массивом в поле details, в CSV каждая
+    строка деталей - отдельная строка файла с колонками заказа.
+    """
+    if format == "csv":
+        statement = (
+            select(
+                *ORDER_EXPORT_COLUMNS,
+                OrderDetail.id.label("detail_id"), OrderDetail.product_id, OrderDetail.quantity,
+            )
+            .outerjoin(OrderDetail, OrderDetail.order_id == Order.id)
+            .order_by(Order.id, OrderDetail.id)
+        )
+    else:
+        details = (
+            select(func.coalesce(
+                func.json_agg(aggregate_order_by(
+                    func.json_build_object(
+                        "id", OrderDetail.id, "product_id", OrderDetail.product_id, "quantity", OrderDetail.quantity,
+                    ),
+                    OrderDetail.id,
+                )),
+                literal_column("'[]'::json"),
+            ))
+            .where(OrderDetail.order_id == Order.id)
+            .scalar_subquery()
+        )
+        statement = select(*ORDER_EXPORT_COLUMNS, type_coerce(details, JSON).label("details")).order_by(Order.id)
+    return export_response(updated_since_filter(statement, Order.updated_at, updated_since), format, "orders")
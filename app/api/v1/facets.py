@@ -0,0 +1,141 @@
+"""Фасеты каталога: число товаров по категориям, ценам и рейтингу
+
+Все три разбивки и общее число считаются одним запросом с GROUPING SETS
+за один проход по отфильтрованным товарам. Результат кэшируется по набору
+фильтров и сбрасывается при записи товаров (создание, импорт, отзывы,
+меняющие рейтинг), так что отрисовка фасетов обычно стоит одного
+попадания в кэш.
+"""
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from pydantic import BaseModel
+from sqlalchemy import Float, func, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import TTLCache
+from app.db.models import Product
+
+# Границы корзин цены и рейтинга: корзина i - [edges[i-1], edges[i]),
+# последняя открыта сверху
+PRICE_BUCKET_EDGES = (0, 500, 1000, 2000, 5000, 10000, 20000)
+RATING_BUCKET_EDGES = (1, 2, 3, 4)
+
+FACET_CACHE_TTL_SECONDS = float(os.getenv("FACET_CACHE_TTL_SECONDS", "30"))
+FACET_CACHE_MAX_SIZE = int(os.getenv("FACET_CACHE_MAX_SIZE", "1000"))
+facet_cache = TTLCache("product_facets", maxsize=FACET_CACHE_MAX_SIZE, ttl=FACET_CACHE_TTL_SECONDS)
+# Растет при каждой записи товаров: результат запроса, начатого до записи,
+# не попадает в кэш после сброса
+_facet_generation = 0
+
+
+@dataclass(frozen=True)
+class ProductFilters:
+    """Фильтры списка товаров; хешируется и служит ключом кэша фасетов"""
+    category_id: Optional[int] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_rating: Optional[float] = None
+
+    def conditions(self) -> list:
+        conditions = []
+        if self.category_id is not None:
+            conditions.append(Product.category_id == self.category_id)
+        if self.min_price is not None:
+            conditions.append(Product.price >= self.min_price)
+        if self.max_price is not None:
+            conditions.append(Product.price <= self.max_price)
+        if self.min_rating is not None:
+            conditions.append(Product.rating >= self.min_rating)
+        return conditions
+
+
+class CategoryFacet(BaseModel):
+    category_id: Optional[int]
+    count: int
+
+
+class RangeFacet(BaseModel):
+    min: float
+    max: Optional[float]  # None у последней корзины
+    count: int
+
+
+class ProductFacetsResponse(BaseModel):
+    total: int
+    categories: List[CategoryFacet]
+    price: List[RangeFacet]
+    rating: List[RangeFacet]
+
+
+def invalidate_product_facets():
+    """Сбрасывает фасеты; вызывается после коммита записи товаров"""
+    global _facet_generation
+    _facet_generation += 1
+    facet_cache.clear()
+
+
+def _bucket(column, edges: Sequence[float]):
+    # width_bucket возвращает 0 для значений меньше первой границы
+    return func.width_bucket(column, literal([float(edge) for edge in edges], ARRAY(Float)))
+
+
+def _ranges(counts: dict, edges: Sequence[float], first_min: float) -> List[dict]:
+    bounds = [first_min, *edges]
+    return [
+        {"min": bounds[index], "max": edges[index] if index < len(edges) else None, "count": counts.get(index, 0)}
+        for index in range(len(bounds))
+        # Корзина ниже первой границы есть только у рейтинга (товары без отзывов)
+        if index or first_min < edges[0]
+    ]
+
+
+async def query_product_facets(db: AsyncSession, filters: ProductFilters) -> dict:
+    filtered = (
+        select(
+            Product.category_id,
+            _bucket(Product.price, PRICE_BUCKET_EDGES).label("price_bucket"),
+            _bucket(Product.rating, RATING_BUCKET_EDGES).label("rating_bucket"),
+        )
+        .where(*filters.conditions())
+        .subquery()
+    )
+    columns = (filtered.c.category_id, filtered.c.price_bucket, filtered.c.rating_bucket)
+    # grouping() - битовая маска свернутых колонок: по ней видно, к какому
+    # набору относится строка (NULL категория от свертки не отличить иначе)
+    grouping = func.grouping(*columns).label("grouping")
+    result = await db.execute(
+        select(*columns, grouping, func.count().label("count"))
+        .group_by(func.grouping_sets(*(tuple_(column) for column in columns), tuple_()))
+    )
+
+    total = 0
+    categories, prices, ratings = [], {}, {}
+    for row in result:
+        if row.grouping == 0b011:
+            categories.append({"category_id": row.category_id, "count": row.count})
+        elif row.grouping == 0b101:
+            prices[row.price_bucket] = row.count
+        elif row.grouping == 0b110:
+            ratings[row.rating_bucket] = row.count
+        else:
+            total = row.count
+    categories.sort(key=lambda facet: (-facet["count"], facet["category_id"] is None, facet["category_id"]))
+    return {
+        "total": total,
+        "categories": categories,
+        "price": _ranges(prices, PRICE_BUCKET_EDGES, PRICE_BUCKET_EDGES[0]),
+        "rating": _ranges(ratings, RATING_BUCKET_EDGES, 0.0),
+    }
+
+
+async def get_product_facets(db: AsyncSession, filters: ProductFilters) -> dict:
+    facets = facet_cache.get(filters)
+    if facets is None:
+        generation = _facet_generation
+        facets = await query_product_facets(db, filters)
+        if generation == _facet_generation:
+            facet_cache.set(filters, facets)
+    return facets
@@ -0,0 +1,39 @@
+import os
+import secrets
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.auth import get_current_user, oauth2_scheme
+from app.cache import cache_stats
+from app.db.database import get_db, pool_status
+
+# Статический токен для сборщиков метрик и мониторинга, которые не умеют
+# получать JWT; без него служебные эндпоинты доступны только администраторам
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")
+
+
+async def require_internal_access(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """Пускает по INTERNAL_API_TOKEN или по токену администратора"""
+    if INTERNAL_API_TOKEN and secrets.compare_digest(token.encode(), INTERNAL_API_TOKEN.encode()):
+        return
+    user = await get_current_user(token, db)
+    if not user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+
+
+# Служебные эндпоинты для эксплуатации: смонтированы в основном приложении,
+# поэтому закрыты require_internal_access
+router = APIRouter(tags=["internal"], dependencies=[Depends(require_internal_access)])
+
+
+@router.get("/pool")
+async def read_pool_status():
+    """Состояние пула соединений текущего воркера"""
+    return pool_status()
+
+
+@router.get("/caches")
+async def read_cache_stats():
+    """Размер и попадания in-memory кэшей текущего воркера"""
+    return cache_stats()
@@ -1,9 +1,16 @@
-from fastapi import HTTPException, APIRouter, Depends
-from pydantic import BaseModel
-from app.db.models import Order, User, OrderDetail, Product, engine
+from datetime import datetime
+from fastapi import HTTPException, APIRouter, Depends, Query, Response
+from pydantic import BaseModel, Field
+from app.db.models import Order, User, OrderDetail, Product
+from app.db.database import get_db
+from app.api.v1.auth import CurrentUser, get_current_superuser
+from app.api.v1.pagination import NEXT_CURSOR_HEADER, apply_keyset, decode_cursor, encode_cursor
+from app.api.v1.responses import json_response, list_adapter
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from typing import Dict, List, Optional
+from sqlalchemy import Integer, column, func, insert, literal, select, values
+from sqlalchemy.exc import IntegrityError
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
@@ -43,12 +50,145 @@ class OrderDetailResponse(OrderDetailBase):
         from_attributes = True
 
 
-async def get_db():
-    async with AsyncSession(engine) as session:
-        yield session
+class OrderHistoryResponse(OrderBase):
+    id: int
+    created_at: datetime
+    status: str
+    details: List[OrderDetailResponse] = []
+
+    class Config:
+        from_attributes = True
+
+
+ORDER_STATUSES = ("new", "paid", "shipped", "delivered", "cancelled")
+ORDER_STATUS_PATTERN = "^(" + "|".join(ORDER_STATUSES) + ")$"
+# Ключ keyset пагинации истории: сначала новые
+ORDER_HISTORY_KEY = (Order.created_at, Order.id)
+order_history_list_adapter = list_adapter(OrderHistoryResponse)
+
+
+async def list_orders(
+        db: AsyncSession,
+        response: Response,
+        filters: tuple = (),
+        status: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+) -> List[Order]:
+    """Страница заказов вместе со строками
+
+    Ровно два запроса: страница заказов и строки всех ее заказов одним
+    selectinload (WHERE order_id IN (...)), без ленивых загрузок на заказ.
+    """
+    query = select(Order).where(*filters).options(selectinload(Order.details))
+    if status is not None:
+        query = query.where(Order.status == status)
+    if created_from is not None:
+        query = query.where(Order.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(Order.created_at < created_to)
+
+    after = decode_cursor(cursor, "-created_at", len(ORDER_HISTORY_KEY)) if cursor else None
+    query = apply_keyset(query, ORDER_HISTORY_KEY, True, after)
+
+    result = await db.execute(query.limit(limit + 1))
+    orders = result.scalars().all()
+    if len(orders) > limit:
+        orders = orders[:limit]
+        last = orders[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor("-created_at", [last.created_at, last.id])
+    return orders
+
+
+class CheckoutLine(BaseModel):
+    product_id: int
+    quantity: int = Field(1, ge=1, le=1000)
+
+
+class CheckoutRequest(BaseModel):
+    user_id: int
+    lines: List[CheckoutLine] = Field(..., min_length=1, max_length=500)
+
+
+class CheckoutResponse(OrderBase):
+    id: int
+    details: List[OrderDetailResponse]
+
+
+# Внешние ключи, которые checkout не проверяет заранее (пользователь) или
+# которые может нарушить параллельное удаление товара после проверки
+CHECKOUT_CONSTRAINT_ERRORS = {
+    "orders_user_id_fkey": "User not found",
+    "orderdetails_product_id_fkey": "Products not found",
+}
+
+
+def violated_constraint(error: IntegrityError) -> Optional[str]:
+    """Имя нарушенного ограничения; asyncpg кладет исходную ошибку в __cause__"""
+    return getattr(error.orig.__cause__, "constraint_name", None) or getattr(error.orig, "constraint_name", None)
 
 
 # Endpoints
+@router.post("/checkout", response_model=CheckoutResponse, status_code=201)
+async def checkout(request: CheckoutRequest, db: AsyncSession = Depends(get_db)):
+    """Создает заказ со всеми строками в одной транзакции
+
+    Сумма считается в базе по текущим ценам товаров, клиент ее не передает.
+    """
+    # Повторяющиеся товары складываем в одну строку
+    quantities: Dict[int, int] = {}
+    for line in request.lines:
+        quantities[line.product_id] = quantities.get(line.product_id, 0) + line.quantity
+
+    # Все товары проверяются одним запросом
+    result = await db.execute(select(Product.id).where(Product.id.in_(quantities)))
+    missing = set(quantities) - set(result.scalars())
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Products not found: {sorted(missing)}")
+
+    lines = values(
+        column("product_id", Integer), column("quantity", Integer), name="lines"
+    ).data(list(quantities.items()))
+
+    try:
+        order_row = (await db.execute(
+            insert(Order)
+            .from_select(
+                ["user_id", "total"],
+                select(literal(request.user_id), func.sum(Product.price * lines.c.quantity))
+                .select_from(lines.join(Product, Product.id == lines.c.product_id))
+            )
+            .returning(Order.id, Order.total)
+        )).one()
+
+        detail_rows = (await db.execute(
+            insert(OrderDetail)
+            .from_select(
+                ["order_id", "product_id", "quantity"],
+                select(literal(order_row.id), lines.c.product_id, lines.c.quantity)
+            )
+            .returning(OrderDetail.id, OrderDetail.order_id, OrderDetail.product_id, OrderDetail.quantity)
+        )).all()
+
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        detail = CHECKOUT_CONSTRAINT_ERRORS.get(violated_constraint(e), f"Order creation failed: {e.orig}")
+        raise HTTPException(status_code=400, detail=detail)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Order creation failed: {e}")
+
+    return {
+        "id": order_row.id,
+        "user_id": request.user_id,
+        "total": order_row.total,
+        "details": [row._asdict() for row in detail_rows],
+    }
+
+
 @router.post("/", response_model=OrderResponse, status_code=201)
 async def create_order(order: OrderCreate, db: AsyncSession = Depends(get_db)):
     user = await db.get(User, order.user_id)
@@ -67,11 +207,20 @@ async def create_order(order: OrderCreate, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=400, detail=f"Order creation failed: {e}")
 
 
-@router.get("/", response_model=List[OrderResponse])
-async def read_orders(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Order))
-    orders = result.scalars().all()
-    return orders
+@router.get("/", response_model=List[OrderHistoryResponse])
+async def read_orders(
+        response: Response,
+        db: AsyncSession = Depends(get_db),
+        current_user: CurrentUser = Depends(get_current_superuser),
+        order_status: Optional[str] = Query(None, alias="status", pattern=ORDER_STATUS_PATTERN),
+        created_from: Optional[datetime] = Query(None),
+        created_to: Optional[datetime] = Query(None),
+        cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+        limit: int = Query(50, ge=1, le=100),
+):
+    """Все заказы магазина постранично (только для администратора)"""
+    orders = await list_orders(db, response, (), order_status, created_from, created_to, cursor, limit)
+    return json_response(order_history_list_adapter, orders, response)
 
 
 @router.get("/{order_id}", response_model=OrderResponse)
@@ -94,6 +243,8 @@ async def create_order_detail(order_id: int, order_detail: OrderDetailCreate, db
 
     db_order_detail = OrderDetail(order_id=order_id, **order_detail.dict())
     db.add(db_order_detail)
+    # Заказ с новой строкой должен попасть в инкрементальную выгрузку
+    order.updated_at = func.now()
 
     try:
         await db.commit()
@@ -0,0 +1,81 @@
+import base64
+import binascii
+import json
+import math
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, literal, tuple_
+
+# Заголовок, в котором клиент получает курсор следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Unsupported cursor value: {value!r}")
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _bind(column, value):
+    """Значение из курсора как параметр с типом колонки
+
+    Курсор приходит от клиента: значение приводится к Python типу колонки,
+    а все, что не приводится, - 400, а не ошибка драйвера и 500.
+    """
+    python_type = column.type.python_type
+    if value is None or isinstance(value, bool):
+        raise _invalid_cursor()
+    if isinstance(column.type, DateTime):
+        if not isinstance(value, str):
+            raise _invalid_cursor()
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            raise _invalid_cursor()
+    elif python_type is float:
+        if not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise _invalid_cursor()
+        value = float(value)
+    elif not isinstance(value, python_type):
+        raise _invalid_cursor()
+    return literal(value, column.type)
+
+
+def encode_cursor(sort: str, values: Sequence[Any]) -> str:
+    """Упаковывает значения ключа последней строки в непрозрачный курсор"""
+    raw = json.dumps([sort, *values], separators=(",", ":"), ensure_ascii=False, default=_json_default)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, size: int) -> List[Any]:
+    """Распаковывает курсор и проверяет, что он выдан для той же сортировки"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error):
+        raise _invalid_cursor()
+
+    if not isinstance(data, list) or len(data) != size + 1 or data[0] != sort:
+        raise HTTPException(status_code=400, detail="Cursor does not match sort order")
+    return data[1:]
+
+
+def apply_keyset(query, columns: Sequence, descending: bool, after: Optional[Sequence[Any]] = None):
+    """Добавляет к запросу сортировку по ключу и условие «после курсора»
+
+    Ключ должен заканчиваться уникальной колонкой (обычно id),
+    иначе строки с одинаковым значением сортировки будут теряться.
+    """
+    key = tuple_(*columns)
+    if after is not None:
+        bound = tuple_(*(_bind(column, value) for column, value in zip(columns, after)))
+        query = query.where(key < bound if descending else key > bound)
+
+    order_by = [column.desc() for column in columns] if descending else list(columns)
+    return query.order_by(*order_by)
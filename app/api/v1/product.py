@@ -1,17 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Header, HTTPException, status, UploadFile, File, Form, Query, Response
+from pydantic import BaseModel, computed_field
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List, Optional
+from sqlalchemy import func, insert, select, text, update
+from typing import Annotated, Dict, List, Optional, Union
 from pathlib import Path
 import os
-import json
+import logging
 import uuid
 from datetime import datetime
 
-from app.db.models import Product
+from app.db.models import PRODUCT_SEARCH_CONFIG, Product, ProductImage, ProductRatingStats, Review
 from app.db.database import get_db
-from app.api.v1.auth import get_current_user
+from app.db.product_import import (
+    IMPORT_FORMATS, ImportFileError, ProductImportReport, detect_format, import_products, text_stream
+)
+from app.api.v1.auth import get_current_superuser, get_current_user
+from app.api.v1.facets import ProductFacetsResponse, ProductFilters, get_product_facets, invalidate_product_facets
+from app.api.v1.conditional import (
+    PRODUCT_CACHE_CONTROL, PRODUCT_LIST_CACHE_CONTROL, etag_matches, make_etag, not_modified, set_cache_headers
+)
+from app.api.v1.pagination import NEXT_CURSOR_HEADER, apply_keyset, decode_cursor, encode_cursor
+from app.api.v1.uploads import save_image_upload
+from app.api.v1.responses import json_response, list_adapter
+from app.api.v1.review import REVIEW_SORT_PATTERN, ReviewResponse, list_reviews, review_list_adapter
+from app.images import image_variant_urls, remove_image, schedule_image_variants
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["products"])  # Изменен префикс
 
@@ -33,9 +47,23 @@ class ProductCreate(ProductBase):
 
 class ProductResponse(ProductBase):
     id: int
+    sku: Optional[str] = None
     main_image: Optional[str] = None
     additional_images_urls: Optional[List[str]] = None
 
+    # Уменьшенные копии картинок (thumb/list/detail, JPEG и WebP)
+    @computed_field
+    @property
+    def main_image_variants(self) -> Optional[Dict[str, str]]:
+        return image_variant_urls(self.main_image)
+
+    @computed_field
+    @property
+    def additional_images_variants(self) -> Optional[List[Dict[str, str]]]:
+        if self.additional_images_urls is None:
+            return None
+        return [image_variant_urls(url) for url in self.additional_images_urls]
+
     class Config:
         from_attributes = True
         json_schema_extra = {
@@ -54,16 +82,68 @@ class ProductResponse(ProductBase):
         }
 
 
-def save_product_image(file: UploadFile, product_id: int, is_main: bool = False) -> str:
-    """Сохраняет изображение товара и возвращает его URL"""
-    ext = file.filename.split(".")[-1].lower()
-    prefix = "main" if is_main else "additional"
-    filename = f"{prefix}_{product_id}_{uuid.uuid4()}.{ext}"
-    save_path = PRODUCT_IMAGE_DIR / filename
+class ProductSearchResult(ProductResponse):
+    rank: float
+    snippet: Optional[str] = None
+
+
+class ProductCardResponse(BaseModel):
+    """Карточка товара для сеток и списков: без описания и доп. картинок"""
+    id: int
+    name: str
+    category_id: int
+    price: float
+    rating: float
+    main_image: Optional[str] = None
 
-    with open(save_path, "wb") as buffer:
-        buffer.write(file.file.read())
+    @computed_field
+    @property
+    def main_image_variants(self) -> Optional[Dict[str, str]]:
+        return image_variant_urls(self.main_image)
 
+    class Config:
+        from_attributes = True
+
+
+# Колонки карточки; в них же все ключи сортировки и версия строки для ETag
+PRODUCT_CARD_COLUMNS = (
+    Product.id, Product.name, Product.category_id, Product.price, Product.rating, Product.main_image,
+    Product.updated_at,
+)
+
+product_list_adapter = list_adapter(ProductResponse)
+product_card_list_adapter = list_adapter(ProductCardResponse)
+product_search_adapter = list_adapter(ProductSearchResult)
+
+
+class ProductRatingResponse(BaseModel):
+    product_id: int
+    rating: float
+    review_count: int
+    histogram: Dict[int, int]  # число отзывов по звездам 1-5
+
+
+async def attach_image_urls(db: AsyncSession, products) -> None:
+    """Проставляет additional_images_urls всей странице товаров одним запросом"""
+    if not products:
+        return
+    result = await db.execute(
+        select(ProductImage.product_id, ProductImage.url)
+        .where(ProductImage.product_id.in_([product.id for product in products]))
+        .order_by(ProductImage.product_id, ProductImage.position, ProductImage.id)
+    )
+    urls: Dict[int, List[str]] = {}
+    for product_id, url in result:
+        urls.setdefault(product_id, []).append(url)
+    for product in products:
+        product.additional_images_urls = urls.get(product.id)
+
+
+async def save_product_image(file: UploadFile, product_id: int, is_main: bool = False) -> str:
+    """Сохраняет изображение товара и возвращает его URL"""
+    prefix = "main" if is_main else "additional"
+    filename = await save_image_upload(file, PRODUCT_IMAGE_DIR, f"{prefix}_{product_id}_{uuid.uuid4()}")
+    schedule_image_variants(PRODUCT_IMAGE_DIR / filename)
     return f"/static/images/products/{filename}"
 
 
@@ -89,32 +169,74 @@ async def create_product(
         description=description
     )
 
+    saved_urls = []
     try:
         db.add(db_product)
-        await db.commit()
-        await db.refresh(db_product)
+        # flush выдает id для имен файлов, но товар остается в транзакции
+        # и откатывается вместе с ней, если картинку не удалось сохранить
+        await db.flush()
 
         # Обработка изображений
         if main_image:
-            db_product.main_image = save_product_image(main_image, db_product.id, True)
+            db_product.main_image = await save_product_image(main_image, db_product.id, True)
+            saved_urls.append(db_product.main_image)
 
-        if additional_images:
-            additional_urls = [save_product_image(img, db_product.id) for img in additional_images]
-            db_product.additional_images = json.dumps(additional_urls)
+        additional_urls = []
+        for position, img in enumerate(additional_images or []):
+            additional_urls.append(await save_product_image(img, db_product.id))
+            saved_urls.append(additional_urls[-1])
+            db.add(ProductImage(product_id=db_product.id, position=position, url=additional_urls[-1]))
 
         await db.commit()
+        invalidate_product_facets()
         await db.refresh(db_product)
+        db_product.additional_images_urls = additional_urls or None
         return db_product
     except Exception as e:
         # Откат изменений при ошибке
         await db.rollback()
         # Удаление уже сохраненных файлов
-        if hasattr(db_product, 'main_image') and db_product.main_image:
-            os.remove(PRODUCT_IMAGE_DIR / db_product.main_image.split("/")[-1])
-        if hasattr(db_product, 'additional_images') and db_product.additional_images:
-            for img_url in json.loads(db_product.additional_images):
-                os.remove(PRODUCT_IMAGE_DIR / img_url.split("/")[-1])
+        for img_url in saved_urls:
+            try:
+                remove_image(PRODUCT_IMAGE_DIR / img_url.split("/")[-1])
+            except FileNotFoundError:
+                pass
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/import", response_model=ProductImportReport)
+async def import_products_file(
+        file: UploadFile = File(..., description="CSV с заголовком или JSONL: sku, name, category_id, price, description"),
+        format: Optional[str] = Query(None, pattern="^(" + "|".join(sorted(set(IMPORT_FORMATS.values()))) + ")$"),
+        db: AsyncSession = Depends(get_db),
+        current_user=Depends(get_current_superuser)
+):
+    """Массовый импорт и обновление товаров по артикулу (только для администратора)
+
+    Пачки коммитятся по мере загрузки: если файл оборвался посередине,
+    уже загруженные строки остаются, а повторный импорт того же файла
+    ничего не меняет.
+    """
+    try:
+        fmt = format or detect_format(file.filename)
+        stream = text_stream(file.file)
+        try:
+            report = await import_products(
+                db, stream, fmt,
+                on_progress=lambda r: logger.info("Product import %s: %s rows, %s failed", file.filename, r.rows, r.failed),
+            )
+        finally:
+            # Сам файл закроет UploadFile
+            stream.detach()
+    except ImportFileError as e:
+        await db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        # Пачки до ошибки уже закоммичены
+        invalidate_product_facets()
+    return report
 
 
 # @router.get("/", response_model=List[ProductResponse])
@@ -141,36 +263,195 @@ async def create_product(
 #
 #     return products
 
-@router.get("/", response_model=List[ProductResponse])
+# Допустимые сортировки списка товаров: имя -> колонки keyset ключа.
+# Последней колонкой всегда идет id, чтобы ключ был уникальным.
+# Под каждую есть индексы (колонка, id) и (category_id, колонка, id),
+# так что страница - range scan индекса без сортировки
+PRODUCT_SORTS = {
+    "id": (Product.id,),
+    "price": (Product.price, Product.id),
+    "rating": (Product.rating, Product.id),
+    "name": (Product.name, Product.id),
+}
+# Сортировки-синонимы. id выдается по возрастанию при создании товара,
+# поэтому новые товары - это обратный порядок id. Сортировки без "-" идут
+# по возрастанию, и rating показал бы сначала худшие товары - для витрины
+# есть top_rated
+PRODUCT_SORT_ALIASES = {"newest": "-id", "top_rated": "-rating"}
+PRODUCT_SORT_PATTERN = "^(" + "|".join(PRODUCT_SORT_ALIASES) + "|-?(" + "|".join(PRODUCT_SORTS) + "))$"
+
+
+def product_list_query(view: str, filters: ProductFilters, ids: Optional[List[int]], sort: str,
+                       cursor: Optional[str], skip: int, limit: int):
+    """Запрос страницы списка товаров (на строку больше limit) и колонки ее ключа"""
+    sort = PRODUCT_SORT_ALIASES.get(sort, sort)
+    descending = sort.startswith("-")
+    columns = PRODUCT_SORTS[sort.lstrip("-")]
+
+    # Для карточек - Core select нужных колонок: строки идут прямо в схему,
+    # без ORM объектов, identity map, описаний и запроса картинок
+    query = select(*PRODUCT_CARD_COLUMNS) if view == "card" else select(Product)
+    query = query.where(*filters.conditions())
+    if ids:
+        query = query.where(Product.id.in_(ids))
+
+    # Keyset пагинация по (колонка сортировки, id); skip оставлен для старых клиентов
+    after = decode_cursor(cursor, sort, len(columns)) if cursor else None
+    query = apply_keyset(query, columns, descending, after)
+    if after is None and skip:
+        query = query.offset(skip)
+
+    # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+    return query.limit(limit + 1), columns
+
+
+@router.get("/", response_model=Union[List[ProductResponse], List[ProductCardResponse]])
 async def read_products(
+        response: Response,
         db: AsyncSession = Depends(get_db),
         skip: int = 0,
         limit: int = 100,
         category_id: Optional[int] = Query(None),
-        ids: Optional[str] = Query(None)  # Добавляем параметр для фильтрации по ID
+        ids: Optional[str] = Query(None),  # Добавляем параметр для фильтрации по ID
+        sort: str = Query(
+            "id", pattern=PRODUCT_SORT_PATTERN,
+            description="id, price, rating, name - по возрастанию, с префиксом \"-\" - по убыванию; "
+                        "newest - сначала новые, top_rated - сначала с высоким рейтингом",
+        ),
+        cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+        view: str = Query("full", pattern="^(full|card)$", description="card - только поля карточки товара"),
+        min_price: Annotated[Optional[float], Query(ge=0)] = None,
+        max_price: Annotated[Optional[float], Query(ge=0)] = None,
+        min_rating: Annotated[Optional[float], Query(ge=0, le=5)] = None,
+        if_none_match: Annotated[Optional[str], Header()] = None
 ):
-    query = select(Product).offset(skip).limit(limit)
+    # Преобразуем строку "1,2,3" в список [1, 2, 3]
+    id_list = [int(id) for id in ids.split(",")] if ids else None
+    filters = ProductFilters(category_id, min_price, max_price, min_rating)
+    query, columns = product_list_query(view, filters, id_list, sort, cursor, skip, limit)
+
+    if if_none_match:
+        # Та же страница, но только версии строк: без загрузки товаров и сериализации
+        result = await db.execute(query.with_only_columns(Product.id, Product.updated_at))
+        versions = [(row.id, row.updated_at) for row in result]
+        etag = product_list_etag(view, versions[:limit], len(versions) > limit)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, PRODUCT_LIST_CACHE_CONTROL)
+
+    result = await db.execute(query)
+    products = result.all() if view == "card" else result.scalars().all()
+
+    has_next = len(products) > limit
+    if has_next:
+        products = products[:limit]
+        last = products[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            PRODUCT_SORT_ALIASES.get(sort, sort), [getattr(last, column.key) for column in columns]
+        )
+    # ETag считаем по тем строкам, что реально отдаем
+    set_cache_headers(
+        response,
+        product_list_etag(view, [(product.id, product.updated_at) for product in products], has_next),
+        PRODUCT_LIST_CACHE_CONTROL,
+    )
+
+    if view == "card":
+        return json_response(product_card_list_adapter, products, response)
+    await attach_image_urls(db, products)
+    return json_response(product_list_adapter, products, response)
+
+
+def product_list_etag(view: str, versions, has_next: bool) -> str:
+    """ETag страницы: версии ее строк и наличие следующей страницы (от него зависит курсор)"""
+    return make_etag(f"products:{view}", [*versions, has_next])
+
+
+# Параметры подсветки совпадений в сниппете
+SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, MaxFragments=2"
+# Сколько совпадений максимум ранжируем: у слишком общих запросов («куртка»,
+# ~60 тысяч совпадений на 1M товаров) ts_rank по всем стоит ~300 мс, с этим
+# пределом p95 таких запросов ~40 мс (benchmarks/bench_search.py)
+SEARCH_CANDIDATE_LIMIT = 500
+
 
+def html_escaped(column):
+    """Текст с экранированными &, < и >: в сниппете разметкой остается только <mark>"""
+    return func.replace(func.replace(func.replace(column, "&", "&amp;"), "<", "&lt;"), ">", "&gt;")
+
+
+@router.get("/search", response_model=List[ProductSearchResult])
+async def search_products(
+        q: str = Query(..., min_length=2, max_length=200),
+        category_id: Optional[int] = Query(None),
+        min_price: Optional[float] = Query(None, ge=0),
+        max_price: Optional[float] = Query(None, ge=0),
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0, le=1000),
+        db: AsyncSession = Depends(get_db)
+):
+    tsquery = func.websearch_to_tsquery(PRODUCT_SEARCH_CONFIG, q)
+
+    # Кандидаты - SEARCH_CANDIDATE_LIMIT самых новых совпадений: порядок по id
+    # задан явно, так что набор не зависит от выбранного плана. Ранжируются
+    # только они, а дорогой ts_headline считается только для итоговой страницы
+    candidates = select(Product.id, Product.search_vector).where(Product.search_vector.op("@@")(tsquery))
     if category_id is not None:
-        query = query.where(Product.category_id == category_id)
+        candidates = candidates.where(Product.category_id == category_id)
+    if min_price is not None:
+        candidates = candidates.where(Product.price >= min_price)
+    if max_price is not None:
+        candidates = candidates.where(Product.price <= max_price)
+    candidates = candidates.order_by(Product.id.desc()).limit(SEARCH_CANDIDATE_LIMIT).subquery()
+
+    rank = func.ts_rank(candidates.c.search_vector, tsquery)
+    ranked = (
+        select(candidates.c.id, rank.label("rank"))
+        .order_by(rank.desc(), candidates.c.id)
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
 
-    if ids:
-        # Преобразуем строку "1,2,3" в список [1, 2, 3]
-        id_list = [int(id) for id in ids.split(",")]
-        query = query.where(Product.id.in_(id_list))
+    # Описание экранируется до подсветки: HTML из описания товара
+    # не попадает к клиенту как разметка
+    snippet = func.ts_headline(
+        PRODUCT_SEARCH_CONFIG,
+        html_escaped(func.coalesce(Product.description, Product.name)),
+        tsquery,
+        SEARCH_HEADLINE_OPTIONS
+    )
+    query = (
+        select(Product, ranked.c.rank, snippet.label("snippet"))
+        .join(ranked, ranked.c.id == Product.id)
+        .order_by(ranked.c.rank.desc(), Product.id)
+    )
 
+    # asyncpg кэширует подготовленные запросы, и после нескольких вызовов Postgres
+    # переходит на generic план, не видя текста запроса. Для поиска он выбирает
+    # BitmapAnd с индексом по цене и читает сотни тысяч строк, поэтому
+    # в этой транзакции план всегда строится под конкретные параметры
+    await db.execute(text("SET LOCAL plan_cache_mode = force_custom_plan"))
     result = await db.execute(query)
-    products = result.scalars().all()
+    products = []
+    for product, product_rank, product_snippet in result.all():
+        product.rank = product_rank
+        product.snippet = product_snippet
+        products.append(product)
+    await attach_image_urls(db, products)
 
-    # Преобразование JSON строки в список
-    for product in products:
-        if product.additional_images:
-            try:
-                product.additional_images_urls = json.loads(product.additional_images)
-            except json.JSONDecodeError:
-                product.additional_images_urls = []
+    return json_response(product_search_adapter, products)
 
-    return products
+
+@router.get("/facets", response_model=ProductFacetsResponse)
+async def read_product_facets(
+        category_id: Optional[int] = Query(None),
+        min_price: Optional[float] = Query(None, ge=0),
+        max_price: Optional[float] = Query(None, ge=0),
+        min_rating: Optional[float] = Query(None, ge=0, le=5),
+        db: AsyncSession = Depends(get_db)
+):
+    """Число товаров по категориям, корзинам цены и рейтинга для набора фильтров"""
+    return await get_product_facets(db, ProductFilters(category_id, min_price, max_price, min_rating))
 
 
 @router.post("/{product_id}/upload-image")
@@ -189,39 +470,97 @@ async def upload_product_image(
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
+    image_url = await save_product_image(image, product_id, is_main)
     try:
-        image_url = save_product_image(image, product_id, is_main)
-
         if is_main:
             # Удаление старого изображения
             if product.main_image:
                 try:
-                    os.remove(PRODUCT_IMAGE_DIR / product.main_image.split("/")[-1])
+                    remove_image(PRODUCT_IMAGE_DIR / product.main_image.split("/")[-1])
                 except FileNotFoundError:
                     pass
             product.main_image = image_url
         else:
-            # Добавление к дополнительным изображениям
-            additional = json.loads(product.additional_images) if product.additional_images else []
-            additional.append(image_url)
-            product.additional_images = json.dumps(additional)
+            # Добавление в конец списка без чтения и перезаписи остальных картинок.
+            # UPDATE товара блокирует строку (параллельные загрузки получают разные
+            # позиции) и двигает updated_at, от которого зависит ETag
+            await db.execute(update(Product).where(Product.id == product_id).values(updated_at=func.now()))
+            next_position = (
+                select(func.coalesce(func.max(ProductImage.position) + 1, 0))
+                .where(ProductImage.product_id == product_id)
+                .scalar_subquery()
+            )
+            await db.execute(insert(ProductImage).values(product_id=product_id, position=next_position, url=image_url))
 
         await db.commit()
         await db.refresh(product)
         return {"message": "Image uploaded successfully", "image_url": image_url}
     except Exception as e:
         await db.rollback()
+        try:
+            remove_image(PRODUCT_IMAGE_DIR / image_url.split("/")[-1])
+        except FileNotFoundError:
+            pass
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.get("/{product_id}/rating", response_model=ProductRatingResponse)
+async def read_product_rating(product_id: int, db: AsyncSession = Depends(get_db)):
+    """Рейтинг и гистограмма оценок из агрегатов, без чтения отзывов"""
+    stats = ProductRatingStats
+    row = (await db.execute(
+        select(
+            Product.rating, stats.review_count,
+            stats.stars_1, stats.stars_2, stats.stars_3, stats.stars_4, stats.stars_5,
+        )
+        .outerjoin(stats, stats.product_id == Product.id)
+        .where(Product.id == product_id)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    return {
+        "product_id": product_id,
+        "rating": row.rating,
+        "review_count": row.review_count or 0,
+        "histogram": {star: getattr(row, f"stars_{star}") or 0 for star in range(1, 6)},
+    }
+
+
+@router.get("/{product_id}/reviews", response_model=List[ReviewResponse])
+async def read_product_reviews(
+        product_id: int,
+        response: Response,
+        db: AsyncSession = Depends(get_db),
+        rating: Optional[int] = Query(None, ge=1, le=5),
+        sort: str = Query("newest", pattern=REVIEW_SORT_PATTERN),
+        cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+        limit: int = Query(20, ge=1, le=100),
+):
+    """Отзывы о товаре постранично"""
+    reviews = await list_reviews(db, response, (Review.product_id == product_id,), rating, sort, cursor, limit)
+    return json_response(review_list_adapter, reviews, response)
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
-async def read_product(product_id: int, db: AsyncSession = Depends(get_db)):
+async def read_product(
+        product_id: int,
+        response: Response,
+        db: AsyncSession = Depends(get_db),
+        if_none_match: Annotated[Optional[str], Header()] = None
+):
+    if if_none_match:
+        # Клиенту, у которого уже есть актуальная версия, хватает одной колонки
+        updated_at = await db.scalar(select(Product.updated_at).where(Product.id == product_id))
+        if updated_at is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        etag = make_etag("product", [(product_id, updated_at)])
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, PRODUCT_CACHE_CONTROL)
+
     product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    if product.additional_images:
-        try:
-            product.additional_images_urls = json.loads(product.additional_images)
-        except json.JSONDecodeError:
-            product.additional_images_urls = []
+    set_cache_headers(response, make_etag("product", [(product.id, product.updated_at)]), PRODUCT_CACHE_CONTROL)
+    await attach_image_urls(db, [product])
     return product
@@ -0,0 +1,26 @@
+"""Сериализация списков сразу в байты
+
+Для response_model FastAPI сначала превращает ORM объекты в dict и list
+(validate + dump_python), а потом кодирует их в JSON. Для больших страниц
+быстрее провалидировать их одним TypeAdapter и отдать dump_json: pydantic-core
+пишет байты сам, без промежуточных питоновских структур. response_model
+у маршрутов остается для документации OpenAPI.
+"""
+from typing import Any, List, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+def list_adapter(model) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def json_response(adapter: TypeAdapter, content: Any, response: Optional[Response] = None) -> Response:
+    """JSON ответ из ORM объектов через схему адаптера"""
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+    result = Response(content=body, media_type="application/json")
+    if response is not None:
+        # Заголовки, выставленные обработчиком (курсор, ETag), сами не переносятся
+        result.raw_headers.extend(response.headers.raw)
+    return result
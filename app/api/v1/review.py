@@ -1,8 +1,13 @@
-from fastapi import HTTPException, APIRouter, Depends
+from fastapi import HTTPException, APIRouter, Depends, Query, Response
 from pydantic import BaseModel, Field
-from app.db.models import Review, User, Product, engine
+from app.db.models import Review, User, Product
+from app.db.database import get_db
+from app.db.ratings import apply_rating_delta
+from app.api.v1.facets import invalidate_product_facets
+from app.api.v1.pagination import NEXT_CURSOR_HEADER, apply_keyset, decode_cursor, encode_cursor
+from app.api.v1.responses import json_response, list_adapter
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 from sqlalchemy import select
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
@@ -27,9 +32,49 @@ class ReviewResponse(ReviewBase):
         from_attributes = True
 
 
-async def get_db():
-    async with AsyncSession(engine) as session:
-        yield session
+# Сортировки списков отзывов: имя -> (колонки keyset ключа, по убыванию).
+# Отдельной даты у отзыва нет, новизну задает id
+REVIEW_SORTS = {
+    "newest": ((Review.id,), True),
+    "highest": ((Review.rating, Review.id), True),
+}
+REVIEW_SORT_PATTERN = "^(" + "|".join(REVIEW_SORTS) + ")$"
+review_list_adapter = list_adapter(ReviewResponse)
+
+
+async def list_reviews(
+        db: AsyncSession,
+        response: Response,
+        filters: tuple = (),
+        rating: Optional[int] = None,
+        sort: str = "newest",
+        cursor: Optional[str] = None,
+        limit: int = 20,
+) -> List[Review]:
+    """Страница отзывов с keyset пагинацией
+
+    Курсор следующей страницы отдается в заголовке X-Next-Cursor. Запросы по
+    товару и по пользователю идут по индексам (owner, id) и (owner, rating, id).
+    """
+    columns, descending = REVIEW_SORTS[sort]
+    query = select(Review).where(*filters)
+    if rating is not None:
+        query = query.where(Review.rating == rating)
+    elif sort == "highest":
+        query = query.where(Review.rating.isnot(None))
+
+    after = decode_cursor(cursor, sort, len(columns)) if cursor else None
+    query = apply_keyset(query, columns, descending, after)
+
+    result = await db.execute(query.limit(limit + 1))
+    reviews = result.scalars().all()
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        last = reviews[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            sort, [getattr(last, column.key) for column in columns]
+        )
+    return reviews
 
 
 # Эндпоинты
@@ -46,7 +91,9 @@ async def create_review(review: ReviewCreate, db: AsyncSession = Depends(get_db)
     db_review = Review(**review.dict())
     db.add(db_review)
     try:
+        await apply_rating_delta(db, review.product_id, review.rating, 1)
         await db.commit()
+        invalidate_product_facets()
         await db.refresh(db_review)
         return db_review
     except Exception as e:
@@ -55,10 +102,16 @@ async def create_review(review: ReviewCreate, db: AsyncSession = Depends(get_db)
 
 
 @router.get("/", response_model=List[ReviewResponse])
-async def read_reviews(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Review))
-    reviews = result.scalars().all()
-    return reviews
+async def read_reviews(
+        response: Response,
+        db: AsyncSession = Depends(get_db),
+        rating: Optional[int] = Query(None, ge=1, le=5),
+        sort: str = Query("newest", pattern=REVIEW_SORT_PATTERN),
+        cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+        limit: int = Query(100, ge=1, le=100),
+):
+    reviews = await list_reviews(db, response, (), rating, sort, cursor, limit)
+    return json_response(review_list_adapter, reviews, response)
 
 
 @router.get("/{review_id}", response_model=ReviewResponse)
@@ -69,9 +122,19 @@ async def read_review(review_id: int, db: AsyncSession = Depends(get_db)):
     return review
 
 
+async def get_review_for_update(db: AsyncSession, review_id: int) -> Optional[Review]:
+    """Отзыв с блокировкой строки (SELECT ... FOR UPDATE) до конца транзакции"""
+    result = await db.execute(
+        select(Review).where(Review.id == review_id).with_for_update().execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
+
 @router.put("/{review_id}", response_model=ReviewResponse)
 async def update_review(review_id: int, review: ReviewBase, db: AsyncSession = Depends(get_db)):
-    db_review = await db.get(Review, review_id)
+    # Старые товар и оценка идут в дельту агрегата: строка блокируется до
+    # коммита, иначе два параллельных изменения вычтут одну оценку дважды
+    db_review = await get_review_for_update(db, review_id)
     if not db_review:
         raise HTTPException(status_code=404, detail="Review not found")
     # Проверяем, существует ли пользователь и продукт
@@ -82,10 +145,15 @@ async def update_review(review_id: int, review: ReviewBase, db: AsyncSession = D
     if not product:
         raise HTTPException(status_code=400, detail="Product not found")
 
+    old_product_id, old_rating = db_review.product_id, db_review.rating
     for key, value in review.dict(exclude_unset=True).items():
         setattr(db_review, key, value)
     try:
+        if (old_product_id, old_rating) != (db_review.product_id, db_review.rating):
+            await apply_rating_delta(db, old_product_id, old_rating, -1)
+            await apply_rating_delta(db, db_review.product_id, db_review.rating, 1)
         await db.commit()
+        invalidate_product_facets()
         await db.refresh(db_review)
         return db_review
     except Exception as e:
@@ -95,9 +163,11 @@ async def update_review(review_id: int, review: ReviewBase, db: AsyncSession = D
 
 @router.delete("/{review_id}", response_model=ReviewResponse)
 async def delete_review(review_id: int, db: AsyncSession = Depends(get_db)):
-    db_review = await db.get(Review, review_id)
+    db_review = await get_review_for_update(db, review_id)
     if not db_review:
         raise HTTPException(status_code=404, detail="Review not found")
     await db.delete(db_review)
+    await apply_rating_delta(db, db_review.product_id, db_review.rating, -1)
     await db.commit()
+    invalidate_product_facets()
     return db_review
@@ -0,0 +1,66 @@
+import os
+from contextlib import suppress
+from pathlib import Path
+from typing import Optional
+
+import anyio
+from fastapi import HTTPException, UploadFile, status
+
+# Файл читается и пишется кусками фиксированного размера, поэтому память
+# на загрузку не зависит от размера фотографии
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(10 * 1024 * 1024)))
+ALLOWED_IMAGE_TYPES = ("jpg", "png", "gif", "webp")
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Определяет тип картинки по сигнатуре, а не по имени файла"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+async def save_image_upload(file: UploadFile, directory: Path, stem: str,
+                            max_size: int = MAX_UPLOAD_SIZE) -> str:
+    """Потоково сохраняет картинку в directory и возвращает имя файла
+
+    Расширение берется из сигнатуры файла. Данные пишутся во временный файл
+    рядом с итоговым и переименовываются атомарно, так что по URL никогда
+    не отдается недописанный файл; при любой ошибке временный файл удаляется.
+    """
+    head = await file.read(UPLOAD_CHUNK_SIZE)
+    ext = sniff_image_type(head)
+    if ext is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported image type, allowed: {', '.join(ALLOWED_IMAGE_TYPES)}"
+        )
+
+    filename = f"{stem}.{ext}"
+    tmp_path = directory / f".{filename}.part"
+    size = 0
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as buffer:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File too large, limit is {max_size} bytes"
+                    )
+                await buffer.write(chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        await anyio.to_thread.run_sync(os.replace, tmp_path, directory / filename)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+    return filename
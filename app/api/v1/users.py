@@ -1,11 +1,12 @@
-from fastapi import HTTPException, APIRouter, Depends, status
+from fastapi import HTTPException, APIRouter, Depends, Query, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, Field, EmailStr
-from app.db.models import User, engine
+from app.db.models import Order, Review, User
+from app.db.database import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from sqlalchemy import select
-from datetime import timedelta
+from typing import List, Optional
+from sqlalchemy import select, update
+from datetime import datetime, timedelta
 
 
 from app.api.v1.auth import (
@@ -15,7 +16,12 @@ from app.api.v1.auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     Token,
     get_current_user, verify_password,
+    invalidate_user,
+    CurrentUser,
 )
+from app.api.v1.review import REVIEW_SORT_PATTERN, ReviewResponse, list_reviews, review_list_adapter
+from app.api.v1.orders import ORDER_STATUS_PATTERN, OrderHistoryResponse, list_orders, order_history_list_adapter
+from app.api.v1.responses import json_response
 
 router = APIRouter(tags=["users"])
 # router = APIRouter(prefix="/api/v1/users", tags=["users"])
@@ -46,15 +52,11 @@ class ChangePasswordRequest(BaseModel):
     current_password: str
     new_password: str = Field(..., min_length=8)
 
-async def get_db():
-    async with AsyncSession(engine) as session:
-        yield session
-
 
 # Эндпоинты
 @router.post("/", response_model=UserResponse, status_code=201)
 async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -75,7 +77,7 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: CurrentUser = Depends(get_current_user)):
     return current_user
 
 
@@ -94,6 +96,42 @@ async def read_user(user_id: int, db: AsyncSession = Depends(get_db)):
     return user
 
 
+@router.get("/{user_id}/reviews", response_model=List[ReviewResponse])
+async def read_user_reviews(
+        user_id: int,
+        response: Response,
+        db: AsyncSession = Depends(get_db),
+        rating: Optional[int] = Query(None, ge=1, le=5),
+        sort: str = Query("newest", pattern=REVIEW_SORT_PATTERN),
+        cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+        limit: int = Query(20, ge=1, le=100),
+):
+    """Отзывы пользователя постранично"""
+    reviews = await list_reviews(db, response, (Review.user_id == user_id,), rating, sort, cursor, limit)
+    return json_response(review_list_adapter, reviews, response)
+
+
+@router.get("/{user_id}/orders", response_model=List[OrderHistoryResponse])
+async def read_user_orders(
+        user_id: int,
+        response: Response,
+        db: AsyncSession = Depends(get_db),
+        current_user: CurrentUser = Depends(get_current_user),
+        order_status: Optional[str] = Query(None, alias="status", pattern=ORDER_STATUS_PATTERN),
+        created_from: Optional[datetime] = Query(None),
+        created_to: Optional[datetime] = Query(None),
+        cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+        limit: int = Query(50, ge=1, le=100),
+):
+    """История заказов пользователя, сначала новые"""
+    if current_user.id != user_id and not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    orders = await list_orders(
+        db, response, (Order.user_id == user_id,), order_status, created_from, created_to, cursor, limit
+    )
+    return json_response(order_history_list_adapter, orders, response)
+
+
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(
     user_id: int, user: UserBase, db: AsyncSession = Depends(get_db)
@@ -107,10 +145,11 @@ async def update_user(
     try:
         await db.commit()
         await db.refresh(db_user)
-        return db_user
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=400, detail=f"User update failed: {e}")
+    invalidate_user(user_id)
+    return db_user
 
 
 @router.delete("/{user_id}", response_model=UserResponse)
@@ -120,6 +159,7 @@ async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
     await db.delete(db_user)
     await db.commit()
+    invalidate_user(user_id)
     return db_user
 
 
@@ -143,28 +183,37 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 @router.post("/change-password", response_model=dict)
 async def change_password(
         password_data: ChangePasswordRequest,
-        current_user: User = Depends(get_current_user),
+        current_user: CurrentUser = Depends(get_current_user),
         db: AsyncSession = Depends(get_db)
 ):
+    # Хеш берем из базы: в кэше пользователей его нет, а пароль мог смениться
+    # через другой воркер
+    hashed_password = await db.scalar(select(User.hashed_password).where(User.id == current_user.id))
+    if hashed_password is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+
     # Проверяем текущий пароль
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await verify_password(password_data.current_password, hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
 
     # Хешируем новый пароль
-    new_hashed_password = get_password_hash(password_data.new_password)
+    new_hashed_password = await get_password_hash(password_data.new_password)
 
-    # Обновляем пароль в базе данных
-    current_user.hashed_password = new_hashed_password
+    # Обновляем пароль в базе данных. current_user - снимок из кэша,
+    # а не объект сессии, поэтому пишем через UPDATE
     try:
+        await db.execute(
+            update(User).where(User.id == current_user.id).values(hashed_password=new_hashed_password)
+        )
         await db.commit()
-        await db.refresh(current_user)
-        return {"message": "Password updated successfully"}
     except Exception as e:
         await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to update password: {e}"
         )
+    invalidate_user(current_user.id)
+    return {"message": "Password updated successfully"}
@@ -8,6 +8,7 @@ CREATE TABLE public.users (
     last_name varchar(50) NULL,
     is_active bool NULL,
     is_superuser bool NULL,
+    updated_at timestamptz DEFAULT now() NOT NULL,
     CONSTRAINT users_pkey PRIMARY KEY (id)
 );
 
@@ -16,18 +17,21 @@ CREATE TABLE public.categories (
     name varchar(100) NULL,
     image_url varchar(255) NULL,
     thumbnail_url varchar(255) NULL,
+    updated_at timestamptz DEFAULT now() NOT NULL,
     CONSTRAINT categories_pkey PRIMARY KEY (id)
 );
 
 CREATE TABLE public.products (
     id int4 GENERATED BY DEFAULT AS IDENTITY( INCREMENT BY 1 MINVALUE 1 MAXVALUE 2147483647 START 1 CACHE 1 NO CYCLE) NOT NULL,
-    name varchar(255) NULL,
+    name varchar(255) NOT NULL,
+    sku varchar(64) NULL,
     category_id int4 NULL,
-    price float8 NULL,
-    rating float8 NULL,
+    price float8 NOT NULL,
+    rating float8 DEFAULT 0 NOT NULL,
     description varchar NULL,
     main_image varchar(255) NULL,
-    additional_images text NULL,
+    updated_at timestamptz DEFAULT now() NOT NULL,
+    search_vector tsvector GENERATED ALWAYS AS (setweight(to_tsvector('russian', coalesce(name, '')), 'A') || setweight(to_tsvector('russian', coalesce(description, '')), 'B')) STORED NULL,
     CONSTRAINT products_pkey PRIMARY KEY (id)
 );
 
@@ -41,6 +45,9 @@ CREATE TABLE public.orders (
     id int4 GENERATED BY DEFAULT AS IDENTITY( INCREMENT BY 1 MINVALUE 1 MAXVALUE 2147483647 START 1 CACHE 1 NO CYCLE) NOT NULL,
     user_id int4 NULL,
     total float8 NULL,
+    created_at timestamptz DEFAULT now() NOT NULL,
+    status varchar(20) DEFAULT 'new' NOT NULL,
+    updated_at timestamptz DEFAULT now() NOT NULL,
     CONSTRAINT orders_pkey PRIMARY KEY (id)
 );
 
@@ -61,9 +68,31 @@ CREATE TABLE public.reviews (
     CONSTRAINT reviews_pkey PRIMARY KEY (id)
 );
 
+CREATE TABLE public.product_rating_stats (
+    product_id int4 NOT NULL,
+    review_count int4 DEFAULT 0 NOT NULL,
+    rating_sum int4 DEFAULT 0 NOT NULL,
+    stars_1 int4 DEFAULT 0 NOT NULL,
+    stars_2 int4 DEFAULT 0 NOT NULL,
+    stars_3 int4 DEFAULT 0 NOT NULL,
+    stars_4 int4 DEFAULT 0 NOT NULL,
+    stars_5 int4 DEFAULT 0 NOT NULL,
+    CONSTRAINT product_rating_stats_pkey PRIMARY KEY (product_id)
+);
+
+CREATE TABLE public.product_images (
+    id int4 GENERATED BY DEFAULT AS IDENTITY( INCREMENT BY 1 MINVALUE 1 MAXVALUE 2147483647 START 1 CACHE 1 NO CYCLE) NOT NULL,
+    product_id int4 NOT NULL,
+    "position" int4 NOT NULL,
+    url varchar(255) NOT NULL,
+    created_at timestamptz DEFAULT now() NOT NULL,
+    CONSTRAINT product_images_pkey PRIMARY KEY (id)
+);
+
 CREATE TABLE public.cart_items (
     cart_id int4 NOT NULL,
-    product_id int4 NOT NULL
+    product_id int4 NOT NULL,
+    CONSTRAINT cart_items_pkey PRIMARY KEY (cart_id, product_id)
 );
 
 CREATE TABLE public.alembic_version (
@@ -75,8 +104,31 @@ CREATE TABLE public.alembic_version (
 CREATE UNIQUE INDEX ix_users_email ON public.users USING btree (email);
 CREATE UNIQUE INDEX ix_users_username ON public.users USING btree (username);
 CREATE UNIQUE INDEX ix_categories_name ON public.categories USING btree (name);
-CREATE INDEX ix_products_name ON public.products USING btree (name);
+CREATE INDEX ix_products_name_id ON public.products USING btree (name, id);
+CREATE INDEX ix_products_price_id ON public.products USING btree (price, id);
+CREATE INDEX ix_products_rating_id ON public.products USING btree (rating, id);
+CREATE INDEX ix_products_category_id_id ON public.products USING btree (category_id, id);
+CREATE INDEX ix_products_category_id_name_id ON public.products USING btree (category_id, name, id);
+CREATE INDEX ix_products_category_id_price_id ON public.products USING btree (category_id, price, id);
+CREATE INDEX ix_products_category_id_rating_id ON public.products USING btree (category_id, rating, id);
+CREATE INDEX ix_products_search_vector ON public.products USING gin (search_vector);
+CREATE UNIQUE INDEX ux_products_sku ON public.products USING btree (sku);
+CREATE INDEX ix_products_updated_at ON public.products USING btree (updated_at);
+CREATE INDEX ix_product_images_product_id_position_id ON public.product_images USING btree (product_id, "position", id);
+CREATE INDEX ix_users_updated_at ON public.users USING btree (updated_at);
+CREATE INDEX ix_orders_updated_at ON public.orders USING btree (updated_at);
 CREATE INDEX ix_carts_id ON public.carts USING btree (id);
+CREATE INDEX ix_reviews_product_id_id ON public.reviews USING btree (product_id, id);
+CREATE INDEX ix_reviews_product_id_rating_id ON public.reviews USING btree (product_id, rating, id);
+CREATE INDEX ix_reviews_user_id_id ON public.reviews USING btree (user_id, id);
+CREATE INDEX ix_reviews_user_id_rating_id ON public.reviews USING btree (user_id, rating, id);
+CREATE INDEX ix_orders_user_id_created_at_id ON public.orders USING btree (user_id, created_at, id);
+CREATE INDEX ix_orders_created_at_id ON public.orders USING btree (created_at, id);
+CREATE INDEX ix_orders_status_created_at_id ON public.orders USING btree (status, created_at, id);
+CREATE INDEX ix_orderdetails_order_id ON public.orderdetails USING btree (order_id);
+
+-- Схема соответствует последней миграции alembic
+INSERT INTO public.alembic_version (version_num) VALUES ('f2c7a9d4e1b8');
 
 -- 3. Добавляем внешние ключи (после создания всех таблиц)
 ALTER TABLE public.products ADD CONSTRAINT products_category_id_fkey FOREIGN KEY (category_id) REFERENCES public.categories(id);
@@ -86,8 +138,10 @@ ALTER TABLE public.orderdetails ADD CONSTRAINT orderdetails_order_id_fkey FOREIG
 ALTER TABLE public.orderdetails ADD CONSTRAINT orderdetails_product_id_fkey FOREIGN KEY (product_id) REFERENCES public.products(id);
 ALTER TABLE public.reviews ADD CONSTRAINT reviews_product_id_fkey FOREIGN KEY (product_id) REFERENCES public.products(id);
 ALTER TABLE public.reviews ADD CONSTRAINT reviews_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id);
+ALTER TABLE public.product_rating_stats ADD CONSTRAINT product_rating_stats_product_id_fkey FOREIGN KEY (product_id) REFERENCES public.products(id) ON DELETE CASCADE;
 ALTER TABLE public.cart_items ADD CONSTRAINT cart_items_cart_id_fkey FOREIGN KEY (cart_id) REFERENCES public.carts(id);
 ALTER TABLE public.cart_items ADD CONSTRAINT cart_items_product_id_fkey FOREIGN KEY (product_id) REFERENCES public.products(id);
+ALTER TABLE public.product_images ADD CONSTRAINT product_images_product_id_fkey FOREIGN KEY (product_id) REFERENCES public.products(id) ON DELETE CASCADE;
 
 -- 4. Вставляем начальные данные
 INSERT INTO public.categories ("name", image_url, thumbnail_url) VALUES
@@ -98,9 +152,19 @@ INSERT INTO public.categories ("name", image_url, thumbnail_url) VALUES
 ('Джинсы', '/static/images/categories/7f43fcce-140c-43ba-a6af-ab7a605fed81.jpg', '/static/images/categories/thumbnails/f1e27d8c-e186-4b0d-80e4-8a8810a01e3a.jpg'),
 ('Куртки', '/static/images/categories/6a987d77-ff7e-435d-ab16-22724008e690.jpg', '/static/images/categories/thumbnails/5335936f-4d4d-4081-96b7-8e875a553929.jpg');
 
-INSERT INTO public.products ("name", category_id, price, rating, description, main_image, additional_images) VALUES
-('Брюки Каро', 1, 4999.0, 0.0, 'Стильные и практичные брюки карго...', '/static/images/products/main_3_b88e18a0-0f8f-47cf-878d-8fcff7e85a41.jpg', '["/static/images/products/additional_3_7e8c2246-90cf-4e5e-a994-9c739c633adc.jpg", "/static/images/products/additional_3_80e10cf8-6237-4af9-b75c-71a90f102cf4.jpg", "/static/images/products/additional_3_ce1daf3e-1179-44a1-aa94-10c5399e54cb.jpg", "/static/images/products/additional_3_881c0edd-2355-4ce7-8cba-fc9ecf3e3b94.jpg"]'),
-('Брюки из микротвила', 1, 2999.0, 0.0, 'Брюки из микротвила...', '/static/images/products/main_4_112b489f-9e73-4077-b828-536d40c5527e.jpg', '["/static/images/products/additional_4_a26d63a8-7a1d-4e36-9f2e-4818152914bb.jpg", "/static/images/products/additional_4_fdcc9c57-cae0-4ed4-9030-a9b07f14f473.jpg", "/static/images/products/additional_4_7593677d-3faa-4c63-9242-0c0dcb4e4c83.jpg", "/static/images/products/additional_4_9bff1e74-ef9d-48d6-86a2-7452568096b7.jpg"]');
+INSERT INTO public.products ("name", category_id, price, rating, description, main_image) VALUES
+('Брюки Каро', 1, 4999.0, 0.0, 'Стильные и практичные брюки карго...', '/static/images/products/main_3_b88e18a0-0f8f-47cf-878d-8fcff7e85a41.jpg'),
+('Брюки из микротвила', 1, 2999.0, 0.0, 'Брюки из микротвила...', '/static/images/products/main_4_112b489f-9e73-4077-b828-536d40c5527e.jpg');
+
+INSERT INTO public.product_images (product_id, "position", url) VALUES
+(1, 0, '/static/images/products/additional_3_7e8c2246-90cf-4e5e-a994-9c739c633adc.jpg'),
+(1, 1, '/static/images/products/additional_3_80e10cf8-6237-4af9-b75c-71a90f102cf4.jpg'),
+(1, 2, '/static/images/products/additional_3_ce1daf3e-1179-44a1-aa94-10c5399e54cb.jpg'),
+(1, 3, '/static/images/products/additional_3_881c0edd-2355-4ce7-8cba-fc9ecf3e3b94.jpg'),
+(2, 0, '/static/images/products/additional_4_a26d63a8-7a1d-4e36-9f2e-4818152914bb.jpg'),
+(2, 1, '/static/images/products/additional_4_fdcc9c57-cae0-4ed4-9030-a9b07f14f473.jpg'),
+(2, 2, '/static/images/products/additional_4_7593677d-3faa-4c63-9242-0c0dcb4e4c83.jpg'),
+(2, 3, '/static/images/products/additional_4_9bff1e74-ef9d-48d6-86a2-7452568096b7.jpg');
 
 INSERT INTO public.users (username, hashed_password, email, first_name, last_name, is_active, is_superuser) VALUES
 ('admin', '$2b$12$qIH0kthyFB./VfImqh5/x.b.aA/cpkm8oYnQ0xB2YHA9HYHQmYhEy', 'admin@example.com', 'admin', 'admin', true, true),
@@ -1,16 +1,16 @@
 import asyncio
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Float, Table, Text, text
-from sqlalchemy.orm import relationship, declarative_base
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Float, Table, Index, Computed, DateTime, func, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, declarative_base, deferred
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy import Identity
 
 Base = declarative_base(cls=AsyncAttrs)
-PG_URL = 'postgresql+asyncpg://postgres:postgres@db:5432/postgres'
-engine = create_async_engine(PG_URL, echo=True)
 
 
 async def create_db():
+    from app.db.database import engine
+
     async with engine.begin() as connection:
         await connection.run_sync(Base.metadata.drop_all)
         await connection.run_sync(Base.metadata.create_all)
@@ -27,6 +27,9 @@ class User(Base):
     last_name = Column(String(50))
     is_active = Column(Boolean, default=True)
     is_superuser = Column(Boolean, default=False)
+    # Для инкрементальной выгрузки (updated_since)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now(),
+                        index=True)
     reviews = relationship("Review", back_populates="user")
     carts = relationship("Cart", back_populates="user")
     orders = relationship("Order", back_populates="user")
@@ -39,6 +42,8 @@ class Category(Base):
     name = Column(String(100), unique=True, index=True)
     image_url = Column(String(255), nullable=True)  # URL изображения категории
     thumbnail_url = Column(String(255), nullable=True)  # URL миниатюры
+    # Версия строки для ETag: двигается при каждом UPDATE через ORM и Core
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
     products = relationship("Product", back_populates="category")
 
 
@@ -53,6 +58,28 @@ class Review(Base):
     user = relationship("User", back_populates="reviews")
     product = relationship("Product", back_populates="reviews")
 
+    # Списки отзывов товара и пользователя: новые и по оценке, с фильтром по звездам
+    __table_args__ = (
+        Index("ix_reviews_product_id_id", "product_id", "id"),
+        Index("ix_reviews_product_id_rating_id", "product_id", "rating", "id"),
+        Index("ix_reviews_user_id_id", "user_id", "id"),
+        Index("ix_reviews_user_id_rating_id", "user_id", "rating", "id"),
+    )
+
+
+# Агрегаты оценок товара: обновляются в той же транзакции, что и отзыв
+# (см. app/db/ratings.py), чтобы рейтинг не считался по reviews при чтении
+class ProductRatingStats(Base):
+    __tablename__ = 'product_rating_stats'
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    review_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    rating_sum = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    stars_1 = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    stars_2 = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    stars_3 = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    stars_4 = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    stars_5 = Column(Integer, nullable=False, default=0, server_default=text("0"))
+
 
 # Корзина
 # Таблица связи многие-ко-многим
@@ -64,22 +91,70 @@ cart_items = Table(
 )
 
 
+# Полнотекстовый поиск: название весомее описания
+PRODUCT_SEARCH_CONFIG = "russian"
+PRODUCT_SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{PRODUCT_SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector('{PRODUCT_SEARCH_CONFIG}', coalesce(description, '')), 'B')"
+)
+
+
 # Товары
 class Product(Base):
     __tablename__ = 'products'
     id = Column(Integer, Identity(), primary_key=True)
-    name = Column(String(255), index=True)
+    name = Column(String(255), nullable=False)
+    # Артикул поставщика: ключ массового импорта, у товаров из админки может отсутствовать
+    sku = Column(String(64), nullable=True)
     category_id = Column(Integer, ForeignKey('categories.id'))
-    price = Column(Float)
-    rating = Column(Float, default=0.0)
+    price = Column(Float, nullable=False)
+    rating = Column(Float, nullable=False, default=0.0, server_default=text("0"))
     description = Column(String, nullable=True)
     main_image = Column(String(255), nullable=True)
-    additional_images = Column(Text, nullable=True)
+    # Версия строки для ETag: двигается при каждом UPDATE через ORM и Core
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now(),
+                        index=True)
+    # Поисковый вектор считает сама БД; в обычных запросах не загружается
+    search_vector = deferred(Column(TSVECTOR, Computed(PRODUCT_SEARCH_VECTOR, persisted=True)))
 
     # Отношения
     category = relationship("Category", back_populates="products")
     reviews = relationship("Review", back_populates="product")
     carts = relationship("Cart", secondary=cart_items, back_populates="items")  # Добавлено
+    images = relationship(
+        "ProductImage", back_populates="product", order_by="(ProductImage.position, ProductImage.id)",
+        cascade="all, delete-orphan", passive_deletes=True,
+    )
+
+    # Составные индексы под keyset пагинацию: (колонка сортировки, id),
+    # в том числе внутри категории
+    __table_args__ = (
+        Index("ix_products_name_id", "name", "id"),
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_rating_id", "rating", "id"),
+        Index("ix_products_category_id_id", "category_id", "id"),
+        Index("ix_products_category_id_name_id", "category_id", "name", "id"),
+        Index("ix_products_category_id_price_id", "category_id", "price", "id"),
+        Index("ix_products_category_id_rating_id", "category_id", "rating", "id"),
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ux_products_sku", "sku", unique=True),
+    )
+
+
+# Дополнительные картинки товара в порядке показа.
+# URL уменьшенных копий выводятся из url (app.images.image_variant_urls)
+class ProductImage(Base):
+    __tablename__ = 'product_images'
+    id = Column(Integer, Identity(), primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    position = Column(Integer, nullable=False)
+    url = Column(String(255), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    product = relationship("Product", back_populates="images")
+
+    __table_args__ = (
+        Index("ix_product_images_product_id_position_id", "product_id", "position", "id"),
+    )
 
 
 class Cart(Base):
@@ -98,15 +173,27 @@ class Order(Base):
     id = Column(Integer, Identity(), primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
     total = Column(Float)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    status = Column(String(20), nullable=False, default="new", server_default="new")
+    # Для инкрементальной выгрузки; новые строки деталей тоже двигают его
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now(),
+                        index=True)
     user = relationship("User", back_populates="orders")
     details = relationship("OrderDetail", back_populates="order")
 
+    # История заказов: keyset по (created_at, id) у пользователя и в админке
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+    )
+
 
 # Детализация заказов
 class OrderDetail(Base):
     __tablename__ = 'orderdetails'
     id = Column(Integer, Identity(), primary_key=True)
-    order_id = Column(Integer, ForeignKey('orders.id'))
+    order_id = Column(Integer, ForeignKey('orders.id'), index=True)
     product_id = Column(Integer, ForeignKey('products.id'))
     quantity = Column(Integer, default=1)
     order = relationship("Order", back_populates="details")
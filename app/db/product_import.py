@@ -0,0 +1,285 @@
+"""Массовый импорт товаров из CSV и JSONL
+
+Файл читается потоково пачками по IMPORT_BATCH_SIZE строк: разбор и проверка
+строк идут в пуле потоков, пачка грузится через COPY во временную таблицу и
+одним INSERT ... ON CONFLICT (sku) вливается в products. Каждая пачка
+коммитится отдельно, так что память не зависит от размера файла, а при
+ошибке посреди файла уже загруженные пачки остаются в базе. Строки, которые
+не прошли проверку или ссылаются на несуществующую категорию, попадают
+в отчет с номером строки файла. Повтор артикула внутри пачки тоже ошибка:
+применяется последняя строка, а более ранние отчитываются со ссылкой на нее,
+так что rows = inserted + updated + unchanged + failed.
+
+Колонки: sku, name, category_id, price, description (необязательна).
+
+    python -m app.db.product_import feed.csv
+    python -m app.db.product_import feed.jsonl --batch-size 10000
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sys
+from typing import Callable, Iterator, List, Optional, TextIO, Tuple
+
+import anyio
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+# В отчет попадает не больше стольких ошибок, остальные только считаются
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+IMPORT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+STAGING_TABLE = "product_import_staging"
+STAGING_COLUMNS = ("line", "sku", "name", "category_id", "price", "description")
+
+# Временная таблица живет в соединении, строки очищаются коммитом пачки
+CREATE_STAGING_SQL = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+    line int NOT NULL,
+    sku varchar(64) NOT NULL,
+    name varchar(255) NOT NULL,
+    category_id int NOT NULL,
+    price float8 NOT NULL,
+    description varchar
+) ON COMMIT DELETE ROWS
+"""
+
+# Повтор артикула внутри пачки: побеждает последняя строка (ранние отчитывает
+# DUPLICATE_SKU_SQL). Не изменившиеся
+# товары не переписываются, чтобы ночной фид не двигал updated_at (и ETag)
+# у всего каталога
+UPSERT_SQL = f"""
+WITH batch AS (
+    SELECT DISTINCT ON (sku) sku, name, category_id, price, description
+    FROM {STAGING_TABLE} s
+    WHERE EXISTS (SELECT 1 FROM categories c WHERE c.id = s.category_id)
+    ORDER BY sku, line DESC
+), upserted AS (
+    INSERT INTO products (sku, name, category_id, price, description)
+    SELECT sku, name, category_id, price, description FROM batch
+    ON CONFLICT (sku) DO UPDATE SET
+        name = excluded.name,
+        category_id = excluded.category_id,
+        price = excluded.price,
+        description = excluded.description,
+        updated_at = now()
+    WHERE (products.name, products.category_id, products.price, products.description)
+        IS DISTINCT FROM (excluded.name, excluded.category_id, excluded.price, excluded.description)
+    RETURNING xmax = 0 AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM upserted
+"""
+
+MISSING_CATEGORY_SQL = f"""
+SELECT line, sku, category_id FROM {STAGING_TABLE} s
+WHERE NOT EXISTS (SELECT 1 FROM categories c WHERE c.id = s.category_id)
+ORDER BY line
+"""
+
+# Строки, перекрытые более поздней строкой с тем же артикулом; отбор тот же,
+# что у batch в UPSERT_SQL, поэтому строка без категории сюда не попадает
+DUPLICATE_SKU_SQL = f"""
+SELECT line, sku, last_line FROM (
+    SELECT line, sku, max(line) OVER (PARTITION BY sku) AS last_line
+    FROM {STAGING_TABLE} s
+    WHERE EXISTS (SELECT 1 FROM categories c WHERE c.id = s.category_id)
+) d
+WHERE line < last_line
+ORDER BY line
+"""
+
+
+class ProductImportRow(BaseModel):
+    sku: str = Field(..., min_length=1, max_length=64)
+    name: str = Field(..., min_length=1, max_length=255)
+    category_id: int
+    price: float = Field(..., ge=0, allow_inf_nan=False)
+    description: Optional[str] = None
+
+    @field_validator("sku", "name", mode="before")
+    @classmethod
+    def strip(cls, value):
+        return value.strip() if isinstance(value, str) else value
+
+    @field_validator("description", mode="before")
+    @classmethod
+    def empty_as_null(cls, value):
+        # В CSV отсутствующее описание приходит пустой строкой
+        return value or None
+
+
+class ProductImportError(BaseModel):
+    line: int
+    sku: Optional[str] = None
+    error: str
+
+
+class ProductImportReport(BaseModel):
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    errors: List[ProductImportError] = []
+
+    def add_error(self, line: int, sku: Optional[str], error: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append(ProductImportError(line=line, sku=sku, error=error))
+
+
+class ImportFileError(ValueError):
+    """Файл нельзя дочитать: не UTF-8, битый CSV"""
+
+
+def detect_format(filename: Optional[str]) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in IMPORT_FORMATS:
+        raise ImportFileError(f"Unsupported file type '{extension}', expected one of {sorted(IMPORT_FORMATS)}")
+    return IMPORT_FORMATS[extension]
+
+
+def _csv_rows(stream: TextIO) -> Iterator[Tuple[int, object]]:
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _jsonl_rows(stream: TextIO) -> Iterator[Tuple[int, object]]:
+    for line, raw in enumerate(stream, start=1):
+        if not raw.strip():
+            continue
+        try:
+            yield line, json.loads(raw)
+        except json.JSONDecodeError as e:
+            yield line, f"Invalid JSON: {e.msg}"
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}" for item in error.errors()
+    )
+
+
+def iter_batches(stream: TextIO, fmt: str, batch_size: int):
+    """Пачки (записи для COPY, ошибки) из текстового потока
+
+    Обычный генератор: каждую пачку вызывающий код забирает в потоке,
+    чтобы разбор и pydantic не блокировали event loop.
+    """
+    rows = _csv_rows(stream) if fmt == "csv" else _jsonl_rows(stream)
+    records, errors = [], []
+    try:
+        for line, row in rows:
+            if isinstance(row, str):
+                errors.append((line, None, row))
+            elif not isinstance(row, dict):
+                errors.append((line, None, "Row must be an object"))
+            else:
+                try:
+                    item = ProductImportRow.model_validate(row)
+                except ValidationError as e:
+                    sku = row.get("sku")
+                    errors.append((line, sku if isinstance(sku, str) else None, _format_validation_error(e)))
+                else:
+                    records.append((line, item.sku, item.name, item.category_id, item.price, item.description))
+            if len(records) + len(errors) >= batch_size:
+                yield records, errors
+                records, errors = [], []
+    except UnicodeDecodeError as e:
+        raise ImportFileError(f"File is not valid UTF-8: {e.reason}") from e
+    except csv.Error as e:
+        raise ImportFileError(f"Invalid CSV: {e}") from e
+    if records or errors:
+        yield records, errors
+
+
+async def load_batch(db: AsyncSession, records: list) -> Tuple[int, int, list, list]:
+    """COPY пачки в staging и upsert в products
+
+    Возвращает (вставлено, обновлено, без категории, повторы артикула).
+    """
+    await db.execute(text(CREATE_STAGING_SQL))
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(STAGING_TABLE, records=records, columns=STAGING_COLUMNS)
+    inserted, updated = (await db.execute(text(UPSERT_SQL))).one()
+    missing = (await db.execute(text(MISSING_CATEGORY_SQL))).all()
+    duplicates = (await db.execute(text(DUPLICATE_SKU_SQL))).all()
+    await db.commit()
+    return inserted, updated, missing, duplicates
+
+
+async def import_products(
+        db: AsyncSession,
+        stream: TextIO,
+        fmt: str,
+        batch_size: int = IMPORT_BATCH_SIZE,
+        on_progress: Optional[Callable[[ProductImportReport], None]] = None,
+) -> ProductImportReport:
+    """Импортирует товары из потока, коммитя каждую пачку"""
+    report = ProductImportReport()
+    batches = iter_batches(stream, fmt, batch_size)
+    while True:
+        batch = await anyio.to_thread.run_sync(next, batches, None)
+        if batch is None:
+            break
+        records, errors = batch
+        report.rows += len(records) + len(errors)
+        for line, sku, error in errors:
+            report.add_error(line, sku, error)
+        if records:
+            inserted, updated, missing, duplicates = await load_batch(db, records)
+            for row in missing:
+                report.add_error(row.line, row.sku, f"Category {row.category_id} not found")
+            for row in duplicates:
+                report.add_error(row.line, row.sku, f"Duplicate SKU, superseded by line {row.last_line}")
+            report.inserted += inserted
+            report.updated += updated
+            report.unchanged += len(records) - len(missing) - len(duplicates) - inserted - updated
+        if on_progress is not None:
+            on_progress(report)
+    return report
+
+
+def text_stream(binary) -> io.TextIOWrapper:
+    """Текстовая обертка над бинарным файлом; BOM от Excel пропускается"""
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+
+
+async def main():
+    from app.db.database import async_session_maker, engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=sorted(set(IMPORT_FORMATS.values())), help="по умолчанию по расширению")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    def progress(report: ProductImportReport):
+        print(f"rows={report.rows} inserted={report.inserted} updated={report.updated} "
+              f"unchanged={report.unchanged} failed={report.failed}", file=sys.stderr)
+
+    fmt = args.format or detect_format(args.path)
+    with open(args.path, "rb") as binary, text_stream(binary) as stream:
+        async with async_session_maker() as session:
+            report = await import_products(session, stream, fmt, args.batch_size, progress)
+    await engine.dispose()
+
+    for error in report.errors:
+        print(f"line {error.line}: {error.sku or '-'}: {error.error}")
+    if report.failed > len(report.errors):
+        print(f"... and {report.failed - len(report.errors)} more errors")
+    progress(report)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""Инкрементальные агрегаты оценок товаров
+
+product_rating_stats хранит по каждому товару число отзывов, сумму оценок
+и гистограмму 1-5 звезд. Каждая запись отзыва применяет к ней дельту в своей
+транзакции, а products.rating пересчитывается из агрегата тем же запросом.
+Полный пересчет (после ручных правок reviews или для наполнения таблицы):
+
+    python -m app.db.ratings
+"""
+import asyncio
+
+from sqlalchemy import Float, case, cast, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.db.models import Product, ProductRatingStats
+
+RATING_STARS = range(1, 6)
+
+
+def rating_from_stats(stats):
+    """Средняя оценка из агрегата; без отзывов рейтинг 0"""
+    return case(
+        (stats.c.review_count > 0, cast(stats.c.rating_sum, Float) / cast(stats.c.review_count, Float)),
+        else_=0.0,
+    )
+
+
+async def apply_rating_delta(db: AsyncSession, product_id: int, rating: int, sign: int):
+    """Учитывает добавленный (sign=1) или удаленный (sign=-1) отзыв
+
+    Один запрос: upsert агрегата и обновление products.rating через CTE.
+    Строка агрегата блокируется upsert'ом, поэтому параллельные отзывы
+    к одному товару не теряют обновлений.
+    """
+    if rating not in RATING_STARS or product_id is None:
+        return
+
+    delta = {
+        "product_id": product_id,
+        "review_count": sign,
+        "rating_sum": sign * rating,
+        **{f"stars_{star}": sign if star == rating else 0 for star in RATING_STARS},
+    }
+    table = ProductRatingStats.__table__
+    upsert = insert(table).values(**delta)
+    stats = upsert.on_conflict_do_update(
+        index_elements=[table.c.product_id],
+        set_={
+            name: table.c[name] + upsert.excluded[name]
+            for name in delta if name != "product_id"
+        },
+    ).returning(table.c.product_id, table.c.review_count, table.c.rating_sum).cte("stats")
+
+    await db.execute(
+        update(Product)
+        .where(Product.id == stats.c.product_id)
+        .values(rating=rating_from_stats(stats))
+    )
+
+
+async def rebuild_rating_stats(conn: AsyncConnection):
+    """Пересчитывает все агрегаты и рейтинги по таблице reviews"""
+    # Блокируем запись отзывов на время пересчета, чтение не мешает
+    await conn.execute(text("LOCK TABLE reviews IN SHARE MODE"))
+    await conn.execute(text("DELETE FROM product_rating_stats"))
+    await conn.execute(text(
+        "INSERT INTO product_rating_stats "
+        "(product_id, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5) "
+        "SELECT product_id, count(*), sum(rating), "
+        + ", ".join(f"count(*) FILTER (WHERE rating = {star})" for star in RATING_STARS)
+        + " FROM reviews WHERE product_id IS NOT NULL AND rating BETWEEN 1 AND 5 "
+        "GROUP BY product_id"
+    ))
+    stats = select(ProductRatingStats).subquery()
+    new_rating = func.coalesce(
+        select(rating_from_stats(stats)).where(stats.c.product_id == Product.id).scalar_subquery(),
+        0.0,
+    )
+    result = await conn.execute(
+        update(Product).where(Product.rating.is_distinct_from(new_rating)).values(rating=new_rating)
+    )
+    return result.rowcount
+
+
+async def main():
+    from app.db.database import engine
+
+    async with engine.begin() as conn:
+        changed = await rebuild_rating_stats(conn)
+    await engine.dispose()
+    print(f"Rating stats rebuilt, {changed} product ratings changed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -13,7 +13,7 @@ async def run_async_migrations(engine: AsyncEngine):
 
         alembic_cfg = Config()
         alembic_cfg.set_main_option("script_location", "alembic")
-        alembic_cfg.set_main_option("sqlalchemy.url", str(engine.url))
+        alembic_cfg.set_main_option("sqlalchemy.url", engine.url.render_as_string(hide_password=False))
 
         async with engine.begin() as conn:
             await conn.run_sync(
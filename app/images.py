@@ -0,0 +1,153 @@
+"""Уменьшенные копии загруженных картинок
+
+Для каждой сохраненной картинки в отдельном пуле процессов строятся варианты
+thumb/list/detail в JPEG и WebP. URL вариантов вычисляются из URL оригинала,
+поэтому в базе ничего не хранится:
+
+    /static/images/products/main_1_<uuid>.png
+    -> /static/images/products/variants/main_1_<uuid>/list.webp
+
+Варианты появляются через доли секунды после ответа на загрузку; пока файла
+нет, клиент показывает оригинал. Для уже загруженных картинок:
+
+    python -m app.images static/images/products static/images/categories
+"""
+import asyncio
+import functools
+import logging
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина большей стороны для каждого варианта
+IMAGE_VARIANTS = {"thumb": 160, "list": 480, "detail": 1200}
+IMAGE_VARIANTS_DIR = "variants"
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# URL вариантов считаются при каждой сериализации товара, а pydantic в dump_json
+# вызывает computed_field дважды; запоминаем строки последних URL
+IMAGE_VARIANT_URLS_CACHE_SIZE = 16384
+
+_image_executor: Optional[ProcessPoolExecutor] = None
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора до завершения
+_pending = set()
+
+
+@functools.lru_cache(maxsize=IMAGE_VARIANT_URLS_CACHE_SIZE)
+def _variant_url_pairs(url: str) -> Tuple[Tuple[str, str], ...]:
+    directory, _, filename = url.rpartition("/")
+    base = f"{directory}/{IMAGE_VARIANTS_DIR}/{filename.rsplit('.', 1)[0]}"
+    pairs = []
+    for name in IMAGE_VARIANTS:
+        pairs.append((name, f"{base}/{name}.jpg"))
+        pairs.append((f"{name}_webp", f"{base}/{name}.webp"))
+    return tuple(pairs)
+
+
+def image_variant_urls(url: Optional[str]) -> Optional[Dict[str, str]]:
+    """URL всех вариантов картинки: thumb, thumb_webp, list, list_webp, ...
+
+    В кэше неизменяемый кортеж, каждый вызов получает свой словарь.
+    """
+    if not url:
+        return None
+    return dict(_variant_url_pairs(url))
+
+
+def variants_dir(path: Path) -> Path:
+    return path.parent / IMAGE_VARIANTS_DIR / path.stem
+
+
+def render_variants(source: str) -> int:
+    """Строит все варианты картинки; выполняется в процессе пула"""
+    from PIL import Image, ImageOps
+
+    path = Path(source)
+    target_dir = variants_dir(path)
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    with Image.open(path) as original:
+        # Первый кадр для GIF, поворот по EXIF для фото с телефона
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+    written = 0
+    for name, max_side in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        webp_path = target_dir / f"{name}.webp"
+        resized.save(f"{webp_path}.part", "WEBP", quality=WEBP_QUALITY, method=4)
+        os.replace(f"{webp_path}.part", webp_path)
+
+        if resized.mode == "RGBA":
+            # В JPEG нет прозрачности - кладем на белый фон
+            background = Image.new("RGB", resized.size, (255, 255, 255))
+            background.paste(resized, mask=resized.getchannel("A"))
+            resized = background
+        jpeg_path = target_dir / f"{name}.jpg"
+        resized.save(f"{jpeg_path}.part", "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        os.replace(f"{jpeg_path}.part", jpeg_path)
+        written += 2
+    return written
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _image_executor
+    if _image_executor is None:
+        _image_executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _image_executor
+
+
+def _log_failure(future: asyncio.Future, source: Path):
+    _pending.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Failed to render variants for %s", source, exc_info=future.exception())
+
+
+def schedule_image_variants(path: Path) -> asyncio.Future:
+    """Ставит построение вариантов в очередь, не дожидаясь результата"""
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_get_executor(), render_variants, str(path))
+    _pending.add(future)
+    future.add_done_callback(lambda f: _log_failure(f, path))
+    return future
+
+
+def remove_image(path: Path):
+    """Удаляет оригинал вместе с его вариантами"""
+    os.remove(path)
+    shutil.rmtree(variants_dir(path), ignore_errors=True)
+
+
+def shutdown_image_workers():
+    global _image_executor
+    if _image_executor is not None:
+        _image_executor.shutdown(wait=True, cancel_futures=True)
+        _image_executor = None
+
+
+def main(directories):
+    """Строит варианты для всех картинок в каталогах"""
+    extensions = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+    sources = [
+        path for directory in directories for path in Path(directory).rglob("*")
+        if path.suffix.lower() in extensions and IMAGE_VARIANTS_DIR not in path.parts
+    ]
+    with ProcessPoolExecutor(max_workers=IMAGE_WORKERS) as executor:
+        futures = {source: executor.submit(render_variants, str(source)) for source in sources}
+        for source, future in futures.items():
+            try:
+                print(f"{source}: {future.result()} variants")
+            except Exception as e:
+                print(f"{source}: failed: {e}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
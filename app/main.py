@@ -1,11 +1,88 @@
 import uvicorn
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from app.api.v1.endpoints import router  # Импортируем роутер
+from app.api.v1 import internal
+from app.api.v1.auth import shutdown_password_hashing
+from app.api.v1.category import CATALOG_VERSION_HEADER, warm_category_snapshot
+from app.api.v1.pagination import NEXT_CURSOR_HEADER
+from app.db.database import engine
+from app.images import shutdown_image_workers
+from app import metrics
 from fastapi.staticfiles import StaticFiles
 import os
+import time
+
+# Ответы меньше порога не сжимаются: выигрыш в байтах не окупает gzip
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+STATIC_PREFIX = "/static"
+
+
+class ApiGZipMiddleware(GZipMiddleware):
+    """GZip для ответов API; картинки из /static уже сжаты"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(STATIC_PREFIX + "/"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class MetricsMiddleware:
+    """Задержки, статусы и запросы к базе по шаблонам маршрутов для /metrics
+
+    Чистый ASGI middleware: время считается до отправки последнего куска
+    тела, так что потоковые выгрузки учитываются целиком.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        root_path = scope.get("root_path", "")
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats, token = metrics.start_request()
+        metrics.registry.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.registry.in_flight -= 1
+            metrics.finish_request(token)
+            metrics.registry.observe_request(
+                scope["method"], metrics.route_template(scope, root_path), status_code, elapsed, stats,
+            )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_category_snapshot()
+    yield
+    await engine.dispose()
+    shutdown_password_hashing()
+    shutdown_image_workers()
+
 
 app = FastAPI(
+    lifespan=lifespan,
+    # orjson вместо стандартного json для всех ответов без явного класса
+    default_response_class=ORJSONResponse,
     title="E-commerce API",
     description="API для интернет-магазина",
     version="1.0.0",
@@ -20,10 +97,11 @@ app = FastAPI(
 
 
 app.include_router(router, prefix="/api/v1")
+app.include_router(internal.router, prefix="/internal")
 # Получаем абсолютный путь к папке static
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATIC_DIR = os.path.join(BASE_DIR, "app", "static")
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+app.mount(STATIC_PREFIX, StaticFiles(directory=STATIC_DIR), name="static")
 
 
 # Настройка CORS ()
@@ -33,7 +111,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, CATALOG_VERSION_HEADER, "ETag"],
 )
+app.add_middleware(ApiGZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL)
+# Последним, чтобы быть внешним и мерить время вместе со сжатием
+app.add_middleware(MetricsMiddleware)
+metrics.instrument_engine(engine)
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(internal.require_internal_access)])
+async def read_metrics():
+    """Метрики текущего воркера в формате Prometheus
+
+    Доступ как у /internal: Prometheus передает INTERNAL_API_TOKEN
+    в authorization.credentials задания сбора.
+    """
+    return PlainTextResponse(metrics.render_prometheus(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/", tags=["Root"])
 async def root():
@@ -0,0 +1,217 @@
+"""Метрики запросов в формате Prometheus
+
+Счетчики живут в памяти процесса, как и кэши из app/cache.py: у каждого
+воркера uvicorn свои, Prometheus опрашивает /metrics каждого воркера
+отдельно. Метка route - шаблон маршрута (/api/v1/products/{product_id}),
+а не фактический путь, чтобы число рядов не росло с числом товаров.
+/metrics закрыт так же, как /internal (app.api.v1.internal): токен
+администратора или INTERNAL_API_TOKEN.
+
+Запросы к базе считаются через события курсора SQLAlchemy на общем engine
+и приписываются HTTP запросу, внутри которого выполнялись (через contextvar,
+который SQLAlchemy пробрасывает в greenlet с синхронным кодом драйвера).
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Число запросов к базе за HTTP запрос: хвост выше 10 обычно означает N+1
+DB_QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Метки для запросов, не попавших ни в один маршрут
+UNMATCHED_ROUTE = "<unmatched>"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Корзины без накопления; накопительные значения считаются при выводе"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    """Запросы к базе в рамках одного HTTP запроса"""
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+class RouteMetrics:
+    __slots__ = ("latency", "db_time", "db_queries", "db_queries_total", "db_seconds_total")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.db_time = Histogram(DB_TIME_BUCKETS)
+        self.db_queries = Histogram(DB_QUERIES_BUCKETS)
+        self.db_queries_total = 0
+        self.db_seconds_total = 0.0
+
+
+class MetricsRegistry:
+    """Все метрики процесса; рассчитан на один event loop, без блокировок"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        # Запросы к базе вне HTTP запросов: прогрев снапшота, CLI
+        self.background_queries = 0
+        self.background_db_seconds = 0.0
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        metrics = self.routes.get((method, route))
+        if metrics is None:
+            metrics = self.routes[(method, route)] = RouteMetrics()
+        metrics.latency.observe(seconds)
+        metrics.db_time.observe(stats.db_seconds)
+        metrics.db_queries.observe(stats.queries)
+        metrics.db_queries_total += stats.queries
+        metrics.db_seconds_total += stats.db_seconds
+
+    def observe_query(self, seconds: float):
+        stats = _current_request.get()
+        if stats is None:
+            self.background_queries += 1
+            self.background_db_seconds += seconds
+        else:
+            stats.queries += 1
+            stats.db_seconds += seconds
+
+    def clear(self):
+        self.__init__()
+
+
+registry = MetricsRegistry()
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("metrics_request", default=None)
+
+
+def start_request() -> Tuple[RequestStats, object]:
+    """Начинает учет запросов к базе для текущего HTTP запроса"""
+    stats = RequestStats()
+    return stats, _current_request.set(stats)
+
+
+def finish_request(token):
+    _current_request.reset(token)
+
+
+def route_template(scope: dict, root_path: str) -> str:
+    """Шаблон маршрута, который обработал запрос
+
+    Роутер FastAPI кладет найденный маршрут в scope["route"], а Mount
+    (статика) дописывает свой префикс в root_path.
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    mounted = scope.get("root_path", "")
+    if mounted != root_path:
+        return mounted + "/{path}"
+    return UNMATCHED_ROUTE
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        registry.observe_query(time.perf_counter() - started)
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Подписывает учет запросов на события курсора engine (один раз)"""
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram_lines(name: str, labels: str, histogram: Histogram) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{_format_value(float(bound))}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {_format_value(histogram.sum)}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+def render_prometheus(metrics: MetricsRegistry = registry) -> str:
+    """Текстовый формат экспозиции Prometheus 0.0.4"""
+    lines = [
+        "# HELP http_requests_in_flight HTTP requests currently being served.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {metrics.in_flight}",
+        "# HELP http_requests_total HTTP requests by route template and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(metrics.requests.items()):
+        lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+
+    routes = sorted(metrics.routes.items())
+    histograms = (
+        ("http_request_duration_seconds", "HTTP request latency including the response body.", "latency"),
+        ("http_request_db_seconds", "Time spent in database queries per HTTP request.", "db_time"),
+        ("http_request_db_queries", "Database queries per HTTP request.", "db_queries"),
+    )
+    for name, help_text, attribute in histograms:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for (method, route), route_metrics in routes:
+            lines.extend(_histogram_lines(name, _labels(method=method, route=route), getattr(route_metrics, attribute)))
+
+    lines.append("# HELP db_queries_total Database queries by route template; route=\"\" outside HTTP requests.")
+    lines.append("# TYPE db_queries_total counter")
+    for (method, route), route_metrics in routes:
+        lines.append(f"db_queries_total{{{_labels(method=method, route=route)}}} {route_metrics.db_queries_total}")
+    lines.append(f'db_queries_total{{method="",route=""}} {metrics.background_queries}')
+    lines.append("# HELP db_query_seconds_total Time spent in database queries by route template.")
+    lines.append("# TYPE db_query_seconds_total counter")
+    for (method, route), route_metrics in routes:
+        lines.append(
+            f"db_query_seconds_total{{{_labels(method=method, route=route)}}} "
+            f"{_format_value(route_metrics.db_seconds_total)}"
+        )
+    lines.append(f'db_query_seconds_total{{method="",route=""}} {_format_value(metrics.background_db_seconds)}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,130 @@
+"""Бенчмарк отзывчивости приложения во время волны логинов
+
+Отправляет пачку одновременных POST /api/v1/users/token и параллельно
+опрашивает GET / - эндпоинт, которому bcrypt не нужен. Печатает p50/p99
+задержки GET / в простое и во время волны. База не нужна: get_db
+подменяется заглушкой, которая всегда находит одного пользователя.
+
+    python -m benchmarks.bench_login_burst --logins 100
+    python -m benchmarks.bench_login_burst --logins 100 --inline  # как было: bcrypt в event loop
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from app.api.v1 import auth
+from app.db.database import get_db
+from app.main import app
+
+USERNAME = "bench"
+PASSWORD = "bench-password"
+
+
+class StubResult:
+    def __init__(self, user):
+        self.user = user
+
+    def scalars(self):
+        return self
+
+    def first(self):
+        return self.user
+
+
+class StubSession:
+    def __init__(self, user):
+        self.user = user
+
+    async def execute(self, *args, **kwargs):
+        return StubResult(self.user)
+
+    async def commit(self):
+        pass
+
+
+def percentile(samples, q):
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1]
+
+
+async def probe(client, latencies, stop: asyncio.Event, interval: float):
+    # Задержка считается от момента, когда запрос должен был уйти по расписанию:
+    # если event loop заблокирован, пропущенные запросы тоже попадают в статистику
+    scheduled = time.perf_counter()
+    while not stop.is_set():
+        response = await client.get("/")
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        response.raise_for_status()
+        scheduled += interval
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+
+
+async def probe_for(client, seconds: float, interval: float):
+    latencies = []
+    stop = asyncio.Event()
+    task = asyncio.create_task(probe(client, latencies, stop, interval))
+    await asyncio.sleep(seconds)
+    stop.set()
+    await task
+    return latencies
+
+
+async def run(args):
+    user = SimpleNamespace(
+        id=1, username=USERNAME, hashed_password=auth.pwd_context.hash(PASSWORD)
+    )
+
+    async def bench_db():
+        yield StubSession(user)
+
+    app.dependency_overrides[get_db] = bench_db
+    if args.inline:
+        async def run_inline(func, *func_args):
+            return func(*func_args)
+        auth._run_hashing = run_inline
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        idle = await probe_for(client, 1.0, args.interval)
+
+        burst = []
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, burst, stop, args.interval))
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/api/v1/users/token", data={"username": USERNAME, "password": PASSWORD})
+            for _ in range(args.logins)
+        ))
+        burst_seconds = time.perf_counter() - started
+        stop.set()
+        await probe_task
+
+    app.dependency_overrides.clear()
+
+    codes = {}
+    for response in responses:
+        codes[response.status_code] = codes.get(response.status_code, 0) + 1
+    mode = "inline" if args.inline else f"executor workers={auth.PASSWORD_HASH_WORKERS}"
+    print(f"mode={mode} bcrypt_rounds={auth.BCRYPT_ROUNDS} logins={args.logins} "
+          f"burst={burst_seconds:.2f}s statuses={codes}")
+    for name, samples in (("idle", idle), ("burst", burst)):
+        if len(samples) < 2:
+            print(f"GET / {name}: {len(samples)} samples, max={max(samples, default=0):.1f}ms")
+            continue
+        print(f"GET / {name}: samples={len(samples)} p50={percentile(samples, 50):.1f}ms "
+              f"p99={percentile(samples, 99):.1f}ms max={max(samples):.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=0.005, help="пауза между GET / в секундах")
+    parser.add_argument("--inline", action="store_true", help="считать bcrypt прямо в event loop")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Бенчмарк сериализации списков и размера ответов
+
+Сравнивает для страниц товаров, отзывов и заказов три способа получить JSON:
+
+    legacy  - как было: validate + dump_python и stdlib json (JSONResponse)
+    orjson  - тот же dump_python, но orjson (ORJSONResponse по умолчанию)
+    direct  - validate + dump_json одним TypeAdapter (json_response)
+
+и размер тела без сжатия и с gzip уровня GZIP_LEVEL. Затем прогоняет
+GET /api/v1/products/ через приложение с заглушкой БД и сравнивает байты
+на проводе с Accept-Encoding: gzip и без него. База не нужна.
+
+    python -m benchmarks.bench_serialization --page 100 --rounds 200
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+import orjson
+from fastapi.responses import JSONResponse
+
+from app.api.v1.orders import order_history_list_adapter
+from app.api.v1.product import product_list_adapter
+from app.api.v1.review import review_list_adapter
+from app.db.database import get_db
+from app.db.models import Product
+from app.main import GZIP_LEVEL, app
+
+NOW = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def make_products(count: int):
+    products = []
+    for i in range(1, count + 1):
+        product = Product(
+            id=i, name=f"Куртка демисезонная модель {i}", category_id=1 + i % 20, price=1990.0 + i,
+            rating=4.5, description="Легкая куртка из плотной ткани с капюшоном и карманами на молнии. " * 3,
+            main_image=f"/static/images/products/{i}_main.jpg", updated_at=NOW,
+        )
+        product.additional_images_urls = [f"/static/images/products/{i}_{n}.jpg" for n in range(3)]
+        products.append(product)
+    return products
+
+
+def make_reviews(count: int):
+    return [
+        SimpleNamespace(id=i, user_id=1 + i % 50, product_id=1 + i % 7, rating=1 + i % 5,
+                        text="Хорошая вещь, размер подошел, доставка быстрая. " * 2)
+        for i in range(1, count + 1)
+    ]
+
+
+def make_orders(count: int):
+    return [
+        SimpleNamespace(
+            id=i, user_id=1 + i % 50, total=5990.0, status="new", created_at=NOW - timedelta(hours=i),
+            details=[SimpleNamespace(id=i * 10 + n, order_id=i, product_id=n + 1, quantity=1) for n in range(3)],
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def legacy(adapter, objects) -> bytes:
+    return JSONResponse(adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")).body
+
+
+def with_orjson(adapter, objects) -> bytes:
+    content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def direct(adapter, objects) -> bytes:
+    return adapter.dump_json(adapter.validate_python(objects, from_attributes=True))
+
+
+def timed(function, adapter, objects, rounds: int) -> float:
+    function(adapter, objects)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        function(adapter, objects)
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+class StubResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class StubSession:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def execute(self, *args, **kwargs):
+        return StubResult(self.rows)
+
+
+async def wire_bytes(page: int):
+    products = make_products(page)
+
+    async def stub_db():
+        yield StubSession(products)
+
+    app.dependency_overrides[get_db] = stub_db
+    transport = httpx.ASGITransport(app=app)
+    sizes = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for encoding in ("identity", "gzip"):
+            response = await client.get(
+                "/api/v1/products/", params={"limit": page - 1}, headers={"Accept-Encoding": encoding}
+            )
+            response.raise_for_status()
+            sizes[encoding] = (response.num_bytes_downloaded, response.headers.get("content-encoding", "-"))
+    app.dependency_overrides.clear()
+    return sizes
+
+
+def run(args):
+    cases = [
+        ("products", product_list_adapter, make_products(args.page)),
+        ("reviews", review_list_adapter, make_reviews(args.page)),
+        ("orders", order_history_list_adapter, make_orders(args.page)),
+    ]
+    print(f"page={args.page} rounds={args.rounds}")
+    print("list       legacy ms  orjson ms  direct ms  speedup  bytes     gzip bytes")
+    for name, adapter, objects in cases:
+        body = direct(adapter, objects)
+        # Все три способа должны давать один и тот же JSON
+        assert json.loads(body) == json.loads(legacy(adapter, objects)) == json.loads(with_orjson(adapter, objects))
+        times = [timed(function, adapter, objects, args.rounds) for function in (legacy, with_orjson, direct)]
+        print(f"{name:<10} {times[0]:<10.3f} {times[1]:<10.3f} {times[2]:<10.3f} x{times[0] / times[2]:<7.2f} "
+              f"{len(body):<9} {len(gzip.compress(body, GZIP_LEVEL))}")
+
+    sizes = asyncio.run(wire_bytes(args.page))
+    print("\nGET /api/v1/products/ on the wire")
+    for encoding, (size, content_encoding) in sizes.items():
+        print(f"Accept-Encoding: {encoding:<9} {size:>8} bytes  Content-Encoding: {content_encoding}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page", type=int, default=100, help="строк на странице")
+    parser.add_argument("--rounds", type=int, default=200)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
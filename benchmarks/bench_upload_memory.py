@@ -0,0 +1,69 @@
+"""Бенчмарк памяти при сохранении загруженных картинок
+
+Для файлов разного размера замеряет пик памяти Python (tracemalloc) во время
+сохранения. Загрузка лежит во временном файле, как ее отдает Starlette после
+разбора multipart. Потоковое сохранение должно давать одинаковый пик
+независимо от размера; --legacy показывает старое чтение целиком.
+
+    python -m benchmarks.bench_upload_memory --sizes-mb 1 10 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from fastapi import UploadFile
+
+from app.api.v1.uploads import save_image_upload
+
+JPEG_HEADER = b"\xff\xd8\xff\xe0"
+# Starlette держит в памяти до 1 МБ, дальше загрузка уходит на диск
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def make_upload(size: int) -> UploadFile:
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    spooled.write(JPEG_HEADER)
+    block = os.urandom(1024 * 1024)
+    written = len(JPEG_HEADER)
+    while written < size:
+        chunk = block[:size - written]
+        spooled.write(chunk)
+        written += len(chunk)
+    spooled.seek(0)
+    return UploadFile(file=spooled, filename="photo.jpg", size=size)
+
+
+async def save_legacy(file: UploadFile, directory: Path, stem: str, max_size: int) -> str:
+    """Старый вариант: все содержимое читается в память одним вызовом"""
+    filename = f"{stem}.jpg"
+    with open(directory / filename, "wb") as buffer:
+        buffer.write(file.file.read())
+    return filename
+
+
+async def run(args):
+    save = save_legacy if args.legacy else save_image_upload
+    with tempfile.TemporaryDirectory() as directory:
+        for size_mb in args.sizes_mb:
+            size = size_mb * 1024 * 1024
+            upload = make_upload(size)
+            tracemalloc.start()
+            await save(upload, Path(directory), f"bench_{size_mb}", max_size=size + 1)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            await upload.close()
+            print(f"upload={size_mb}MB peak_python_memory={peak / 1024:.0f}KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--legacy", action="store_true", help="читать файл целиком, как раньше")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
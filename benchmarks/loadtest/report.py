@@ -0,0 +1,118 @@
+"""Сбор задержек и JSON отчет нагрузочного теста"""
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией; samples должны быть отсортированы"""
+    if not samples:
+        return 0.0
+    position = (len(samples) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(samples) - 1)
+    return samples[lower] + (samples[upper] - samples[lower]) * (position - lower)
+
+
+class Series:
+    __slots__ = ("latencies", "statuses", "errors")
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+
+    def summary(self, seconds: float) -> dict:
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "throughput_rps": round(count / seconds, 2) if seconds else 0.0,
+            "mean_ms": round(sum(latencies) / count, 2) if count else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2) if count else 0.0,
+            "statuses": dict(sorted(self.statuses.items())),
+        }
+
+
+class Recorder:
+    """Задержки по эндпоинтам и сценариям; до конца прогрева ничего не пишет"""
+
+    def __init__(self, warmup_until: float):
+        self.warmup_until = warmup_until
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.endpoints: Dict[str, Series] = {}
+        self.scenarios: Dict[str, Series] = {}
+
+    @property
+    def recording(self) -> bool:
+        now = time.monotonic()
+        if now < self.warmup_until:
+            return False
+        if self.started is None:
+            self.started = now
+        return True
+
+    def _add(self, series: Dict[str, Series], name: str, milliseconds: float, status: str, error: bool):
+        item = series.get(name)
+        if item is None:
+            item = series[name] = Series()
+        item.latencies.append(milliseconds)
+        item.statuses[status] = item.statuses.get(status, 0) + 1
+        item.errors += error
+
+    def request(self, name: str, milliseconds: float, status: int):
+        if self.recording:
+            self._add(self.endpoints, name, milliseconds, str(status), status >= 400)
+
+    def scenario(self, name: str, milliseconds: float, ok: bool):
+        if self.recording:
+            self._add(self.scenarios, name, milliseconds, "ok" if ok else "failed", not ok)
+
+    def report(self, meta: dict) -> dict:
+        finished = self.finished or time.monotonic()
+        seconds = finished - self.started if self.started is not None else 0.0
+        total = Series()
+        for series in self.endpoints.values():
+            total.latencies.extend(series.latencies)
+            total.errors += series.errors
+            for status, count in series.statuses.items():
+                total.statuses[status] = total.statuses.get(status, 0) + count
+        return {
+            "meta": {**meta, "measured_seconds": round(seconds, 2)},
+            "total": total.summary(seconds),
+            "endpoints": {name: series.summary(seconds) for name, series in sorted(self.endpoints.items())},
+            "scenarios": {name: series.summary(seconds) for name, series in sorted(self.scenarios.items())},
+        }
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> Tuple[List[str], List[str]]:
+    """Таблица сравнения с базовым отчетом и список регрессировавших эндпоинтов
+
+    Регрессия - p95 выше базового больше чем на max_regression (доля) или
+    пропускная способность ниже на столько же.
+    """
+    lines = [f"{'endpoint':<58} {'p95 ms':>18} {'rps':>18}"]
+    regressions = []
+    pairs = [("total", report["total"], baseline["total"])] + [
+        (name, current, baseline["endpoints"].get(name)) for name, current in report["endpoints"].items()
+    ]
+    for name, current, before in pairs:
+        if before is None:
+            lines.append(f"{name:<58} {'new':>18}")
+            continue
+        slower = before["p95_ms"] > 0 and current["p95_ms"] > before["p95_ms"] * (1 + max_regression)
+        fewer = before["throughput_rps"] > 0 and (
+            current["throughput_rps"] < before["throughput_rps"] * (1 - max_regression)
+        )
+        line = (f"{name:<58} {before['p95_ms']:>8.1f} -> {current['p95_ms']:<7.1f} "
+                f"{before['throughput_rps']:>8.1f} -> {current['throughput_rps']:<7.1f}")
+        if slower or fewer:
+            line += " REGRESSION"
+            regressions.append(name)
+        lines.append(line)
+    return lines, regressions
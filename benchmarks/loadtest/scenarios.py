@@ -0,0 +1,179 @@
+"""Сценарии покупателей для нагрузочного теста
+
+Каждый сценарий - корутина от VirtualUser. Запросы идут через
+VirtualUser.request с шаблоном маршрута, по нему же группируется отчет.
+"""
+import asyncio
+import random
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import httpx
+
+from benchmarks.loadtest.report import Recorder
+
+PASSWORD = "loadtest-password"
+REVIEW_TEXTS = [
+    "Отличная вещь, размер подошел, рекомендую",
+    "Качество среднее, за свою цену нормально",
+    "Доставили быстро, все как на фото",
+    "Ткань тоньше, чем ожидал, но носить можно",
+]
+PRODUCT_SORTS = ["id", "newest", "price", "-price", "rating", "-rating", "top_rated", "name"]
+# Доля выборов товара из «горячего» процента каталога: популярные товары
+# смотрят и покупают намного чаще остальных
+HOT_PRODUCT_SHARE = 0.5
+
+
+class Catalog(NamedTuple):
+    users: List[tuple]  # (id, username)
+    product_ids: List[int]
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, catalog: Catalog, rng: random.Random,
+                 recorder: Recorder, user: tuple):
+        self.client = client
+        self.catalog = catalog
+        self.random = rng
+        self.recorder = recorder
+        self.user_id, self.username = user
+        self.token: Optional[str] = None
+
+    async def request(self, method: str, route: str, path: Optional[Dict] = None, **kwargs) -> httpx.Response:
+        url = route.format(**path) if path else route
+        started = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.recorder.request(f"{method} {route}", (time.perf_counter() - started) * 1000, response.status_code)
+        return response
+
+    def product_id(self) -> int:
+        ids = self.catalog.product_ids
+        if self.random.random() < HOT_PRODUCT_SHARE:
+            return ids[self.random.randrange(max(1, len(ids) // 100))]
+        return self.random.choice(ids)
+
+    def auth_headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+async def browse_categories(vu: VirtualUser) -> bool:
+    """Главная: список категорий, категория и карточки ее товаров"""
+    response = await vu.request("GET", "/api/v1/categories/")
+    categories = response.json() if response.status_code == 200 else []
+    if not categories:
+        return False
+    category_id = vu.random.choice(categories)["id"]
+    await vu.request("GET", "/api/v1/categories/{category_id}", {"category_id": category_id})
+    response = await vu.request(
+        "GET", "/api/v1/products/", params={"category_id": category_id, "view": "card", "limit": 24}
+    )
+    return response.status_code == 200
+
+
+async def page_products(vu: VirtualUser) -> bool:
+    """Листание каталога по курсору и карточка товара с отзывами"""
+    params = {"limit": 50, "sort": vu.random.choice(PRODUCT_SORTS)}
+    products = []
+    for _ in range(vu.random.randint(1, 4)):
+        response = await vu.request("GET", "/api/v1/products/", params=params)
+        if response.status_code != 200:
+            return False
+        products = response.json() or products
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params["cursor"] = cursor
+    if not products:
+        return True
+    product_id = vu.random.choice(products)["id"]
+    response = await vu.request("GET", "/api/v1/products/{product_id}", {"product_id": product_id})
+    await vu.request("GET", "/api/v1/products/{product_id}/reviews", {"product_id": product_id})
+    return response.status_code == 200
+
+
+async def login(vu: VirtualUser) -> bool:
+    """Вход по паролю (bcrypt) и профиль"""
+    response = await vu.request(
+        "POST", "/api/v1/users/token", data={"username": vu.username, "password": PASSWORD}
+    )
+    if response.status_code != 200:
+        return False
+    vu.token = response.json()["access_token"]
+    response = await vu.request("GET", "/api/v1/users/me", headers=vu.auth_headers())
+    return response.status_code == 200
+
+
+async def add_to_cart(vu: VirtualUser) -> bool:
+    """Товар в корзину и просмотр корзины"""
+    path = {"user_id": vu.user_id, "product_id": vu.product_id()}
+    response = await vu.request("POST", "/api/v1/carts/user/{user_id}/items/{product_id}", path)
+    await vu.request("GET", "/api/v1/carts/user/{user_id}", {"user_id": vu.user_id})
+    return response.status_code == 200
+
+
+async def checkout(vu: VirtualUser) -> bool:
+    """Заказ из корзины и очистка корзины"""
+    response = await vu.request("GET", "/api/v1/carts/user/{user_id}", {"user_id": vu.user_id})
+    items = response.json()["items"] if response.status_code == 200 else []
+    lines = [{"product_id": product_id, "quantity": vu.random.randint(1, 3)} for product_id in items]
+    if not lines:
+        lines = [{"product_id": vu.product_id(), "quantity": 1}]
+    response = await vu.request(
+        "POST", "/api/v1/orders/orders/checkout", json={"user_id": vu.user_id, "lines": lines}
+    )
+    if items:
+        await vu.request(
+            "POST", "/api/v1/carts/user/{user_id}/items/batch", {"user_id": vu.user_id}, json={"remove": items}
+        )
+    return response.status_code == 201
+
+
+async def write_review(vu: VirtualUser) -> bool:
+    """Отзыв о товаре и обновленный рейтинг"""
+    product_id = vu.product_id()
+    response = await vu.request("POST", "/api/v1/reviews/reviews/", json={
+        "text": vu.random.choice(REVIEW_TEXTS),
+        "rating": vu.random.randint(1, 5),
+        "product_id": product_id,
+        "user_id": vu.user_id,
+    })
+    await vu.request("GET", "/api/v1/products/{product_id}/rating", {"product_id": product_id})
+    return response.status_code == 201
+
+
+SCENARIOS = {
+    "browse": browse_categories,
+    "page": page_products,
+    "login": login,
+    "cart": add_to_cart,
+    "checkout": checkout,
+    "review": write_review,
+}
+# Примерная доля сценариев у посетителей магазина: в основном смотрят
+DEFAULT_MIX = "browse=30,page=35,login=5,cart=15,checkout=10,review=5"
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}', expected one of {sorted(SCENARIOS)}")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+async def run_virtual_user(vu: VirtualUser, mix: Dict[str, int], deadline: float, think_time: float):
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        name = vu.random.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            ok = await SCENARIOS[name](vu)
+        except httpx.HTTPError:
+            ok = False
+        vu.recorder.scenario(name, (time.perf_counter() - started) * 1000, ok)
+        if think_time:
+            await asyncio.sleep(vu.random.expovariate(1 / think_time))
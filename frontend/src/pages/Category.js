@@ -35,7 +35,7 @@ const CategoryPage = () => {
         // Параллельная загрузка данных категории и товаров
         const [categoryRes, productsRes] = await Promise.all([
           axios.get(`http://localhost:8000/api/v1/categories/${id}`),
-          axios.get(`http://localhost:8000/api/v1/products?category_id=${id}`)
+          axios.get(`http://localhost:8000/api/v1/products?category_id=${id}&view=card`)
         ]);
 
         setCategory(categoryRes.data);
@@ -102,12 +102,14 @@ const CategoryPage = () => {
                   <Card.Img
                     variant="top"
                     src={product.main_image
-                      ? `http://localhost:8000${product.main_image}`
+                      ? `http://localhost:8000${product.main_image_variants?.list_webp ?? product.main_image}`
                       : '/placeholder-product.jpg'}
                     alt={product.name}
                     className="h-100 w-100 object-fit-cover"
                     onError={(e) => {
-                      e.target.src = '/placeholder-product.jpg';
+                      // Вариант мог еще не построиться - пробуем оригинал, затем заглушку
+                      const original = product.main_image && `http://localhost:8000${product.main_image}`;
+                      e.target.src = original && e.target.src !== original ? original : '/placeholder-product.jpg';
                     }}
                   />
                 </div>
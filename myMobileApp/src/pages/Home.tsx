@@ -11,6 +11,7 @@ interface Product {
   price: number;
   description?: string;
   main_image?: string;
+  main_image_variants?: Record<string, string>;
   additional_images_urls?: string[];
   category_id: number;
 }
@@ -19,6 +20,7 @@ interface Category {
   id: number;
   name: string;
   image_url?: string;
+  image_variants?: Record<string, string>;
 }
 
 const Home: React.FC = () => {
@@ -74,7 +76,10 @@ const Home: React.FC = () => {
           {categories.map((category) => (
             <IonCard key={category.id} routerLink={`/products?category_id=${category.id}`}>
               {category.image_url && (
-                <IonImg src={`http://127.0.0.1:8000${category.image_url}`} />
+                <IonImg
+                  src={`http://127.0.0.1:8000${category.image_variants?.list_webp ?? category.image_url}`}
+                  onIonError={(e) => { (e.target as HTMLIonImgElement).src = `http://127.0.0.1:8000${category.image_url}`; }}
+                />
               )}
               <IonCardHeader>
                 <IonCardTitle>{category.name}</IonCardTitle>
@@ -91,7 +96,8 @@ const Home: React.FC = () => {
               {product.main_image && (
                 <IonImg 
                   slot="start" 
-                  src={`http://127.0.0.1:8000${product.main_image}`} 
+                  src={`http://127.0.0.1:8000${product.main_image_variants?.thumb_webp ?? product.main_image}`}
+                  onIonError={(e) => { (e.target as HTMLIonImgElement).src = `http://127.0.0.1:8000${product.main_image}`; }}
                   style={{ width: '80px', height: '80px', objectFit: 'cover' }}
                 />
               )}
@@ -0,0 +1,144 @@
+import asyncio
+import dataclasses
+import time
+import pytest
+from datetime import timedelta
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1 import auth
+from app.api.v1.auth import (
+    CurrentUser,
+    authenticate_user,
+    create_access_token,
+    get_current_user,
+    invalidate_user,
+    user_cache,
+    verify_password,
+)
+from app.api.v1.users import ChangePasswordRequest, change_password
+from app.cache import TTLCache
+
+
+def make_session(user):
+    session = AsyncMock(spec=AsyncSession)
+    result = MagicMock()
+    result.scalars.return_value.first.return_value = user
+    result.first.return_value = None if user is None else SimpleNamespace(_mapping={
+        "id": user.id, "username": user.username, "email": f"{user.username}@example.com",
+        "first_name": "Имя", "last_name": "Фамилия", "is_active": True, "is_superuser": False,
+    })
+    session.execute = AsyncMock(return_value=result)
+    return session
+
+
+class TestTTLCache:
+    def test_lru_eviction(self):
+        """При переполнении вытесняется давно не использованная запись"""
+        cache = TTLCache("test_lru", maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    def test_expires_at_caps_ttl(self):
+        """Запись не переживает переданный expires_at"""
+        cache = TTLCache("test_expiry", maxsize=10, ttl=60)
+        cache.set("expired", 1, expires_at=time.time() - 1)
+        assert cache.get("expired") is None
+        assert len(cache) == 0
+
+
+class TestGetCurrentUser:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        user_cache.clear()
+        yield
+        user_cache.clear()
+
+    @pytest.mark.asyncio
+    async def test_second_request_served_from_cache(self):
+        """Повторный запрос с тем же токеном не ходит в базу"""
+        user = SimpleNamespace(id=1, username="ivan")
+        token = create_access_token({"sub": "ivan"}, expires_delta=timedelta(minutes=5))
+        session = make_session(user)
+
+        first = await get_current_user(token=token, db=session)
+        assert await get_current_user(token=token, db=session) is first
+        assert (first.id, first.username) == (1, "ivan")
+        session.execute.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_cached_snapshot_has_no_password_hash(self):
+        """В кэше неизменяемый снимок без хеша пароля, а не ORM объект"""
+        token = create_access_token({"sub": "ivan"}, expires_delta=timedelta(minutes=5))
+        session = make_session(SimpleNamespace(id=1, username="ivan"))
+
+        user = await get_current_user(token=token, db=session)
+        assert isinstance(user, CurrentUser)
+        assert not hasattr(user, "hashed_password")
+        sql = str(session.execute.await_args.args[0])
+        assert "hashed_password" not in sql
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            user.is_superuser = True
+
+    @pytest.mark.asyncio
+    async def test_invalidate_user(self):
+        """После изменения пользователя его токены снова проверяются по базе"""
+        user = SimpleNamespace(id=7, username="olga")
+        token = create_access_token({"sub": "olga"}, expires_delta=timedelta(minutes=5))
+        session = make_session(user)
+
+        await get_current_user(token=token, db=session)
+        assert invalidate_user(7) == 1
+        await get_current_user(token=token, db=session)
+        assert session.execute.await_count == 2
+
+
+class TestPasswordHashing:
+    @pytest.mark.asyncio
+    async def test_rehash_on_login(self):
+        """Хеш с устаревшей стоимостью bcrypt перезаписывается при входе"""
+        old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("password1")
+        user = SimpleNamespace(id=3, username="petr", hashed_password=old_hash)
+        session = make_session(user)
+        session.commit = AsyncMock()
+
+        assert await authenticate_user("petr", "password1", session) is user
+        assert session.execute.await_count == 2  # SELECT и UPDATE с новым хешем
+        session.commit.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_overloaded_pool_returns_503(self, monkeypatch):
+        """Когда очередь хеширования заполнена, запрос сразу получает 503"""
+        monkeypatch.setattr(auth, "_hash_slots", asyncio.Semaphore(0))
+        with pytest.raises(HTTPException) as exc_info:
+            await verify_password("password1", "hash")
+        assert exc_info.value.status_code == 503
+
+
+class TestChangePassword:
+    @pytest.mark.asyncio
+    async def test_checks_current_password_against_database(self):
+        """Текущий пароль сверяется с хешем из базы, а не из кэша пользователей"""
+        hashed = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("new-password1")
+        session = AsyncMock(spec=AsyncSession)
+        session.scalar = AsyncMock(return_value=hashed)
+        user = CurrentUser(id=5, username="anna", email="anna@example.com", first_name="Анна",
+                           last_name="Иванова", is_active=True, is_superuser=False)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await change_password(ChangePasswordRequest(current_password="old-password1", new_password="x" * 8),
+                                  current_user=user, db=session)
+        assert exc_info.value.status_code == 400
+
+        result = await change_password(ChangePasswordRequest(current_password="new-password1", new_password="x" * 8),
+                                       current_user=user, db=session)
+        assert result == {"message": "Password updated successfully"}
+        session.commit.assert_awaited_once()
@@ -0,0 +1,58 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from unittest.mock import AsyncMock, MagicMock
+
+from app.api.v1.carts import change_cart_items, remove_item_from_user_cart
+
+
+def make_session(found_ids, cart_id=1):
+    session = AsyncMock(spec=AsyncSession)
+    result = MagicMock()
+    result.scalar.return_value = cart_id
+    result.scalars.return_value = found_ids
+    session.execute = AsyncMock(return_value=result)
+    return session
+
+
+def compiled(call) -> str:
+    return str(call.args[0].compile(dialect=postgresql.dialect()))
+
+
+class TestChangeCartItems:
+    @pytest.mark.asyncio
+    async def test_set_based_statements(self):
+        """Пачка изменений - один DELETE и один INSERT, без загрузки корзины"""
+        session = make_session([4, 5])
+        await change_cart_items(1, add=[5, 4, 5], remove=[1, 2], db=session)
+
+        delete_sql, insert_sql = (compiled(call) for call in session.execute.await_args_list)
+        assert "DELETE FROM cart_items" in delete_sql
+        assert "= ANY (" in delete_sql and "RETURNING cart_items.product_id" in delete_sql
+        assert "INSERT INTO cart_items" in insert_sql
+        assert "ON CONFLICT DO NOTHING" in insert_sql
+
+    @pytest.mark.asyncio
+    async def test_unknown_products(self):
+        """Несуществующие товары дают 404 и откат всей пачки"""
+        session = make_session([4])
+        with pytest.raises(HTTPException) as exc_info:
+            await change_cart_items(1, add=[4, 404], remove=[], db=session)
+
+        assert exc_info.value.status_code == 404
+        assert "404" in exc_info.value.detail
+        session.rollback.assert_awaited_once()
+
+
+class TestRemoveItem:
+    @pytest.mark.asyncio
+    async def test_product_not_in_cart(self):
+        """Удаление товара, которого нет в корзине, - 404 без коммита"""
+        session = make_session([])
+        with pytest.raises(HTTPException) as exc_info:
+            await remove_item_from_user_cart(2, 9, db=session)
+
+        assert exc_info.value.status_code == 404
+        assert exc_info.value.detail == "Product not found in cart"
+        session.commit.assert_not_awaited()
@@ -1,12 +1,24 @@
+import asyncio
+import json
 import pytest
+from datetime import datetime, timezone
 from fastapi import status, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from unittest.mock import AsyncMock, patch
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 from sqlalchemy.exc import IntegrityError
+from app.api.v1 import category as category_module
 from app.api.v1.category import create_category
 from app.api.v1.category import CategoryCreate
+from app.api.v1.category import (
+    CATALOG_VERSION_HEADER,
+    read_categories,
+    read_category,
+    refresh_category_snapshot,
+)
 from app.db.models import Category
 
+UPDATED_AT = datetime(2026, 10, 1, tzinfo=timezone.utc)
 
 class TestCreateCategory:
     @pytest.mark.asyncio
@@ -120,3 +132,91 @@ class TestCreateCategory:
 
         assert exc_info.value.status_code == status.HTTP_400_BAD_REQUEST
         assert "Refresh failed" in exc_info.value.detail
+
+
+class TestCategorySnapshot:
+    @staticmethod
+    def make_session(*rows):
+        """Сессия, которая на select категорий отдает заданные строки"""
+        mock_session = AsyncMock(spec=AsyncSession)
+        result = MagicMock()
+        result.all.return_value = list(rows)
+        mock_session.execute.return_value = result
+        return mock_session
+
+    @pytest.fixture(autouse=True)
+    def empty_snapshot(self, monkeypatch):
+        monkeypatch.setattr(category_module, "_category_snapshot", None)
+
+    @pytest.mark.asyncio
+    async def test_reads_served_from_snapshot(self):
+        """Повторные чтения не ходят в БД и отдают заголовок версии"""
+        mock_session = self.make_session(SimpleNamespace(id=1, name="Брюки", image_url=None, thumbnail_url=None, updated_at=UPDATED_AT))
+
+        first = await read_categories(db=mock_session)
+        second = await read_category(category_id=1, db=mock_session)
+
+        mock_session.execute.assert_awaited_once()
+        assert json.loads(first.body) == [{"id": 1, "name": "Брюки", "image_url": None, "thumbnail_url": None, "image_variants": None}]
+        assert json.loads(second.body)["name"] == "Брюки"
+        assert first.headers[CATALOG_VERSION_HEADER] == second.headers[CATALOG_VERSION_HEADER]
+
+    @pytest.mark.asyncio
+    async def test_missing_category(self):
+        """Отсутствующая в снимке категория дает 404"""
+        with pytest.raises(HTTPException) as exc_info:
+            await read_category(category_id=42, db=self.make_session())
+        assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+
+    @pytest.mark.asyncio
+    async def test_version_changes_only_on_change(self, monkeypatch):
+        """Версия - хеш содержимого: меняется вместе с ним и совпадает в разных процессах"""
+        row = SimpleNamespace(id=1, name="Брюки", image_url=None, thumbnail_url=None, updated_at=UPDATED_AT)
+        version = (await refresh_category_snapshot(self.make_session(row))).version
+        assert (await refresh_category_snapshot(self.make_session(row))).version == version
+
+        # Другой воркер загружает снимок с нуля и получает ту же версию
+        monkeypatch.setattr(category_module, "_category_snapshot", None)
+        assert (await refresh_category_snapshot(self.make_session(row))).version == version
+
+        renamed = SimpleNamespace(id=1, name="Джинсы", image_url=None, thumbnail_url=None, updated_at=UPDATED_AT)
+        snapshot = await refresh_category_snapshot(self.make_session(renamed))
+        assert snapshot.version != version
+        assert json.loads(snapshot.item_payloads[1])["name"] == "Джинсы"
+
+    @pytest.mark.asyncio
+    async def test_stale_snapshot_refreshed_once(self):
+        """Одновременные чтения устаревшего снимка перечитывают его один раз"""
+        row = SimpleNamespace(id=1, name="Брюки", image_url=None, thumbnail_url=None, updated_at=UPDATED_AT)
+        mock_session = self.make_session(row)
+        result = mock_session.execute.return_value
+
+        async def slow_execute(query):
+            # Пока первый запрос в БД идет, остальные встают в очередь на блокировку
+            await asyncio.sleep(0.01)
+            return result
+
+        mock_session.execute.side_effect = slow_execute
+        await asyncio.gather(*(read_categories(db=mock_session) for _ in range(10)))
+
+        mock_session.execute.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_if_none_match_returns_304(self):
+        """Совпавший ETag дает пустой 304 с версией каталога, изменение строки меняет ETag"""
+        row = SimpleNamespace(id=1, name="Брюки", image_url=None, thumbnail_url=None, updated_at=UPDATED_AT)
+        first = await read_category(category_id=1, db=self.make_session(row))
+        etag = first.headers["ETag"]
+
+        cached = await read_category(category_id=1, db=self.make_session(row), if_none_match=etag.removeprefix("W/"))
+        assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+        assert cached.body == b""
+        assert cached.headers["ETag"] == etag
+        assert cached.headers["X-Catalog-Version"] == first.headers["X-Catalog-Version"]
+
+        touched = SimpleNamespace(id=1, name="Брюки", image_url=None, thumbnail_url=None,
+                                  updated_at=datetime(2026, 10, 2, tzinfo=timezone.utc))
+        await refresh_category_snapshot(self.make_session(touched))
+        fresh = await read_category(category_id=1, db=self.make_session(touched), if_none_match=etag)
+        assert fresh.status_code == status.HTTP_200_OK
+        assert fresh.headers["ETag"] != etag
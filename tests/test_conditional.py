@@ -0,0 +1,38 @@
+import pytest
+from datetime import datetime, timezone
+from fastapi import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from unittest.mock import AsyncMock
+
+from app.api.v1.conditional import etag_matches, make_etag
+from app.api.v1.product import read_product
+
+UPDATED_AT = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+class TestEtagMatches:
+    def test_list_weak_and_star(self):
+        """If-None-Match принимает списки, слабые метки и *"""
+        etag = make_etag("product", [(1, UPDATED_AT)])
+        assert etag.startswith('W/"')
+        assert etag_matches(f'"other", {etag}', etag)
+        assert etag_matches(f'"other", {etag[2:]}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches(make_etag("product", [(2, UPDATED_AT)]), etag)
+
+
+class TestReadProductConditional:
+    @pytest.mark.asyncio
+    async def test_not_modified_without_loading_product(self):
+        """При совпадении ETag товар не загружается, ответ 304"""
+        session = AsyncMock(spec=AsyncSession)
+        session.scalar = AsyncMock(return_value=UPDATED_AT)
+        etag = make_etag("product", [(5, UPDATED_AT)])
+
+        result = await read_product(5, Response(), db=session, if_none_match=etag)
+
+        assert result.status_code == 304
+        assert result.headers["ETag"] == etag
+        assert "max-age" in result.headers["Cache-Control"]
+        session.get.assert_not_awaited()
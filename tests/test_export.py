@@ -0,0 +1,48 @@
+import json
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.api.v1 import export as export_module
+from app.api.v1.export import encode_csv, encode_ndjson, export_orders
+
+
+class Row(tuple):
+    """Строка результата: кортеж с _asdict, как у SQLAlchemy Row"""
+
+    def __new__(cls, **values):
+        row = super().__new__(cls, values.values())
+        row.values = values
+        return row
+
+    def _asdict(self):
+        return self.values
+
+
+class TestEncoders:
+    def test_ndjson_and_csv(self):
+        """NDJSON - объект на строку с ISO датами, CSV - строки в порядке колонок"""
+        rows = [Row(id=1, name="Куртка, зимняя", updated_at=datetime(2026, 10, 1, tzinfo=timezone.utc))]
+
+        [line] = encode_ndjson(rows).splitlines()
+        assert json.loads(line) == {"id": 1, "name": "Куртка, зимняя", "updated_at": "2026-10-01T00:00:00+00:00"}
+        assert encode_csv(rows).decode() == '1,"Куртка, зимняя",2026-10-01 00:00:00+00:00\r\n'
+
+
+class TestExportOrders:
+    @pytest.mark.asyncio
+    async def test_ndjson_query_with_details_and_updated_since(self):
+        """Детали собираются в том же запросе, updated_since фильтрует по updated_at"""
+        with patch.object(export_module, "stream_export") as stream_export:
+            response = await export_orders(
+                format="ndjson", updated_since=datetime(2026, 10, 1, tzinfo=timezone.utc), current_user=None
+            )
+
+        statement, fmt = stream_export.call_args.args
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert fmt == "ndjson"
+        assert "json_agg(json_build_object(" in sql and "ORDER BY orderdetails.id" in sql
+        assert "orders.updated_at >= " in sql
+        assert response.media_type == "application/x-ndjson"
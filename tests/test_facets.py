@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from app.api.v1 import category as category_api, facets
+from app.api.v1.facets import ProductFilters, get_product_facets, invalidate_product_facets
+
+
+def facet_rows():
+    row = lambda grouping, count, category_id=None, price_bucket=None, rating_bucket=None: SimpleNamespace(
+        grouping=grouping, count=count, category_id=category_id,
+        price_bucket=price_bucket, rating_bucket=rating_bucket,
+    )
+    return [
+        row(0b011, 2, category_id=1),
+        row(0b011, 5, category_id=2),
+        row(0b101, 6, price_bucket=1),
+        row(0b101, 1, price_bucket=7),
+        row(0b110, 3, rating_bucket=0),
+        row(0b110, 4, rating_bucket=4),
+        row(0b111, 7),
+    ]
+
+
+@pytest.fixture
+def session():
+    invalidate_product_facets()
+    session = AsyncMock(spec=AsyncSession)
+    session.execute = AsyncMock(return_value=facet_rows())
+    yield session
+    invalidate_product_facets()
+
+
+class TestProductFacets:
+    @pytest.mark.asyncio
+    async def test_single_grouping_sets_query(self, session):
+        """Категории, цены, рейтинг и общее число - одним запросом"""
+        result = await get_product_facets(session, ProductFilters(min_price=100))
+
+        session.execute.assert_awaited_once()
+        sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "GROUPING SETS" in sql and "products.price >=" in sql
+        assert result["total"] == 7
+        assert result["categories"] == [{"category_id": 2, "count": 5}, {"category_id": 1, "count": 2}]
+        assert result["price"][0] == {"min": 0.0, "max": 500.0, "count": 6}
+        assert result["price"][-1] == {"min": 20000.0, "max": None, "count": 1}
+        assert len(result["price"]) == len(facets.PRICE_BUCKET_EDGES)
+        assert result["rating"][0] == {"min": 0.0, "max": 1.0, "count": 3}
+        assert result["rating"][-1] == {"min": 4.0, "max": None, "count": 4}
+
+    @pytest.mark.asyncio
+    async def test_cached_per_filters_until_invalidated(self, session):
+        """Повтор с теми же фильтрами из кэша; запись товаров сбрасывает кэш"""
+        await get_product_facets(session, ProductFilters(category_id=1))
+        await get_product_facets(session, ProductFilters(category_id=1))
+        assert session.execute.await_count == 1
+
+        await get_product_facets(session, ProductFilters(category_id=2))
+        assert session.execute.await_count == 2
+
+        invalidate_product_facets()
+        await get_product_facets(session, ProductFilters(category_id=1))
+        assert session.execute.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_write_during_query_not_cached(self, session):
+        """Результат запроса, во время которого товары менялись, не кэшируется"""
+        async def execute_with_write(query):
+            invalidate_product_facets()
+            return facet_rows()
+
+        session.execute = AsyncMock(side_effect=execute_with_write)
+        await get_product_facets(session, ProductFilters())
+        assert len(facets.facet_cache) == 0
+
+
+class TestCategoryWritesInvalidate:
+    @pytest.mark.asyncio
+    async def test_delete_category_clears_facets(self, session, monkeypatch):
+        """Удаление категории обнуляет category_id товаров - фасеты сбрасываются"""
+        await get_product_facets(session, ProductFilters())
+        assert len(facets.facet_cache) == 1
+
+        monkeypatch.setattr(category_api, "refresh_category_snapshot", AsyncMock())
+        db = AsyncMock(spec=AsyncSession)
+        db.get = AsyncMock(return_value=SimpleNamespace(id=1, image_url=None, thumbnail_url=None))
+        await category_api.delete_category(1, db=db)
+
+        assert len(facets.facet_cache) == 0
@@ -0,0 +1,33 @@
+from PIL import Image
+
+from app.images import image_variant_urls, remove_image, render_variants, variants_dir
+
+
+class TestImageVariants:
+    def test_variant_urls(self):
+        """URL вариантов выводятся из URL оригинала"""
+        urls = image_variant_urls("/static/images/products/main_1_abc.png")
+        assert urls["thumb"] == "/static/images/products/variants/main_1_abc/thumb.jpg"
+        assert urls["list_webp"] == "/static/images/products/variants/main_1_abc/list.webp"
+        assert image_variant_urls(None) is None
+
+    def test_variant_urls_not_shared(self):
+        """Изменение полученного словаря не портит кэш для других вызовов"""
+        url = "/static/images/products/main_2_abc.png"
+        urls = image_variant_urls(url)
+        urls["thumb"] = "/evil.jpg"
+        assert image_variant_urls(url)["thumb"] == "/static/images/products/variants/main_2_abc/thumb.jpg"
+
+    def test_render_and_remove(self, tmp_path):
+        """Варианты уменьшаются по большей стороне и удаляются вместе с оригиналом"""
+        source = tmp_path / "main_1_abc.png"
+        Image.new("RGBA", (2000, 1000), (200, 10, 10, 128)).save(source)
+
+        assert render_variants(str(source)) == 6
+        with Image.open(variants_dir(source) / "thumb.jpg") as thumb:
+            assert thumb.size == (160, 80)
+        with Image.open(variants_dir(source) / "detail.webp") as detail:
+            assert detail.size == (1200, 600)
+
+        remove_image(source)
+        assert list(tmp_path.rglob("*.*")) == []
@@ -0,0 +1,33 @@
+import pytest
+from fastapi import HTTPException
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from app.api.v1 import internal
+from app.api.v1.internal import require_internal_access
+
+
+class TestRequireInternalAccess:
+    @pytest.mark.asyncio
+    async def test_static_token(self, monkeypatch):
+        """INTERNAL_API_TOKEN пускает без проверки пользователя"""
+        monkeypatch.setattr(internal, "INTERNAL_API_TOKEN", "scrape-secret")
+        get_user = AsyncMock()
+        monkeypatch.setattr(internal, "get_current_user", get_user)
+
+        await require_internal_access(token="scrape-secret", db=AsyncMock())
+        get_user.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_regular_user_forbidden(self, monkeypatch):
+        """Обычный пользователь получает 403, администратор проходит"""
+        monkeypatch.setattr(internal, "INTERNAL_API_TOKEN", None)
+        user = SimpleNamespace(id=1, is_superuser=False)
+        monkeypatch.setattr(internal, "get_current_user", AsyncMock(return_value=user))
+
+        with pytest.raises(HTTPException) as exc_info:
+            await require_internal_access(token="jwt", db=AsyncMock())
+        assert exc_info.value.status_code == 403
+
+        user.is_superuser = True
+        await require_internal_access(token="jwt", db=AsyncMock())
@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+from types import SimpleNamespace
+
+from app import metrics
+from app.main import MetricsMiddleware
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        # Имитация двух запросов к базе внутри обработчика
+        context = SimpleNamespace()
+        for _ in range(2):
+            metrics._before_cursor_execute(None, None, "SELECT 1", None, context, False)
+            metrics._after_cursor_execute(None, None, "SELECT 1", None, context, False)
+        return {"id": item_id}
+
+    return app
+
+
+async def get_all(app, *paths):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for path in paths:
+            await client.get(path)
+
+
+class TestMetricsMiddleware:
+    def setup_method(self):
+        metrics.registry.clear()
+
+    def test_labels_by_route_template_and_counts_queries(self):
+        """Метка route - шаблон маршрута, запросы к базе приписываются HTTP запросу"""
+        asyncio.run(get_all(make_app(), "/items/1", "/items/2", "/missing"))
+
+        assert metrics.registry.requests == {
+            ("GET", "/items/{item_id}", 200): 2,
+            ("GET", metrics.UNMATCHED_ROUTE, 404): 1,
+        }
+        route = metrics.registry.routes[("GET", "/items/{item_id}")]
+        assert route.db_queries_total == 4
+        assert route.latency.count == 2
+        assert metrics.registry.background_queries == 0
+        assert metrics.registry.in_flight == 0
+
+    def test_render_prometheus(self):
+        """Накопительные корзины гистограммы и экранирование меток"""
+        stats = metrics.RequestStats()
+        stats.queries = 3
+        metrics.registry.observe_request("GET", '/a"b', 200, 0.02, stats)
+        metrics.registry.observe_request("GET", '/a"b', 200, 3.0, stats)
+
+        text = metrics.render_prometheus()
+
+        assert 'http_requests_total{method="GET",route="/a\\"b",status="200"} 2' in text
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/a\\"b",le="0.025"} 1' in text
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/a\\"b",le="5.0"} 2' in text
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/a\\"b",le="+Inf"} 2' in text
+        assert 'db_queries_total{method="GET",route="/a\\"b"} 6' in text
+
+
+def test_metrics_endpoint_requires_internal_access():
+    """/metrics без токена не отдается"""
+    from app.main import app
+
+    async def get_metrics():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/metrics")
+
+    assert asyncio.run(get_metrics()).status_code == 401
@@ -0,0 +1,97 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from app.api.v1.orders import CheckoutRequest, checkout
+from app.db.models import Category, Order, OrderDetail, Product, User
+
+
+class TestCheckout:
+    @pytest.mark.asyncio
+    async def test_unknown_products_checked_in_one_query(self):
+        """Все товары проверяются одним запросом, заказ при ошибке не создается"""
+        session = AsyncMock(spec=AsyncSession)
+        result = MagicMock()
+        result.scalars.return_value = [1, 2]
+        session.execute = AsyncMock(return_value=result)
+
+        request = CheckoutRequest(user_id=1, lines=[
+            {"product_id": 1, "quantity": 2}, {"product_id": 2}, {"product_id": 7}, {"product_id": 1},
+        ])
+        with pytest.raises(HTTPException) as exc_info:
+            await checkout(request, db=session)
+
+        assert exc_info.value.status_code == 400
+        assert exc_info.value.detail == "Products not found: [7]"
+        session.execute.assert_awaited_once()
+        session.commit.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_deleted_product_not_reported_as_missing_user(self):
+        """Нарушение внешнего ключа товара не выдается за отсутствие пользователя"""
+        cause = Exception("foreign key violation")
+        cause.constraint_name = "orderdetails_product_id_fkey"
+        orig = Exception("insert or update on table \"orderdetails\" violates foreign key constraint")
+        orig.__cause__ = cause
+        checked = MagicMock()
+        checked.scalars.return_value = [1]
+        order = MagicMock()
+        order.one.return_value = SimpleNamespace(id=10, total=100.0)
+        session = AsyncMock(spec=AsyncSession)
+        session.execute = AsyncMock(side_effect=[checked, order, IntegrityError("INSERT", {}, orig)])
+
+        with pytest.raises(HTTPException) as exc_info:
+            await checkout(CheckoutRequest(user_id=1, lines=[{"product_id": 1}]), db=session)
+
+        assert exc_info.value.detail == "Products not found"
+        session.rollback.assert_awaited_once()
+
+
+async def seed_checkout(db):
+    db.add(User(id=1, username="buyer", email="buyer@example.com", first_name="Иван", last_name="Петров",
+                hashed_password="x"))
+    db.add(Category(id=1, name="Одежда"))
+    await db.flush()
+    db.add_all([
+        Product(id=1, name="Куртка", category_id=1, price=2500.0),
+        Product(id=2, name="Шапка", category_id=1, price=400.5),
+    ])
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_checkout_creates_order_with_total_and_details(client, db_session):
+    """Сумма считается по ценам товаров, одинаковые товары сливаются в одну строку"""
+    await seed_checkout(db_session)
+
+    response = await client.post("/api/v1/orders/orders/checkout", json={"user_id": 1, "lines": [
+        {"product_id": 1, "quantity": 2}, {"product_id": 2}, {"product_id": 1},
+    ]})
+
+    assert response.status_code == 201, response.text
+    body = response.json()
+    assert body["user_id"] == 1
+    assert body["total"] == pytest.approx(3 * 2500.0 + 400.5)
+    assert sorted((line["product_id"], line["quantity"]) for line in body["details"]) == [(1, 3), (2, 1)]
+    assert {line["order_id"] for line in body["details"]} == {body["id"]}
+
+    rows = (await db_session.execute(
+        select(OrderDetail.product_id, OrderDetail.quantity).where(OrderDetail.order_id == body["id"])
+    )).all()
+    assert sorted(rows) == [(1, 3), (2, 1)]
+    assert await db_session.scalar(select(Order.total).where(Order.id == body["id"])) == pytest.approx(7900.5)
+
+
+@pytest.mark.asyncio
+async def test_checkout_unknown_user(client, db_session):
+    """Несуществующий пользователь - 400 User not found по имени ограничения"""
+    await seed_checkout(db_session)
+
+    response = await client.post("/api/v1/orders/orders/checkout", json={"user_id": 99, "lines": [{"product_id": 1}]})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "User not found"
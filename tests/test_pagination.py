@@ -0,0 +1,80 @@
+import pytest
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.api.v1.pagination import apply_keyset, decode_cursor, encode_cursor
+from app.db.models import Order, Product
+
+
+class TestCursor:
+    def test_roundtrip(self):
+        """Курсор восстанавливает значения ключа без потерь"""
+        cursor = encode_cursor("-price", [4999.0, 17])
+        assert decode_cursor(cursor, "-price", 2) == [4999.0, 17]
+
+    def test_unicode_values(self):
+        """Курсор по имени товара переживает кириллицу"""
+        cursor = encode_cursor("name", ["Брюки Каро", 3])
+        assert decode_cursor(cursor, "name", 2) == ["Брюки Каро", 3]
+
+    @pytest.mark.parametrize("cursor,sort", [
+        ("not-a-cursor", "id"),
+        (encode_cursor("price", [10.0, 1]), "rating"),  # Курсор от другой сортировки
+        (encode_cursor("id", [1, 2]), "id"),  # Неверная длина ключа
+    ])
+    def test_invalid_cursor(self, cursor, sort):
+        """Испорченный или чужой курсор дает 400, а не 500"""
+        size = 1 if sort == "id" else 2
+        with pytest.raises(HTTPException) as exc_info:
+            decode_cursor(cursor, sort, size)
+        assert exc_info.value.status_code == 400
+
+
+class TestApplyKeyset:
+    @staticmethod
+    def compile(query) -> str:
+        return str(query.compile(dialect=postgresql.dialect()))
+
+    def test_first_page(self):
+        """Без курсора добавляется только сортировка"""
+        sql = self.compile(apply_keyset(select(Product.id), (Product.price, Product.id), False))
+        assert "WHERE" not in sql
+        assert "ORDER BY products.price, products.id" in sql
+
+    def test_descending_after_cursor(self):
+        """Для убывающей сортировки сравнение строк идет через «<»"""
+        query = apply_keyset(select(Product.id), (Product.rating, Product.id), True, [4.5, 10])
+        sql = self.compile(query)
+        assert "(products.rating, products.id) < (" in sql
+        assert "ORDER BY products.rating DESC, products.id DESC" in sql
+
+    def test_datetime_cursor(self):
+        """Даты в курсоре переживают JSON и снова становятся datetime"""
+        created_at = datetime(2026, 10, 18, 12, 30, tzinfo=timezone.utc)
+        after = decode_cursor(encode_cursor("-created_at", [created_at, 5]), "-created_at", 2)
+        query = apply_keyset(select(Order.id), (Order.created_at, Order.id), True, after)
+        params = query.compile(dialect=postgresql.dialect()).params
+        assert created_at in params.values()
+
+    @pytest.mark.parametrize("columns,after", [
+        ((Product.price, Product.id), ["abc", 1]),
+        ((Product.price, Product.id), [10.0, "1"]),
+        ((Product.price, Product.id), [None, 1]),
+        ((Product.price, Product.id), [True, 1]),
+        ((Product.name, Product.id), [42, 1]),
+        ((Order.created_at, Order.id), ["вчера", 1]),
+        ((Order.created_at, Order.id), [1700000000, 1]),
+    ])
+    def test_cursor_value_type_mismatch(self, columns, after):
+        """Значение курсора не того типа, что колонка, дает 400 до запроса в БД"""
+        with pytest.raises(HTTPException) as exc_info:
+            apply_keyset(select(Product.id), columns, False, after)
+        assert exc_info.value.status_code == 400
+        assert exc_info.value.detail == "Invalid cursor"
+
+    def test_integer_price_in_cursor(self):
+        """Целая цена в курсоре приводится к float"""
+        query = apply_keyset(select(Product.id), (Product.price, Product.id), False, [5000, 3])
+        assert 5000.0 in query.compile(dialect=postgresql.dialect()).params.values()
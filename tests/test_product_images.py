@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from app.api.v1.product import attach_image_urls
+
+
+class TestAttachImageUrls:
+    @pytest.mark.asyncio
+    async def test_one_query_for_page(self):
+        """Картинки всей страницы берутся одним запросом, товары без картинок получают None"""
+        products = [SimpleNamespace(id=1), SimpleNamespace(id=2), SimpleNamespace(id=3)]
+        session = AsyncMock(spec=AsyncSession)
+        session.execute = AsyncMock(return_value=[(1, "/a.jpg"), (1, "/b.jpg"), (3, "/c.jpg")])
+
+        await attach_image_urls(session, products)
+
+        session.execute.assert_awaited_once()
+        assert [product.additional_images_urls for product in products] == [["/a.jpg", "/b.jpg"], None, ["/c.jpg"]]
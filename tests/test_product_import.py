@@ -0,0 +1,61 @@
+import io
+
+import pytest
+from sqlalchemy import select
+
+from app.db.models import Category, Product
+from app.db.product_import import detect_format, import_products, iter_batches
+
+
+class TestIterBatches:
+    def test_csv_rows_validated_with_line_numbers(self):
+        """Ошибочные строки попадают в ошибки с номером строки, остальные в записи для COPY"""
+        data = (
+            "sku,name,category_id,price,description\n"
+            'A-1, Куртка ,3,1990,"Две\nстроки"\n'
+            "A-2,Брюки,3,дорого,\n"
+            "A-3,Шапка,4,500,\n"
+        )
+        batches = list(iter_batches(io.StringIO(data, newline=""), "csv", batch_size=2))
+
+        assert len(batches) == 2
+        records, errors = batches[0]
+        assert records == [(3, "A-1", "Куртка", 3, 1990.0, "Две\nстроки")]
+        assert errors[0][:2] == (4, "A-2") and errors[0][2].startswith("price:")
+        assert batches[1] == ([(5, "A-3", "Шапка", 4, 500.0, None)], [])
+
+    def test_jsonl_and_format_detection(self):
+        """JSONL: битые строки и не-объекты отчитываются, пустые пропускаются"""
+        data = '{"sku": "B-1", "name": "Кепка", "category_id": 1, "price": 10}\n\nnope\n[1]\n'
+        [(records, errors)] = iter_batches(io.StringIO(data), detect_format("feed.JSONL"), batch_size=100)
+
+        assert records == [(1, "B-1", "Кепка", 1, 10.0, None)]
+        assert [line for line, _, _ in errors] == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_duplicate_sku_in_batch_reported(db_session):
+    """Повтор артикула в пачке: применяется последняя строка, ранние - ошибки, отчет сходится"""
+    db_session.add(Category(id=1, name="Одежда"))
+    await db_session.flush()
+    db_session.add(Product(sku="C-1", name="Куртка", category_id=1, price=100))
+    await db_session.commit()
+    data = (
+        "sku,name,category_id,price,description\n"
+        "C-2,Шапка,1,10,\n"
+        "C-1,Куртка,1,100,\n"
+        "C-2,Шапка,1,20,\n"
+        "C-2,Шапка,9,30,\n"
+        "C-1,Куртка,1,100,\n"
+    )
+
+    report = await import_products(db_session, io.StringIO(data, newline=""), "csv")
+
+    assert (report.rows, report.inserted, report.updated, report.unchanged, report.failed) == (5, 1, 0, 1, 3)
+    assert report.rows == report.inserted + report.updated + report.unchanged + report.failed
+    assert [(error.line, error.sku, error.error) for error in report.errors] == [
+        (5, "C-2", "Category 9 not found"),
+        (2, "C-2", "Duplicate SKU, superseded by line 4"),
+        (3, "C-1", "Duplicate SKU, superseded by line 6"),
+    ]
+    assert await db_session.scalar(select(Product.price).where(Product.sku == "C-2")) == 20
@@ -0,0 +1,118 @@
+import json
+import pytest
+from fastapi import Response
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from app.api.v1.facets import ProductFilters
+from app.api.v1.pagination import NEXT_CURSOR_HEADER, encode_cursor
+from app.api.v1.product import product_list_query, read_products
+from app.db.models import Product
+
+
+class TestCardView:
+    @pytest.mark.asyncio
+    async def test_card_selects_columns_without_images_query(self):
+        """view=card читает только колонки карточки и не ходит за картинками"""
+        rows = [
+            SimpleNamespace(id=i, name=f"Товар {i}", category_id=1, price=100.0, rating=4.5,
+                            main_image=None, updated_at=None)
+            for i in (1, 2, 3)
+        ]
+        result = MagicMock()
+        result.all.return_value = rows
+        session = AsyncMock(spec=AsyncSession)
+        session.execute = AsyncMock(return_value=result)
+        response = Response()
+
+        page = await read_products(response, db=session, limit=2, sort="id", view="card", cursor=None,
+                                   category_id=None, ids=None)
+
+        session.execute.assert_awaited_once()
+        sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "products.description" not in sql and "products.main_image" in sql
+        body = json.loads(page.body)
+        assert [item["id"] for item in body] == [1, 2]
+        assert "description" not in body[0]
+        assert page.headers[NEXT_CURSOR_HEADER] and page.headers["ETag"]
+
+
+class TestListQuery:
+    def test_filters_and_newest_sort(self):
+        """Фильтры цены и рейтинга попадают в WHERE, newest - обратный порядок id"""
+        filters = ProductFilters(category_id=3, min_price=100, max_price=500, min_rating=4)
+        query, columns = product_list_query("card", filters, None, "newest", None, 0, 20)
+
+        sql = " ".join(str(query.compile(dialect=postgresql.dialect())).split())
+        assert "products.category_id = " in sql and "products.price >= " in sql
+        assert "products.price <= " in sql and "products.rating >= " in sql
+        assert sql.endswith("ORDER BY products.id DESC LIMIT %(param_1)s")
+        assert columns == (Product.id,)
+
+    @pytest.mark.parametrize("sort,order", [
+        ("rating", "products.rating, products.id"),
+        ("-rating", "products.rating DESC, products.id DESC"),
+        ("top_rated", "products.rating DESC, products.id DESC"),
+    ])
+    def test_rating_sort_direction(self, sort, order):
+        """rating - по возрастанию, -rating и top_rated - сначала лучшие"""
+        query, columns = product_list_query("card", ProductFilters(), None, sort, None, 0, 20)
+
+        sql = " ".join(str(query.compile(dialect=postgresql.dialect())).split())
+        assert sql.endswith(f"ORDER BY {order} LIMIT %(param_1)s")
+        assert columns == (Product.rating, Product.id)
+
+    def test_newest_cursor_matches_id_descending(self):
+        """Курсор newest выдается для -id и принимается обеими сортировками"""
+        cursor = encode_cursor("-id", [10])
+        query, _ = product_list_query("card", ProductFilters(), None, "newest", cursor, 0, 20)
+        sql = str(query.compile(dialect=postgresql.dialect()))
+        assert "(products.id) < " in sql
+
+
+# Сортировка, фильтры и индекс, по которому страница читается range scan'ом.
+# Узкий диапазон Postgres читает bitmap scan'ом того же индекса и сортирует
+# найденные строки, широкий - обходом индекса в порядке сортировки
+PLAN_CASES = [
+    ("price", ProductFilters(category_id=3, min_price=100, max_price=5000), "ix_products_category_id_price_id"),
+    ("-rating", ProductFilters(category_id=3, min_rating=4), "ix_products_category_id_rating_id"),
+    ("price", ProductFilters(min_price=1000), "ix_products_price_id"),
+    ("newest", ProductFilters(category_id=3), "ix_products_category_id_id"),
+    ("newest", ProductFilters(), "products_pkey"),
+]
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort,filters,index", PLAN_CASES)
+async def test_list_uses_composite_index(db_session, sort, filters, index):
+    """EXPLAIN: фильтры и сортировка списка обслуживаются составными индексами"""
+    await db_session.execute(text(
+        "INSERT INTO categories (name) SELECT 'Категория ' || g FROM generate_series(1, 200) g"
+    ))
+    await db_session.execute(text(
+        "INSERT INTO products (name, category_id, price, rating) "
+        "SELECT 'Товар ' || g, (SELECT min(id) FROM categories) + g % 200, (g * 7919) % 20000, (g % 51) / 10.0 "
+        "FROM generate_series(1, 20000) g"
+    ))
+    await db_session.execute(text("ANALYZE products"))
+
+    query, _ = product_list_query("card", filters, None, sort, None, 0, 24)
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    plan = (await db_session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()[0]["Plan"]
+
+    nodes = list(plan_nodes(plan))
+    assert any(
+        node.get("Index Name") == index
+        and node["Node Type"] in ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+        for node in nodes
+    ), json.dumps(plan, indent=1)
+    assert not any(node["Node Type"] == "Seq Scan" for node in nodes)
@@ -0,0 +1,209 @@
+"""Бюджеты запросов к базе для всех маршрутов /api/v1
+
+Каждый маршрут вызывается на небольшом наборе данных, где N+1 сразу видно:
+у товаров по нескольку картинок, в корзине несколько товаров, у заказов по
+нескольку строк. Кэши перед запросом сброшены, так что бюджет - это холодный
+запрос. Новый маршрут без бюджета роняет test_every_route_has_budget.
+
+Нужна база TEST_DATABASE_URL; без нее тесты с базой пропускаются.
+"""
+import io
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import pytest
+
+from app.api.v1 import category as category_api
+from app.api.v1 import product as product_api
+from app.api.v1.auth import create_access_token, pwd_context
+from app.cache import _caches
+from app.db.models import (
+    Cart, Category, Order, OrderDetail, Product, ProductImage, ProductRatingStats, Review, User,
+)
+from app.main import app
+
+PASSWORD = "password123"
+
+
+class Budget(NamedTuple):
+    method: str
+    route: str
+    url: str
+    queries: int
+    rows: Optional[int] = None
+    user: Optional[str] = None
+    status: int = 200
+    json: Optional[dict] = None
+    data: Optional[dict] = None
+    files: Optional[dict] = None
+
+
+def image():
+    return {"image": ("photo.jpg", io.BytesIO(b"jpeg"), "image/jpeg")}
+
+
+def import_file():
+    content = "sku,name,category_id,price\nA-1,Куртка,1,100\nA-2,Шапка,2,50\nA-3,Ботинки,99,70\n"
+    return {"file": ("feed.csv", io.BytesIO(content.encode()), "text/csv")}
+
+
+# Запросы авторизации (поиск пользователя по токену) входят в бюджет:
+# кэш пользователей перед вызовом пуст
+BUDGETS = [
+    # Товары
+    Budget("GET", "/api/v1/products/", "/api/v1/products/?limit=100", 2, rows=18),
+    Budget("GET", "/api/v1/products/", "/api/v1/products/?limit=100&view=card", 1, rows=6),
+    # SET LOCAL plan_cache_mode перед поиском тоже запрос
+    Budget("GET", "/api/v1/products/search", "/api/v1/products/search?q=куртка", 3),
+    Budget("GET", "/api/v1/products/facets", "/api/v1/products/facets?min_price=100", 1, rows=6),
+    Budget("GET", "/api/v1/products/{product_id}", "/api/v1/products/1", 2),
+    Budget("GET", "/api/v1/products/{product_id}/rating", "/api/v1/products/1/rating", 1),
+    Budget("GET", "/api/v1/products/{product_id}/reviews", "/api/v1/products/1/reviews", 1),
+    Budget("POST", "/api/v1/products/", "/api/v1/products/", 3, user="alice", status=201,
+           data={"name": "Куртка", "category_id": "1", "price": "100"}, files=image),
+    Budget("POST", "/api/v1/products/{product_id}/upload-image", "/api/v1/products/1/upload-image", 5,
+           user="alice", files=image),
+    # COPY в staging идет в обход курсора SQLAlchemy и не считается
+    Budget("POST", "/api/v1/products/import", "/api/v1/products/import", 5, user="admin", files=import_file),
+    # Категории
+    Budget("GET", "/api/v1/categories/", "/api/v1/categories/", 1),
+    Budget("GET", "/api/v1/categories/{category_id}", "/api/v1/categories/1", 1),
+    Budget("POST", "/api/v1/categories/", "/api/v1/categories/", 3, data={"name": "Перчатки"}),
+    Budget("PUT", "/api/v1/categories/{category_id}", "/api/v1/categories/1", 4, data={"name": "Пальто"}),
+    Budget("DELETE", "/api/v1/categories/{category_id}", "/api/v1/categories/3", 4),
+    # Пользователи
+    Budget("POST", "/api/v1/users/", "/api/v1/users/", 2, status=201, json={
+        "username": "carol", "email": "carol@example.com", "first_name": "Carol", "last_name": "C",
+        "password": PASSWORD,
+    }),
+    Budget("GET", "/api/v1/users/me", "/api/v1/users/me", 1, user="alice"),
+    Budget("GET", "/api/v1/users/", "/api/v1/users/", 1),
+    Budget("GET", "/api/v1/users/{user_id}", "/api/v1/users/2", 1),
+    Budget("GET", "/api/v1/users/{user_id}/reviews", "/api/v1/users/2/reviews", 1),
+    Budget("GET", "/api/v1/users/{user_id}/orders", "/api/v1/users/2/orders", 3, user="alice"),
+    Budget("PUT", "/api/v1/users/{user_id}", "/api/v1/users/3", 3, json={
+        "username": "bob", "email": "bob@example.com", "first_name": "Robert", "last_name": "B",
+    }),
+    Budget("DELETE", "/api/v1/users/{user_id}", "/api/v1/users/3", 6),
+    Budget("POST", "/api/v1/users/token", "/api/v1/users/token", 1,
+           data={"username": "alice", "password": PASSWORD}),
+    Budget("POST", "/api/v1/users/change-password", "/api/v1/users/change-password", 3, user="alice",
+           json={"current_password": PASSWORD, "new_password": "new-password-123"}),
+    # Отзывы
+    Budget("POST", "/api/v1/reviews/reviews/", "/api/v1/reviews/reviews/", 5, status=201,
+           json={"text": "Отличная вещь", "rating": 5, "product_id": 2, "user_id": 3}),
+    Budget("GET", "/api/v1/reviews/reviews/", "/api/v1/reviews/reviews/", 1),
+    Budget("GET", "/api/v1/reviews/reviews/{review_id}", "/api/v1/reviews/reviews/1", 1),
+    Budget("PUT", "/api/v1/reviews/reviews/{review_id}", "/api/v1/reviews/reviews/1", 7,
+           json={"text": "Так себе вещь", "rating": 2, "product_id": 1, "user_id": 2}),
+    Budget("DELETE", "/api/v1/reviews/reviews/{review_id}", "/api/v1/reviews/reviews/1", 3),
+    # Корзины
+    Budget("POST", "/api/v1/carts/", "/api/v1/carts/", 5, status=201, json={"user_id": 3}),
+    Budget("GET", "/api/v1/carts/user/{user_id}", "/api/v1/carts/user/2", 2),
+    Budget("POST", "/api/v1/carts/user/{user_id}/items/batch", "/api/v1/carts/user/2/items/batch", 4,
+           json={"add": [4, 5, 6], "remove": [1, 2]}),
+    Budget("POST", "/api/v1/carts/user/{user_id}/items/{product_id}", "/api/v1/carts/user/2/items/4", 3),
+    Budget("DELETE", "/api/v1/carts/user/{user_id}/items/{product_id}", "/api/v1/carts/user/2/items/1", 3),
+    # Заказы
+    Budget("POST", "/api/v1/orders/orders/checkout", "/api/v1/orders/orders/checkout", 3, status=201,
+           json={"user_id": 2, "lines": [{"product_id": 1, "quantity": 2}, {"product_id": 2}, {"product_id": 3}]}),
+    Budget("POST", "/api/v1/orders/orders/", "/api/v1/orders/orders/", 3, status=201,
+           json={"user_id": 2, "total": 100}),
+    Budget("GET", "/api/v1/orders/orders/", "/api/v1/orders/orders/", 3, user="admin"),
+    Budget("GET", "/api/v1/orders/orders/{order_id}", "/api/v1/orders/orders/1", 1),
+    Budget("POST", "/api/v1/orders/orders/{order_id}/details/", "/api/v1/orders/orders/1/details/", 5,
+           status=201, json={"product_id": 4, "quantity": 1}),
+    Budget("GET", "/api/v1/orders/orders/{order_id}/details/", "/api/v1/orders/orders/1/details/", 1),
+    Budget("GET", "/api/v1/orders/orders/details/{order_detail_id}", "/api/v1/orders/orders/details/1", 1),
+    # Выгрузки: один потоковый запрос независимо от числа строк
+    Budget("GET", "/api/v1/export/products", "/api/v1/export/products", 2, user="admin"),
+    Budget("GET", "/api/v1/export/users", "/api/v1/export/users?format=csv", 2, user="admin"),
+    Budget("GET", "/api/v1/export/orders", "/api/v1/export/orders", 2, user="admin"),
+]
+
+
+@lru_cache(maxsize=None)
+def password_hash() -> str:
+    return pwd_context.hash(PASSWORD)
+
+
+async def seed(db):
+    """Три категории, шесть товаров с картинками, отзывы, корзина и заказы alice"""
+    db.add_all([Category(name=name) for name in ("Куртки", "Обувь", "Шапки")])
+    db.add_all([
+        User(username=username, email=f"{username}@example.com", first_name=username.title(), last_name="T",
+             hashed_password=password_hash(), is_active=True, is_superuser=username == "admin")
+        for username in ("admin", "alice", "bob")
+    ])
+    await db.flush()
+    products = [
+        Product(name=f"Куртка {i}", category_id=1 + i % 2, price=100.0 * i, description="Теплая куртка")
+        for i in range(1, 7)
+    ]
+    db.add_all(products)
+    await db.flush()
+    db.add_all([
+        ProductImage(product_id=product.id, position=position, url=f"/static/images/products/{product.id}_{position}.jpg")
+        for product in products for position in range(2)
+    ])
+    db.add_all([
+        Review(user_id=2 + i % 2, product_id=1, text="Хорошая куртка, рекомендую", rating=4 + i % 2)
+        for i in range(4)
+    ])
+    db.add(ProductRatingStats(product_id=1, review_count=4, rating_sum=18, stars_4=2, stars_5=2))
+    db.add(Cart(user_id=2, items=products[:3]))
+    for _ in range(3):
+        order = Order(user_id=2, total=300.0)
+        order.details = [OrderDetail(product_id=product.id, quantity=1) for product in products[:2]]
+        db.add(order)
+    await db.commit()
+    # Иначе db.get в обработчиках найдет объекты в identity map и не пойдет в базу
+    db.expunge_all()
+
+
+@pytest.fixture
+def fake_uploads(monkeypatch):
+    async def save_product_image(file, product_id, is_main=False):
+        return f"/static/images/products/test_{product_id}.jpg"
+
+    async def save_uploaded_file(file, subdir=""):
+        return "/static/images/categories/test.jpg"
+
+    monkeypatch.setattr(product_api, "save_product_image", save_product_image)
+    monkeypatch.setattr(category_api, "save_uploaded_file", save_uploaded_file)
+    monkeypatch.setattr(product_api, "remove_image", lambda path: None)
+    monkeypatch.setattr(category_api, "remove_image", lambda path: None)
+
+
+@pytest.fixture
+def cold_caches(monkeypatch):
+    for cache in _caches.values():
+        cache.clear()
+    monkeypatch.setattr(category_api, "_category_snapshot", None)
+
+
+def test_every_route_has_budget():
+    """У каждого маршрута /api/v1 есть бюджет запросов"""
+    routes = {
+        (method, route.path)
+        for route in app.routes if route.path.startswith("/api/v1/")
+        for method in getattr(route, "methods", ())
+    }
+    assert routes - {(budget.method, budget.route) for budget in BUDGETS} == set()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("budget", BUDGETS, ids=lambda budget: f"{budget.method} {budget.url}")
+async def test_route_query_budget(budget, client, db_session, query_budget, fake_uploads, cold_caches):
+    await seed(db_session)
+    headers = {}
+    if budget.user:
+        headers["Authorization"] = f"Bearer {create_access_token({'sub': budget.user})}"
+
+    with query_budget(budget.queries, budget.rows, label=f"{budget.method} {budget.url}"):
+        response = await client.request(
+            budget.method, budget.url, headers=headers, json=budget.json, data=budget.data,
+            files=budget.files() if budget.files else None,
+        )
+
+    assert response.status_code == budget.status, response.text
@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from unittest.mock import AsyncMock
+
+from app.db.ratings import apply_rating_delta
+
+
+class TestApplyRatingDelta:
+    @pytest.mark.asyncio
+    async def test_single_upsert_with_rating_update(self):
+        """Агрегат и products.rating обновляются одним запросом"""
+        session = AsyncMock(spec=AsyncSession)
+        await apply_rating_delta(session, product_id=5, rating=4, sign=-1)
+
+        statement = session.execute.await_args.args[0]
+        compiled = statement.compile(dialect=postgresql.dialect())
+        sql = str(compiled)
+        assert "ON CONFLICT (product_id) DO UPDATE" in sql
+        assert "UPDATE products SET rating=" in sql
+        assert "reviews" not in sql
+        params = compiled.params
+        assert -1 in params.values() and -4 in params.values()
+
+    @pytest.mark.asyncio
+    async def test_ignores_missing_rating(self):
+        """Старые отзывы без оценки агрегаты не меняют"""
+        session = AsyncMock(spec=AsyncSession)
+        await apply_rating_delta(session, product_id=5, rating=None, sign=1)
+        session.execute.assert_not_awaited()
@@ -0,0 +1,23 @@
+import json
+from fastapi import Response
+from types import SimpleNamespace
+
+from app.api.v1.pagination import NEXT_CURSOR_HEADER
+from app.api.v1.responses import json_response
+from app.api.v1.review import review_list_adapter
+
+
+class TestJsonResponse:
+    def test_serializes_orm_objects_and_keeps_headers(self):
+        """Объекты сериализуются по схеме, заголовки обработчика сохраняются"""
+        handler_response = Response()
+        del handler_response.headers["content-length"]
+        handler_response.headers[NEXT_CURSOR_HEADER] = "abc"
+        rows = [SimpleNamespace(id=1, user_id=2, product_id=3, text="Отличная вещь", rating=5, secret="x")]
+
+        result = json_response(review_list_adapter, rows, handler_response)
+
+        assert json.loads(result.body) == [{"id": 1, "user_id": 2, "product_id": 3, "text": "Отличная вещь", "rating": 5}]
+        assert result.headers[NEXT_CURSOR_HEADER] == "abc"
+        assert result.headers["content-type"] == "application/json"
+        assert result.headers["content-length"] == str(len(result.body))
@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from fastapi import Response
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from app.api.v1.pagination import NEXT_CURSOR_HEADER, decode_cursor
+from app.api.v1.review import ReviewBase, list_reviews, update_review
+from app.db.models import Product, ProductRatingStats, Review, User
+from tests.conftest import TEST_DATABASE_URL
+
+
+class TestListReviews:
+    @pytest.mark.asyncio
+    async def test_highest_page_with_cursor(self):
+        """Сортировка по оценке идет по ключу (rating, id) и отдает курсор"""
+        rows = [SimpleNamespace(id=10 - i, rating=5) for i in range(3)]
+        session = AsyncMock(spec=AsyncSession)
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = rows
+        session.execute = AsyncMock(return_value=result)
+        response = Response()
+
+        reviews = await list_reviews(session, response, (Review.product_id == 7,), sort="highest", limit=2)
+
+        sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "reviews.product_id = " in sql
+        assert "ORDER BY reviews.rating DESC, reviews.id DESC" in sql
+        assert len(reviews) == 2
+        assert decode_cursor(response.headers[NEXT_CURSOR_HEADER], "highest", 2) == [5, 9]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_updates_keep_rating_stats(db_session):
+    """Параллельные изменения одного отзыва не вычитают старую оценку дважды"""
+    db_session.add(User(id=1, username="anna", email="anna@example.com", first_name="Анна", last_name="Иванова",
+                        hashed_password="x"))
+    db_session.add(Product(id=1, name="Куртка", price=100.0))
+    await db_session.flush()
+    db_session.add(Review(id=1, user_id=1, product_id=1, text="Нормальная куртка", rating=3))
+    db_session.add(ProductRatingStats(product_id=1, review_count=1, rating_sum=3, stars_3=1))
+    await db_session.commit()
+
+    engine = create_async_engine(TEST_DATABASE_URL)
+    make_session = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        async with make_session() as first, make_session() as second:
+            await asyncio.gather(*(
+                update_review(1, ReviewBase(text="Передумал, оценка другая", rating=rating, product_id=1, user_id=1),
+                              db=session)
+                for session, rating in ((first, 5), (second, 1))
+            ))
+    finally:
+        await engine.dispose()
+
+    db_session.expire_all()
+    stats = await db_session.get(ProductRatingStats, 1)
+    final = (await db_session.get(Review, 1)).rating
+    assert stats.review_count == 1
+    assert stats.rating_sum == final
+    assert [getattr(stats, f"stars_{star}") for star in range(1, 6)] == [int(star == final) for star in range(1, 6)]
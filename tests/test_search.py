@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import text
+
+from app.api.v1 import product as product_api
+from app.db.models import Category, Product
+
+
+async def seed(db):
+    db.add_all([Category(id=1, name="Одежда"), Category(id=2, name="Обувь")])
+    await db.flush()
+    db.add_all([
+        # Слово в названии (вес A) и в описании
+        Product(name="Зимняя куртка", category_id=1, price=5000,
+                description="Теплая куртка с капюшоном, куртка на пуху"),
+        # Только в описании (вес B)
+        Product(name="Шапка", category_id=1, price=800, description="Подходит к любой куртке"),
+        # HTML в описании не должен дойти до клиента разметкой
+        Product(name="Куртка-ветровка", category_id=2, price=3000,
+                description="<script>alert(1)</script> Легкая <b>куртка</b> & чехол"),
+        Product(name="Ботинки", category_id=2, price=4000, description="Кожаные ботинки"),
+    ])
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_results_ordered_by_rank(client, db_session):
+    """Совпадение в названии выше совпадения только в описании, лишних товаров нет"""
+    await seed(db_session)
+
+    response = await client.get("/api/v1/products/search", params={"q": "куртка"})
+
+    assert response.status_code == 200
+    results = response.json()
+    names = [item["name"] for item in results]
+    assert names[0] == "Зимняя куртка"
+    assert names[-1] == "Шапка"
+    assert "Ботинки" not in names
+    ranks = [item["rank"] for item in results]
+    assert ranks == sorted(ranks, reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_snippet_escapes_description_html(client, db_session):
+    """В сниппете разметка только <mark>, HTML описания экранирован"""
+    await seed(db_session)
+
+    response = await client.get("/api/v1/products/search", params={"q": "куртка", "category_id": 2})
+
+    [item] = response.json()
+    assert item["name"] == "Куртка-ветровка"
+    snippet = item["snippet"]
+    assert "<mark>куртка</mark>" in snippet
+    assert "<script>" not in snippet and "<b>" not in snippet
+    assert "&lt;b&gt;" in snippet and "&amp;" in snippet
+
+
+@pytest.mark.asyncio
+async def test_best_match_found_among_many_matches(client, db_session):
+    """Лучшее совпадение находится, даже если совпадений тысячи и оно добавлено последним"""
+    await seed(db_session)
+    await db_session.execute(text(
+        "INSERT INTO products (name, category_id, price, description) "
+        "SELECT 'Товар ' || g, 1, 100, 'Сочетается с курткой' FROM generate_series(1, 1500) g"
+    ))
+    await db_session.execute(text(
+        "INSERT INTO products (name, category_id, price, description) "
+        "VALUES ('Куртка куртка', 1, 100, 'Куртка, куртка и еще раз куртка')"
+    ))
+    await db_session.commit()
+
+    response = await client.get("/api/v1/products/search", params={"q": "куртка", "limit": 1})
+
+    assert [item["name"] for item in response.json()] == ["Куртка куртка"]
+
+
+@pytest.mark.asyncio
+async def test_broad_query_ranks_newest_candidates(client, db_session, monkeypatch):
+    """Сверх SEARCH_CANDIDATE_LIMIT ранжируются самые новые совпадения, а не случайные"""
+    await seed(db_session)
+    monkeypatch.setattr(product_api, "SEARCH_CANDIDATE_LIMIT", 2)
+
+    response = await client.get("/api/v1/products/search", params={"q": "куртка"})
+
+    # Из трех совпадений в кандидаты попали два последних; лучшее по рангу из них первое
+    assert [item["name"] for item in response.json()] == ["Куртка-ветровка", "Шапка"]
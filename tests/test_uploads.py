@@ -0,0 +1,53 @@
+import io
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.api.v1.uploads import save_image_upload, sniff_image_type
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+def make_upload(data: bytes, filename: str = "photo.jpg") -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+class TestSaveImageUpload:
+    @pytest.mark.parametrize("head,expected", [
+        (b"\xff\xd8\xff\xe0" + b"\0" * 8, "jpg"),
+        (PNG_HEADER + b"\0" * 4, "png"),
+        (b"GIF89a" + b"\0" * 6, "gif"),
+        (b"RIFF\0\0\0\0WEBP", "webp"),
+        (b"<svg xmlns=", None),
+    ])
+    def test_sniff_image_type(self, head, expected):
+        """Тип определяется по сигнатуре файла"""
+        assert sniff_image_type(head) == expected
+
+    @pytest.mark.asyncio
+    async def test_saves_with_sniffed_extension(self, tmp_path):
+        """Расширение берется из содержимого, а не из имени файла"""
+        data = PNG_HEADER + b"x" * 200_000
+        filename = await save_image_upload(make_upload(data, "photo.jpg"), tmp_path, "img")
+
+        assert filename == "img.png"
+        assert (tmp_path / filename).read_bytes() == data
+        assert [p.name for p in tmp_path.iterdir()] == ["img.png"]
+
+    @pytest.mark.asyncio
+    async def test_too_large_leaves_no_files(self, tmp_path):
+        """Превышение лимита дает 413 и не оставляет временных файлов"""
+        upload = make_upload(PNG_HEADER + b"x" * 300_000)
+        with pytest.raises(HTTPException) as exc_info:
+            await save_image_upload(upload, tmp_path, "img", max_size=100_000)
+
+        assert exc_info.value.status_code == 413
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_unknown_type_rejected(self, tmp_path):
+        """Не картинка отклоняется с 415"""
+        with pytest.raises(HTTPException) as exc_info:
+            await save_image_upload(make_upload(b"#!/bin/sh\nrm -rf /"), tmp_path, "img")
+
+        assert exc_info.value.status_code == 415
+        assert list(tmp_path.iterdir()) == []